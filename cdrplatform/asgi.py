@@ -8,9 +8,18 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
 
 import os
+import threading
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cdrplatform.settings")
 
 application = get_asgi_application()
+
+if settings.WARM_UP:
+    from cdrplatform.core.warmup import app_warm_up
+
+    # The ORM can't be used from the event loop so warm up in a thread, the
+    # readiness check fails until it is done
+    threading.Thread(target=app_warm_up, name="warm-up", daemon=True).start()
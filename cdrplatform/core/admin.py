@@ -1,15 +1,31 @@
+from django.conf import settings
 from django.contrib import admin
+from django.db import transaction
+from django.template.response import TemplateResponse
+from django.urls import path
 from rest_framework_api_key.admin import APIKeyModelAdmin
 
+from cdrplatform.core.exports import export_streaming_response
 from cdrplatform.core.models import (
+    Certificate,
     CurrencyConversionRate,
     CustomerOrganisation,
     OrganisationAPIKey,
+    PartnerConfirmation,
+    PartnerPurchase,
     RemovalMethod,
     RemovalPartner,
     RemovalRequest,
     RemovalRequestItem,
 )
+from cdrplatform.core.selectors import (
+    PARTNER_RECONCILIATION_COLUMNS,
+    partner_reconciliation_list,
+)
+from cdrplatform.core.services import (
+    certificate_cache_invalidate,
+    certificate_snapshot_delete,
+)
 
 
 @admin.register(RemovalMethod)
@@ -70,3 +86,113 @@ class CustomerOrganisationAdmin(admin.ModelAdmin):
 @admin.register(OrganisationAPIKey)
 class OrganisationAPIKeyAdmin(APIKeyModelAdmin):
     pass
+
+
+@admin.register(Certificate)
+class CertificateAdmin(admin.ModelAdmin):
+    list_display = (
+        "certificate_id",
+        "display_name",
+        "issued_date",
+        "removal_request",
+    )
+
+    # The cache and snapshots are only changed once the transaction commits so
+    # a rollback doesn't lose them and reads in the meantime don't re-cache the
+    # old certificate
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            # The ID itself may have been edited so drop both versions
+            old_certificate_id = form.initial.get("certificate_id")
+            transaction.on_commit(
+                lambda: self._certificate_changed(
+                    old_certificate_id=old_certificate_id,
+                    certificate_id=obj.certificate_id,
+                )
+            )
+
+    @staticmethod
+    def _certificate_changed(*, old_certificate_id: str, certificate_id: str):
+        certificate_cache_invalidate(certificate_id=old_certificate_id)
+        certificate_cache_invalidate(certificate_id=certificate_id)
+        if (
+            settings.CERTIFICATE_SNAPSHOT_ENABLED
+            and old_certificate_id != certificate_id
+        ):
+            certificate_snapshot_delete(certificate_id=old_certificate_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        certificate_id = obj.certificate_id
+        transaction.on_commit(
+            lambda: certificate_cache_invalidate(certificate_id=certificate_id)
+        )
+
+    def delete_queryset(self, request, queryset):
+        certificate_ids = list(queryset.values_list("certificate_id", flat=True))
+        super().delete_queryset(request, queryset)
+
+        def invalidate():
+            for certificate_id in certificate_ids:
+                certificate_cache_invalidate(certificate_id=certificate_id)
+
+        transaction.on_commit(invalidate)
+
+
+class PartnerConfirmationInline(admin.TabularInline):
+    model = PartnerConfirmation
+    extra = 0
+
+
+@admin.register(PartnerPurchase)
+class PartnerPurchaseAdmin(admin.ModelAdmin):
+    list_display = (
+        "removal_partner",
+        "cdr_amount",
+        "weight_unit",
+        "cdr_cost",
+        "currency",
+        "ordered_date",
+        "completed_date",
+    )
+    inlines = (PartnerConfirmationInline,)
+    change_list_template = "admin/core/partnerpurchase/change_list.html"
+
+    def get_urls(self):
+        return [
+            path(
+                "reconciliation/",
+                self.admin_site.admin_view(self.reconciliation_view),
+                name="core_partnerpurchase_reconciliation",
+            ),
+            path(
+                "reconciliation/csv/",
+                self.admin_site.admin_view(self.reconciliation_csv_view),
+                name="core_partnerpurchase_reconciliation_csv",
+            ),
+        ] + super().get_urls()
+
+    def reconciliation_view(self, request):
+        """Shows how much CDR sold to customers is covered by partner purchases
+        and confirmations, per partner and month."""
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Partner reconciliation",
+            "rows": partner_reconciliation_list(),
+        }
+        return TemplateResponse(
+            request, "admin/core/partnerpurchase/reconciliation.html", context
+        )
+
+    def reconciliation_csv_view(self, request):
+        return export_streaming_response(
+            columns=PARTNER_RECONCILIATION_COLUMNS,
+            rows=(
+                tuple(row[column] for column in PARTNER_RECONCILIATION_COLUMNS)
+                for row in partner_reconciliation_list()
+            ),
+            file_type="csv",
+            filename="partner-reconciliation",
+        )
@@ -1,5 +1,90 @@
+import json
+from typing import Any
+
+from django.conf import settings
+from django.http import HttpRequest, JsonResponse
+from django.views import View
+from drf_standardized_errors.handler import exception_handler
+from rest_framework import exceptions
+from rest_framework.negotiation import BaseContentNegotiation
 from rest_framework.views import APIView
 
 
 class BaseAPIView(APIView):
     pass
+
+
+class AsyncAPIView(View):
+    """Base for read-only API views with `async` handlers, used instead of the DRF
+    views when `ASYNC_API_VIEWS` is set (for ASGI deployments).
+
+    DRF views are synchronous so these are plain Django views. They reuse the DRF
+    serializers, accept JSON only and render errors with drf-standardized-errors
+    so responses are the same as those of the DRF views."""
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Like DRF views, they don't rely on session authentication
+        view.csrf_exempt = True
+        # Django can't wrap async views in `ATOMIC_REQUESTS` transactions
+        view._non_atomic_requests = set(settings.DATABASES)
+        return view
+
+    async def dispatch(self, request: HttpRequest, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except Exception as exc:
+            response = exception_handler(exc, {"view": self, "request": request})
+            if response is None:
+                raise
+            headers = {
+                header: value
+                for header, value in response.items()
+                if header != "Content-Type"
+            }
+            return self.render(
+                response.data, status=response.status_code, headers=headers
+            )
+
+    def parse_json(self, request: HttpRequest) -> Any:
+        try:
+            return json.loads(request.body or b"{}")
+        except ValueError as err:
+            raise exceptions.ParseError(f"JSON parse error - {err}")
+
+    def render(self, data: Any, *, status: int = 200, **kwargs) -> JsonResponse:
+        # Compact and unescaped like DRF's `JSONRenderer`
+        return JsonResponse(
+            data,
+            status=status,
+            safe=False,
+            json_dumps_params={"separators": (",", ":"), "ensure_ascii": False},
+            **kwargs,
+        )
+
+
+def api_view_for_deployment(
+    view_class: type[APIView],
+    async_view_class: type[AsyncAPIView],
+):
+    """The view for a URL: the async view when `ASYNC_API_VIEWS` is set and the
+    DRF view otherwise. The schema is always generated from the DRF view."""
+    if not settings.ASYNC_API_VIEWS:
+        return view_class.as_view()
+    view = async_view_class.as_view()
+    # What drf-spectacular looks for to generate the schema
+    view.cls = view_class
+    view.initkwargs = {}
+    return view
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """Files are returned as is so ignore the `Accept` header the client sends
+    (e.g. `application/pdf`) and render any errors with the first renderer."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix):
+        return (renderers[0], renderers[0].media_type)
@@ -0,0 +1,68 @@
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiResponse, extend_schema
+from rest_framework import serializers, status
+
+from cdrplatform.api_key_utils import extract_key_from_header
+from cdrplatform.core.api.base import BaseAPIView, IgnoreClientContentNegotiation
+from cdrplatform.core.auth import APIKeyRequiredMixin, UnauthenticatedMixin
+from cdrplatform.core.exports import (
+    EXPORT_COMPRESSIONS,
+    EXPORT_FILE_TYPES,
+    export_streaming_response,
+)
+from cdrplatform.core.selectors import (
+    REMOVAL_HISTORY_EXPORT_COLUMNS,
+    api_key_must_be_present_and_valid,
+    removal_history_list_for_export,
+)
+
+
+@extend_schema(
+    tags=("CO₂ Removal",),
+)
+class CDRExportView(BaseAPIView, UnauthenticatedMixin, APIKeyRequiredMixin):
+    """Export the full removal history of an organisation."""
+
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    class InputSerializer(serializers.Serializer):
+        file_type = serializers.ChoiceField(
+            required=False,
+            default="csv",
+            choices=tuple(EXPORT_FILE_TYPES),
+        )
+        compression = serializers.ChoiceField(
+            required=False,
+            default="",
+            allow_blank=True,
+            choices=EXPORT_COMPRESSIONS,
+        )
+
+    @extend_schema(
+        operation_id="cdr_export",
+        parameters=[InputSerializer],
+        responses={
+            (status.HTTP_200_OK, content_type): OpenApiResponse(OpenApiTypes.BINARY)
+            for content_type in (*EXPORT_FILE_TYPES.values(), "application/gzip")
+        },
+        summary="Export CO₂ removal history",
+        description="""Download every CO₂ removal request made by your organisation
+as a `csv` or `jsonl` file with one row per removal method.
+
+The file is streamed so it can be used for histories of any size. Set
+`compression=gzip` to receive a gzipped file.""",
+    )
+    def get(self, request):
+        api_key = api_key_must_be_present_and_valid(
+            key=extract_key_from_header(request=request)
+        )
+
+        input_data = self.InputSerializer(data=request.query_params)
+        if input_data.is_valid(raise_exception=True):
+            return export_streaming_response(
+                columns=tuple(REMOVAL_HISTORY_EXPORT_COLUMNS),
+                rows=removal_history_list_for_export(org=api_key.organisation),
+                file_type=input_data.validated_data["file_type"],
+                filename="cdr-removal-history",
+                compression=input_data.validated_data["compression"],
+            )
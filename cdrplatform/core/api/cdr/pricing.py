@@ -6,10 +6,12 @@ from drf_spectacular.utils import extend_schema, extend_schema_serializer
 from rest_framework import serializers, status
 from rest_framework.response import Response
 
-from cdrplatform.core.api.base import BaseAPIView
+from cdrplatform.core.api.base import AsyncAPIView, BaseAPIView
 from cdrplatform.core.auth import APIKeyRequiredMixin, UnauthenticatedMixin
 from cdrplatform.core.models import CurrencyChoices, WeightUnitChoices
 from cdrplatform.core.selectors import (
+    removal_method_acalculate_removal_cost,
+    removal_method_achoices,
     removal_method_calculate_removal_cost,
     removal_method_choices,
     variable_fees_calculate,
@@ -24,6 +26,10 @@ class CDRPricingView(BaseAPIView, UnauthenticatedMixin, APIKeyRequiredMixin):
     CDR items.
     """
 
+    # API key, then the partner and conversion rate of each item (up to one per
+    # removal method)
+    query_budget = 12
+
     @extend_schema_serializer(component_name="PricingRequestInput")
     class InputSerializer(serializers.Serializer):
         @extend_schema_serializer(component_name="PricingRequestRemovalMethod")
@@ -114,3 +120,63 @@ fees for a future CO₂ removal purchase.""",
                 }
             )
             return Response(output.data, status=status.HTTP_201_CREATED)
+
+
+class AsyncCDRPricingView(AsyncAPIView):
+    """:class:`CDRPricingView` for ASGI deployments."""
+
+    query_budget = CDRPricingView.query_budget
+
+    class InputSerializer(CDRPricingView.InputSerializer):
+        class InputRemovalMethodSerializer(
+            CDRPricingView.InputSerializer.InputRemovalMethodSerializer
+        ):
+            # The choices are looked up beforehand (the lazy choices of the DRF
+            # view would query the database from the event loop)
+            method_type = serializers.CharField(
+                required=True, allow_blank=True, trim_whitespace=False
+            )
+
+            def validate_method_type(self, value):
+                if value not in self.context["removal_methods"]:
+                    raise serializers.ValidationError(
+                        serializers.ChoiceField.default_error_messages[
+                            "invalid_choice"
+                        ].format(input=value),
+                        code="invalid_choice",
+                    )
+                return value
+
+        items = InputRemovalMethodSerializer(many=True, min_length=1)
+
+    async def post(self, request):
+        input_data = self.InputSerializer(
+            data=self.parse_json(request),
+            context={"removal_methods": dict(await removal_method_achoices())},
+        )
+        input_data.is_valid(raise_exception=True)
+
+        items = input_data.validated_data["items"]
+        for item in items:
+            item["cost"] = await removal_method_acalculate_removal_cost(
+                removal_method_slug=item["method_type"],
+                currency=input_data.validated_data["currency"],
+                cdr_amount=item["cdr_amount"],
+                weight_unit=input_data.validated_data["weight_unit"],
+            )
+        removal_cost = sum(item["cost"] for item in items)
+        variable_fee = variable_fees_calculate(removal_cost=removal_cost)
+
+        output = CDRPricingView.OutputSerializer(
+            {
+                "cost": {
+                    "items": items,
+                    "removal": removal_cost,
+                    "variable_fees": variable_fee,
+                    "total": removal_cost + variable_fee,
+                },
+                "currency": input_data.validated_data["currency"],
+                "weight_unit": input_data.validated_data["weight_unit"],
+            }
+        )
+        return self.render(output.data, status=status.HTTP_201_CREATED)
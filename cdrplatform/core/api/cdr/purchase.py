@@ -24,6 +24,10 @@ class CDRRemovalView(BaseAPIView, UnauthenticatedMixin, APIKeyRequiredMixin):
     CDR items.
     """
 
+    # Creating the request, then up to 7 queries for each item (up to one per
+    # removal method) to price it and add it to the usage rollup
+    query_budget = 45
+
     @extend_schema_serializer(component_name="RemovalRequestInput")
     class InputSerializer(serializers.Serializer):
         @extend_schema_serializer(component_name="CDRRemovalRequestRemovalMethod")
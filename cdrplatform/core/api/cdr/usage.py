@@ -0,0 +1,94 @@
+import datetime
+
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema, extend_schema_serializer
+from rest_framework import serializers, status
+from rest_framework.response import Response
+
+from cdrplatform.api_key_utils import extract_key_from_header
+from cdrplatform.core.api.base import BaseAPIView
+from cdrplatform.core.auth import APIKeyRequiredMixin, UnauthenticatedMixin
+from cdrplatform.core.models import CurrencyChoices
+from cdrplatform.core.selectors import (
+    api_key_must_be_present_and_valid,
+    usage_rollup_list_daily,
+)
+
+
+@extend_schema(
+    tags=("CO₂ Removal",),
+)
+class CDRUsageView(BaseAPIView, UnauthenticatedMixin, APIKeyRequiredMixin):
+    """Daily CO₂ removal usage of an organisation."""
+
+    query_budget = 3
+
+    # Longest period that can be requested at once
+    max_days = 366
+
+    @extend_schema_serializer(component_name="UsageRequestInput")
+    class InputSerializer(serializers.Serializer):
+        start = serializers.DateField(required=False)
+        end = serializers.DateField(required=False)
+
+        def validate(self, data):
+            end = data.setdefault("end", timezone.localdate())
+            start = data.setdefault("start", end - datetime.timedelta(days=29))
+            if start > end:
+                raise serializers.ValidationError("`start` must be before `end`.")
+            if (end - start).days >= CDRUsageView.max_days:
+                raise serializers.ValidationError(
+                    f"At most {CDRUsageView.max_days} days can be requested at once."
+                )
+            return data
+
+    @extend_schema_serializer(component_name="UsageRequestOutput")
+    class OutputSerializer(serializers.Serializer):
+        @extend_schema_serializer(component_name="UsageDay")
+        class UsageDaySerializer(serializers.Serializer):
+            day = serializers.DateField()
+            currency = serializers.ChoiceField(choices=CurrencyChoices.choices)
+            method_type = serializers.CharField(source="removal_method.slug")
+            removal_count = serializers.IntegerField()
+            cdr_amount_g = serializers.IntegerField(source="cdr_grams")
+            removal_cost = serializers.IntegerField(source="cdr_cost")
+            variable_fees = serializers.IntegerField()
+
+        start = serializers.DateField()
+        end = serializers.DateField()
+        days = UsageDaySerializer(many=True)
+
+    @extend_schema(
+        operation_id="cdr_usage",
+        parameters=[InputSerializer],
+        responses={
+            status.HTTP_200_OK: OutputSerializer,
+        },
+        summary="Get CO₂ removal usage",
+        description="""Daily totals of the CO₂ removal purchased by your organisation
+between `start` and `end` (inclusive), per currency and removal method.
+
+Defaults to the last 30 days. Test API keys return the usage of test requests.""",
+    )
+    def get(self, request):
+        api_key = api_key_must_be_present_and_valid(
+            key=extract_key_from_header(request=request)
+        )
+
+        input_data = self.InputSerializer(data=request.query_params)
+        if input_data.is_valid(raise_exception=True):
+            start = input_data.validated_data["start"]
+            end = input_data.validated_data["end"]
+            output = self.OutputSerializer(
+                {
+                    "start": start,
+                    "end": end,
+                    "days": usage_rollup_list_daily(
+                        org=api_key.organisation,
+                        start=start,
+                        end=end,
+                        is_test=api_key.is_test_key(),
+                    ),
+                }
+            )
+            return Response(output.data, status=status.HTTP_200_OK)
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiResponse, extend_schema
+from rest_framework import exceptions, status
+
+from cdrplatform.core.api.base import IgnoreClientContentNegotiation
+from cdrplatform.core.api.certificate.retrieve import CertificateRetrievalView
+from cdrplatform.core.rendering import CERTIFICATE_ARTIFACT_TYPES
+from cdrplatform.core.responses import ranged_file_response
+from cdrplatform.core.services import certificate_artifact_get_or_create
+
+
+@extend_schema(
+    tags=("Certificate",),
+)
+class CertificateDownloadView(CertificateRetrievalView):
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @extend_schema(
+        operation_id="certificate_download",
+        responses={
+            (status.HTTP_200_OK, content_type): OpenApiResponse(OpenApiTypes.BINARY)
+            for content_type in CERTIFICATE_ARTIFACT_TYPES.values()
+        },
+        summary="Download CDR certificate",
+        description="""Given a certificate ID, download the certificate as a
+`pdf` or `png` file.
+
+Supports `Range` requests so large downloads can be resumed.""",
+    )
+    def get(self, request, id: str, file_type: str):
+        """Download a rendered certificate by its ID."""
+        if file_type not in CERTIFICATE_ARTIFACT_TYPES:
+            raise exceptions.NotFound(
+                detail="Certificate file type not found",
+            )
+
+        cached = self.get_certificate_data(id)
+        name, etag = certificate_artifact_get_or_create(
+            data=cached["data"],
+            file_type=file_type,
+        )
+
+        return ranged_file_response(
+            request=request,
+            file=default_storage.open(name),
+            size=default_storage.size(name),
+            content_type=CERTIFICATE_ARTIFACT_TYPES[file_type],
+            filename=f"{cached['data']['certificate_id']}.{file_type}",
+            headers={
+                "ETag": etag,
+                "Cache-Control": (
+                    f"public, max-age={settings.CERTIFICATE_CACHE_MAX_AGE}"
+                ),
+            },
+        )
@@ -1,16 +1,46 @@
+from typing import Dict
+
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
 from drf_spectacular.utils import extend_schema, extend_schema_serializer
 from rest_framework import exceptions, response, serializers, status
 
-from cdrplatform.core.api.base import BaseAPIView
+from cdrplatform.core.api.base import AsyncAPIView, BaseAPIView
 from cdrplatform.core.auth import APIKeyRequiredMixin, UnauthenticatedMixin
-from cdrplatform.core.selectors import certificate_get_by_id
+from cdrplatform.core.selectors import (
+    certificate_aget_by_id,
+    certificate_aget_details,
+    certificate_cache_aget,
+    certificate_cache_get,
+    certificate_get_by_id,
+    certificate_get_details,
+)
+from cdrplatform.core.services import certificate_cache_aset, certificate_cache_set
+
+
+def _certificate_headers(*, etag: str) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.CERTIFICATE_CACHE_MAX_AGE}",
+    }
+
+
+def _certificate_not_modified(*, request, etag: str) -> bool:
+    # Certificates don't change once issued so if the client already has
+    # this version we can skip sending the body again.
+    if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+    return "*" in if_none_match or etag in if_none_match
 
 
 @extend_schema(
     tags=("Certificate",),
 )
 class CertificateRetrievalView(BaseAPIView, UnauthenticatedMixin, APIKeyRequiredMixin):
+    # Only when the certificate isn't cached yet
+    query_budget = 3
+
     @extend_schema_serializer(component_name="CertificateRequestOutput")
     class OutputSerializer(serializers.Serializer):
         certificate_id = serializers.CharField()
@@ -19,6 +49,25 @@ class CertificateRetrievalView(BaseAPIView, UnauthenticatedMixin, APIKeyRequired
         removal_amount_kg = serializers.IntegerField()
         # todo: breakdown - somehow
 
+    def get_certificate_data(self, id: str):
+        """Returns the cached representation of a certificate, serializing and
+        caching it on the first request."""
+        cached = certificate_cache_get(certificate_id=id)
+        if cached is not None:
+            return cached
+
+        try:
+            certificate = certificate_get_by_id(certificate_id=id)
+        except ObjectDoesNotExist:
+            raise exceptions.NotFound(
+                detail="Certificate not found",
+            )
+
+        output = self.OutputSerializer(
+            certificate_get_details(certificate=certificate),
+        )
+        return certificate_cache_set(certificate_id=id, data=output.data)
+
     @extend_schema(
         operation_id="certificate_retrieve_id",
         responses={
@@ -30,18 +79,43 @@ that can be used as proof of purchase.""",
     )
     def get(self, request, id: str):
         """Retrieve a certificate by its ID."""
-        try:
-            certificate = certificate_get_by_id(certificate_id=id)
-            output = self.OutputSerializer(
-                {
-                    "certificate_id": certificate.certificate_id,
-                    "display_name": certificate.display_name,
-                    "issued_date": certificate.issued_date,
-                    "removal_amount_kg": certificate.removal_request.total_kg,
-                }
+        cached = self.get_certificate_data(id)
+        headers = _certificate_headers(etag=cached["etag"])
+        if _certificate_not_modified(request=request, etag=cached["etag"]):
+            return response.Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers=headers
             )
-            return response.Response(output.data, status=status.HTTP_200_OK)
+
+        return response.Response(
+            cached["data"], status=status.HTTP_200_OK, headers=headers
+        )
+
+
+class AsyncCertificateRetrievalView(AsyncAPIView):
+    """:class:`CertificateRetrievalView` for ASGI deployments."""
+
+    query_budget = CertificateRetrievalView.query_budget
+
+    async def get_certificate_data(self, id: str):
+        cached = await certificate_cache_aget(certificate_id=id)
+        if cached is not None:
+            return cached
+
+        try:
+            certificate = await certificate_aget_by_id(certificate_id=id)
         except ObjectDoesNotExist:
             raise exceptions.NotFound(
                 detail="Certificate not found",
             )
+
+        output = CertificateRetrievalView.OutputSerializer(
+            await certificate_aget_details(certificate=certificate),
+        )
+        return await certificate_cache_aset(certificate_id=id, data=output.data)
+
+    async def get(self, request, id: str):
+        cached = await self.get_certificate_data(id)
+        headers = _certificate_headers(etag=cached["etag"])
+        if _certificate_not_modified(request=request, etag=cached["etag"]):
+            return HttpResponseNotModified(headers=headers)
+        return self.render(cached["data"], headers=headers)
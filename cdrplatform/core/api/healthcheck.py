@@ -1,38 +1,112 @@
-from django.db import connections
-from django.db.utils import OperationalError
 from rest_framework import serializers, status
 from rest_framework.response import Response
 
-from .base import BaseAPIView
+from cdrplatform.core.health import health_readiness_aget, health_readiness_get
+
+from .base import AsyncAPIView, BaseAPIView
 
 
 class HealthView(BaseAPIView):
     """Health endpoint used to check DB connection, liveness etc."""
 
-    db_conns_to_check = ("default",)
+    authentication_classes = ()
+    # When the checks are due to run again: one per database and the catalog
+    query_budget = 5
 
     class OutputSerializer(serializers.Serializer):
         db_up = serializers.DictField()
 
-    def has_db_connection(self, db_name: str = "default") -> bool:
-        db_conn = connections[db_name]
-        try:
-            _ = db_conn.cursor()
-        except OperationalError:
-            connected = False
-        else:
-            connected = True
-        return connected
-
     def get(self, request):
-        db_conn_info = {}
+        output, status_code = self.get_output(health_readiness_get())
+        return Response(output.data, status=status_code)
+
+    @classmethod
+    def get_output(cls, report):
+        db_conn_info = {
+            alias: check["ok"] for alias, check in report["databases"].items()
+        }
         status_code = status.HTTP_200_OK
-        for db in self.db_conns_to_check:
-            db_up = self.has_db_connection(db)
-            db_conn_info[db] = db_up
+        if not all(db_conn_info.values()):
+            status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return cls.OutputSerializer({"db_up": db_conn_info}), status_code
+
+
+class LivenessView(BaseAPIView):
+    """Liveness endpoint: the process is up and serving requests. Doesn't touch
+    the database or cache so it stays cheap however often it's probed."""
+
+    authentication_classes = ()
+    query_budget = 0
+
+    class OutputSerializer(serializers.Serializer):
+        alive = serializers.BooleanField()
+
+    def get(self, request):
+        output = self.OutputSerializer({"alive": True})
+        return Response(output.data, status=status.HTTP_200_OK)
+
+
+class ReadinessView(BaseAPIView):
+    """Readiness endpoint: the databases and caches can be reached (and how
+    quickly), there is something to price and the process has been warmed up.
+    Results are reused for `HEALTH_CHECK_MAX_AGE` seconds."""
+
+    authentication_classes = ()
+    # When the checks are due to run again: one per database and the catalog
+    query_budget = 5
+
+    class OutputSerializer(serializers.Serializer):
+        class CheckSerializer(serializers.Serializer):
+            ok = serializers.BooleanField()
+            latency_ms = serializers.FloatField()
 
-            if not db_up:
-                status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        class PooledCheckSerializer(CheckSerializer):
+            pool = serializers.DictField(allow_null=True)
 
-        output = self.OutputSerializer({"db_up": db_conn_info})
+        ready = serializers.BooleanField()
+        checked_at = serializers.DateTimeField()
+        databases = serializers.DictField(child=PooledCheckSerializer())
+        caches = serializers.DictField(child=PooledCheckSerializer())
+        pricing_catalog_loaded = serializers.BooleanField()
+        warmed_up = serializers.BooleanField()
+
+    def get(self, request):
+        output, status_code = self.get_output(health_readiness_get())
         return Response(output.data, status=status_code)
+
+    @classmethod
+    def get_output(cls, report):
+        status_code = status.HTTP_200_OK
+        if not report["ready"]:
+            status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return cls.OutputSerializer(report), status_code
+
+
+class AsyncHealthView(AsyncAPIView):
+    """:class:`HealthView` for ASGI deployments."""
+
+    query_budget = HealthView.query_budget
+
+    async def get(self, request):
+        output, status_code = HealthView.get_output(await health_readiness_aget())
+        return self.render(output.data, status=status_code)
+
+
+class AsyncLivenessView(AsyncAPIView):
+    """:class:`LivenessView` for ASGI deployments."""
+
+    query_budget = LivenessView.query_budget
+
+    async def get(self, request):
+        output = LivenessView.OutputSerializer({"alive": True})
+        return self.render(output.data)
+
+
+class AsyncReadinessView(AsyncAPIView):
+    """:class:`ReadinessView` for ASGI deployments."""
+
+    query_budget = ReadinessView.query_budget
+
+    async def get(self, request):
+        output, status_code = ReadinessView.get_output(await health_readiness_aget())
+        return self.render(output.data, status=status_code)
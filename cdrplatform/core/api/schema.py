@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from drf_spectacular.views import SpectacularAPIView
+
+from cdrplatform.core.schema import content_encoding_negotiate, schema_get
+
+
+class SchemaView(SpectacularAPIView):
+    """:class:`SpectacularAPIView` serving a schema generated once per process
+    (see :func:`schema_get`) rather than on every request, compressed with the
+    best encoding the client accepts. Clients always revalidate it with its
+    ETag, so they get a new schema as soon as it is deployed."""
+
+    def get(self, request, *args, **kwargs):
+        # Translated schemas aren't worth keeping
+        if settings.USE_I18N and request.GET.get("lang"):
+            return super().get(request, *args, **kwargs)
+
+        version = (
+            self.api_version or request.version or self._get_version_parameter(request)
+        )
+        schema = schema_get(api_version=version, renderer=request.accepted_renderer)
+        encoding = content_encoding_negotiate(
+            request=request, available=schema["variants"]
+        )
+        headers = {
+            "ETag": schema["etags"][encoding],
+            "Cache-Control": "public, no-cache",
+        }
+
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if "*" in if_none_match or set(if_none_match) & set(schema["etags"].values()):
+            response = HttpResponseNotModified(headers=headers)
+        else:
+            content_type = request.accepted_media_type
+            if request.accepted_renderer.charset:
+                content_type += f"; charset={request.accepted_renderer.charset}"
+            if encoding != "identity":
+                headers["Content-Encoding"] = encoding
+            headers[
+                "Content-Disposition"
+            ] = f'inline; filename="{self._get_filename(request, version)}"'
+            response = HttpResponse(
+                schema["variants"][encoding],
+                content_type=content_type,
+                headers=headers,
+            )
+        patch_vary_headers(response, ("Accept", "Accept-Encoding"))
+        return response
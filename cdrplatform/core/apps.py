@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "cdrplatform.core"
+
+    def ready(self):
+        from cdrplatform.core import signals  # noqa: F401
@@ -0,0 +1,305 @@
+import contextlib
+import datetime
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable
+
+from django.db import connections
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cdrplatform.core.crypto import CertificateIDGenerator
+from cdrplatform.core.middleware import QueryCounter
+from cdrplatform.core.models import (
+    Certificate,
+    CurrencyChoices,
+    CurrencyConversionRate,
+    CustomerOrganisation,
+    OrganisationAPIKey,
+    RemovalMethod,
+    RemovalPartner,
+    RemovalRequest,
+    RemovalRequestItem,
+    WeightUnitChoices,
+)
+from cdrplatform.core.selectors import (
+    api_key_must_be_present_and_valid,
+    removal_method_calculate_removal_cost,
+    variable_fees_calculate,
+)
+from cdrplatform.core.services import (
+    certificate_cache_invalidate,
+    removal_request_create,
+)
+
+BENCHMARK_SLUG_PREFIX = "benchmark-"
+
+BENCHMARK_NAMES = (
+    "removal_method_calculate_removal_cost",
+    "variable_fees_calculate",
+    "removal_request_create",
+    "api_key_must_be_present_and_valid",
+    "cdr_pricing_view",
+    "certificate_retrieval_view",
+    "certificate_retrieval_view_cold",
+)
+
+# The benchmarks cache what they seed (e.g. certificates) so they run with their
+# own cache rather than leaving entries for data that is rolled back
+BENCHMARK_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark",
+    }
+}
+
+
+def benchmark_seed(
+    *,
+    partners: int,
+    rate_days: int,
+    organisations: int,
+    removal_requests: int,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Seeds a catalog of removal partners, a daily history of conversion rates
+    between every pair of currencies and a history of removal requests spread over
+    the organisations, with a certificate for the first request.
+
+    Returns what the benchmarks need to use them."""
+    randomiser = random.Random(seed)  # nosec B311
+    methods = RemovalMethod.objects.bulk_create(
+        RemovalMethod(
+            name=f"Benchmark method {i}",
+            slug=f"{BENCHMARK_SLUG_PREFIX}{i}",
+            description="Seeded for benchmarks",
+        )
+        for i in range(partners)
+    )
+    removal_partners = RemovalPartner.objects.bulk_create(
+        RemovalPartner(
+            removal_method=method,
+            name=f"Benchmark partner {i}",
+            slug=f"{BENCHMARK_SLUG_PREFIX}{i}",
+            description="Seeded for benchmarks",
+            website="https://example.com",
+            cost_per_tonne=randomiser.randint(50, 1000) * 100,
+            currency=randomiser.choice(CurrencyChoices.values),
+        )
+        for i, method in enumerate(methods)
+    )
+
+    now = timezone.now()
+    CurrencyConversionRate.objects.bulk_create(
+        (
+            CurrencyConversionRate(
+                from_currency=from_currency,
+                to_currency=to_currency,
+                rate=(
+                    Decimal(1)
+                    if from_currency == to_currency
+                    else Decimal(randomiser.uniform(0.5, 1.5)).quantize(
+                        Decimal("0.0001")
+                    )
+                ),
+                date_time=now - datetime.timedelta(days=day),
+            )
+            for day in range(rate_days)
+            for from_currency in CurrencyChoices.values
+            for to_currency in CurrencyChoices.values
+        ),
+        batch_size=1000,
+    )
+
+    customer_organisations = CustomerOrganisation.objects.bulk_create(
+        CustomerOrganisation(organisation_name=f"Benchmark organisation {i}")
+        for i in range(organisations)
+    )
+    # Keys are hashed with the password hasher so create them one by one
+    api_keys = [
+        OrganisationAPIKey.objects.create_key(
+            organisation=organisation, name="benchmark"
+        )[1]
+        for organisation in customer_organisations
+    ]
+
+    requests = RemovalRequest.objects.bulk_create(
+        (
+            RemovalRequest(
+                is_test=False,
+                weight_unit=randomiser.choice(WeightUnitChoices.values),
+                requested_datetime=now
+                - datetime.timedelta(seconds=randomiser.randint(0, rate_days * 86400)),
+                currency=randomiser.choice(CurrencyChoices.values),
+                customer_organisation=randomiser.choice(customer_organisations),
+            )
+            for _ in range(removal_requests)
+        ),
+        batch_size=1000,
+    )
+    RemovalRequestItem.objects.bulk_create(
+        (
+            RemovalRequestItem(
+                removal_partner=partner,
+                removal_request=removal_request,
+                cdr_cost=randomiser.randint(100, 100_000),
+                variable_fees=randomiser.randint(10, 10_000),
+                cdr_amount=randomiser.randint(1, 1000),
+            )
+            for removal_request in requests
+            for partner in randomiser.sample(
+                removal_partners, k=randomiser.randint(1, min(3, partners))
+            )
+        ),
+        batch_size=1000,
+    )
+
+    certificate = Certificate.objects.create(
+        removal_request=requests[0],
+        certificate_id=CertificateIDGenerator().generate(requests[0].pk),
+        issued_date=now.date(),
+        display_name="Benchmark",
+    )
+    return {
+        "removal_partners": removal_partners,
+        "customer_organisation": customer_organisations[0],
+        "api_key": api_keys[0],
+        "certificate_id": certificate.certificate_id,
+    }
+
+
+def benchmark_list(*, seeded: Dict[str, Any]) -> Dict[str, Callable[[], Any]]:
+    """The benchmarked hot paths, by name."""
+    partner = seeded["removal_partners"][0]
+    items = [
+        {"method_type": removal_partner.removal_method.slug, "cdr_amount": 10}
+        for removal_partner in seeded["removal_partners"][:3]
+    ]
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Api-Key {seeded['api_key']}")
+
+    def request(method: str, url: str, **kwargs):
+        response = getattr(client, method)(url, **kwargs)
+        if response.status_code >= 400:
+            raise AssertionError(
+                f"{method.upper()} {url} returned {response.status_code}"
+            )
+
+    certificate_url = reverse(
+        "v1:certificate_retrieve", kwargs={"id": seeded["certificate_id"]}
+    )
+
+    def certificate_retrieval_cold():
+        certificate_cache_invalidate(certificate_id=seeded["certificate_id"])
+        request("get", certificate_url)
+
+    return {
+        "removal_method_calculate_removal_cost": lambda: (
+            removal_method_calculate_removal_cost(
+                removal_partner=partner,
+                currency=CurrencyChoices.CHF,
+                cdr_amount=10,
+                weight_unit=WeightUnitChoices.TONNE,
+            )
+        ),
+        "variable_fees_calculate": lambda: variable_fees_calculate(removal_cost=12345),
+        "removal_request_create": lambda: removal_request_create(
+            is_test=True,
+            weight_unit=WeightUnitChoices.TONNE,
+            currency=CurrencyChoices.CHF,
+            org_id=seeded["customer_organisation"].pk,
+            request_items=items,
+        ),
+        "api_key_must_be_present_and_valid": lambda: (
+            api_key_must_be_present_and_valid(key=seeded["api_key"])
+        ),
+        "cdr_pricing_view": lambda: request(
+            "post",
+            reverse("v1:cdr_price"),
+            data={"weight_unit": "t", "currency": "chf", "items": items},
+            format="json",
+        ),
+        # Certificates are cached after the first request so this is the cache hit
+        "certificate_retrieval_view": lambda: request("get", certificate_url),
+        # And this the cache miss, e.g. after a deploy or an edit
+        "certificate_retrieval_view_cold": certificate_retrieval_cold,
+    }
+
+
+def benchmark_measure(
+    *,
+    func: Callable[[], Any],
+    iterations: int,
+    rounds: int,
+    warmup: int = 3,
+) -> Dict[str, float]:
+    """Times `rounds` rounds of `iterations` calls and reports the fastest round
+    (the one least disturbed by anything else running), the queries made per call
+    and the peak memory allocated by a single call."""
+    for _ in range(warmup):
+        func()
+
+    counter = QueryCounter()
+    timings = []
+    with contextlib.ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            timings.append(time.perf_counter() - start)
+
+    # Tracing allocations slows everything down so measure memory separately
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best = min(timings)
+    return {
+        "ops_per_sec": round(iterations / best, 2),
+        "mean_us": round(best / iterations * 1_000_000, 2),
+        "queries_per_call": round(counter.count / (iterations * rounds), 2),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def benchmark_compare(
+    *,
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> Iterable[str]:
+    """Describes the benchmarks that got more than `threshold` percent slower,
+    make more queries or use more than `threshold` percent more memory than in a
+    baseline."""
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        slower = (old["ops_per_sec"] - result["ops_per_sec"]) / old["ops_per_sec"]
+        if slower * 100 > threshold:
+            yield (
+                f"{name}: {result['ops_per_sec']} ops/sec, "
+                + f"{slower * 100:.1f}% slower than {old['ops_per_sec']}"
+            )
+        if result["queries_per_call"] > old["queries_per_call"]:
+            yield (
+                f"{name}: {result['queries_per_call']} queries per call, "
+                + f"up from {old['queries_per_call']}"
+            )
+        more_memory = result["peak_memory_kb"] - old["peak_memory_kb"]
+        if (
+            old["peak_memory_kb"]
+            and more_memory / old["peak_memory_kb"] * 100 > threshold
+        ):
+            yield (
+                f"{name}: {result['peak_memory_kb']} KB peak memory, "
+                + f"up from {old['peak_memory_kb']}"
+            )
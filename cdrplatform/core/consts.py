@@ -1 +1,14 @@
 SESSION_KEY_ORG_ID = "customer_org_id"
+
+# Cache key for the serialized representation of a certificate.
+# Formatted with the public certificate ID.
+CACHE_KEY_CERTIFICATE = "certificate:{certificate_id}"
+
+# Cache key written and read back by the readiness check of each process
+CACHE_KEY_HEALTH_CHECK = "health:check:{host}:{pid}"
+
+# Cache key set for a while after a client writes so its reads go to the primary
+# database. Formatted with what identifies the client e.g. its session.
+CACHE_KEY_DB_PRIMARY_STICKY = "db:primary:{key}"
+# Cache key of the short ID of the organisation of a client (e.g. its API key)
+CACHE_KEY_DB_CLIENT_ORGANISATION = "db:organisation:{key}"
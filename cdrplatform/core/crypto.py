@@ -1,3 +1,10 @@
+import hashlib
+import hmac
+import string
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.utils.crypto import get_random_string
 from rest_framework_api_key.crypto import KeyGenerator
 
@@ -27,3 +34,70 @@ class ProdKeyGenerator(PrefixKeyGenerator):
     """Generates a key with `prod_`."""
 
     prefix = "prod_"
+
+
+class CertificateIDGenerator:
+    """Generates public certificate IDs in the `AAA-BBB-CCC` format.
+
+    Rather than picking random IDs and retrying on collision, a number that is
+    already unique (e.g. a primary key) is mapped onto the ID keyspace with a keyed
+    Feistel permutation. Being a permutation, distinct numbers always give distinct
+    IDs while the IDs themselves don't reveal the underlying sequence.
+
+    The permutation is keyed on `CERTIFICATE_ID_KEY` rather than `SECRET_KEY` as
+    changing the key changes every ID, and new IDs could then collide with those
+    already issued. It must never change once certificates have been issued.
+    """
+
+    alphabet = string.ascii_uppercase
+    group_length = 3
+    groups = 3
+    rounds = 4
+
+    def __init__(self, secret: Optional[str] = None):
+        secret = secret or settings.CERTIFICATE_ID_KEY
+        if not secret:
+            raise ImproperlyConfigured("CERTIFICATE_ID_KEY must be set to issue IDs")
+        self.secret = secret.encode()
+        self.keyspace = len(self.alphabet) ** (self.group_length * self.groups)
+        # Feistel networks permute a power of two so use the smallest even
+        # number of bits that covers the keyspace and "cycle walk" back into it
+        bits = (self.keyspace - 1).bit_length()
+        self.half_bits = (bits + 1) // 2
+        self.half_mask = (1 << self.half_bits) - 1
+
+    def _round(self, round_number: int, value: int) -> int:
+        digest = hmac.new(
+            self.secret,
+            f"{round_number}:{value}".encode(),
+            hashlib.sha256,
+        ).digest()
+        return int.from_bytes(digest[:8], "big") & self.half_mask
+
+    def _permute_once(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.half_mask
+        for round_number in range(self.rounds):
+            left, right = right, left ^ self._round(round_number, right)
+        return (left << self.half_bits) | right
+
+    def permute(self, value: int) -> int:
+        if not 0 <= value < self.keyspace:
+            raise ValueError(f"{value} is outside of the certificate ID keyspace")
+        value = self._permute_once(value)
+        while value >= self.keyspace:
+            value = self._permute_once(value)
+        return value
+
+    def encode(self, value: int) -> str:
+        chars = []
+        for _ in range(self.group_length * self.groups):
+            value, index = divmod(value, len(self.alphabet))
+            chars.append(self.alphabet[index])
+        return "-".join(
+            "".join(chars[i : i + self.group_length])
+            for i in range(0, len(chars), self.group_length)
+        )
+
+    def generate(self, value: int) -> str:
+        """Returns the certificate ID for a unique, non-negative number."""
+        return self.encode(self.permute(value))
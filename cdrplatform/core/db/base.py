@@ -0,0 +1,84 @@
+from functools import partial
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from cdrplatform.core.db.pool import ConnectionPoolTimeout, connection_pool_get
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend taking its connections from a pool shared by the
+    threads of the process (see `DB_POOL_MAX_SIZE`) rather than opening a new
+    one whenever Django connects and closing it whenever Django closes it.
+
+    `CONN_MAX_AGE` must be 0: Django would otherwise keep a connection out of the
+    pool for each thread between requests."""
+
+    def __init__(self, settings_dict, *args, **kwargs):
+        if settings_dict.get("CONN_MAX_AGE"):
+            raise ImproperlyConfigured(
+                "CONN_MAX_AGE must be 0 when pooling connections (DB_POOL_MAX_SIZE)."
+            )
+        super().__init__(settings_dict, *args, **kwargs)
+        # The pool the current connection came from
+        self.pool = None
+
+    def get_pool(self):
+        pool_settings = self.settings_dict["POOL"]
+        return connection_pool_get(
+            alias=self.alias,
+            params={
+                key: self.settings_dict[key]
+                for key in ("NAME", "USER", "PASSWORD", "HOST", "PORT", "OPTIONS")
+            },
+            max_size=pool_settings["max_size"],
+            timeout=pool_settings["timeout"],
+        )
+
+    def get_new_connection(self, conn_params):
+        check = None
+        if self.settings_dict["CONN_HEALTH_CHECKS"]:
+            check = self._pooled_connection_is_usable
+        pool = self.get_pool()
+        try:
+            connection = pool.acquire(
+                connect=partial(super().get_new_connection, conn_params),
+                check=check,
+            )
+        except ConnectionPoolTimeout as err:
+            # So it's raised as Django's `OperationalError`
+            raise self.Database.OperationalError(str(err)) from err
+        self.pool = pool
+        # Set by the parent when connecting and needed for reused connections too
+        self.isolation_level = IsolationLevel(
+            self.settings_dict["OPTIONS"].get(
+                "isolation_level", IsolationLevel.READ_COMMITTED
+            )
+        )
+        return connection
+
+    def _pooled_connection_is_usable(self, connection) -> bool:
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        if self.connection is None:
+            return
+        reuse = not self.errors_occurred and not self.connection.closed
+        if reuse:
+            # Don't hand over an open transaction to the next user
+            try:
+                self.connection.rollback()
+            except self.Database.Error:
+                reuse = False
+        # Not `get_pool()` which may have been replaced since
+        self.pool.release(self.connection, reuse=reuse)
+        self.pool = None
@@ -0,0 +1,22 @@
+import hashlib
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.transaction import TransactionManagementError
+
+
+def db_advisory_xact_lock(*, name: str, using: str = DEFAULT_DB_ALIAS):
+    """Waits for and takes the PostgreSQL advisory lock `name`, held until the
+    current transaction ends, so that transactions taking it run one at a time.
+
+    Does nothing on other databases; SQLite only allows one writer anyway."""
+    connection = connections[using]
+    if not connection.in_atomic_block:
+        raise TransactionManagementError(
+            "db_advisory_xact_lock() can only be used in a transaction."
+        )
+    if connection.vendor != "postgresql":
+        return
+    # Advisory locks are identified by a signed 64-bit integer
+    key = int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], "big", signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [key])
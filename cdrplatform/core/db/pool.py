@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class ConnectionPoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """A pool of DB-API connections to one database shared by the threads of this
+    process. At most `max_size` connections are open at once, when they are all in
+    use :meth:`acquire` waits up to `timeout` seconds for one to be released."""
+
+    def __init__(
+        self,
+        *,
+        max_size: int,
+        timeout: float,
+        params: Optional[Dict[str, Any]] = None,
+    ):
+        self.max_size = max_size
+        self.timeout = timeout
+        # What the connections were opened with
+        self.params = params
+        # Connections opened before a fork belong to the parent process
+        self.pid = os.getpid()
+        self._condition = threading.Condition()
+        self._idle: List[Any] = []
+        self._size = 0
+        self._waiting = 0
+        self._timeouts = 0
+        self._closed = False
+
+    def acquire(
+        self,
+        *,
+        connect: Callable[[], Any],
+        check: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """Returns an idle connection, the most recently used first, or one opened
+        with `connect`. Idle connections failing `check` are replaced."""
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            self._waiting += 1
+            try:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise ConnectionPoolTimeout(
+                            f"No database connection available after {self.timeout}s "
+                            + f"({self.max_size} in use)"
+                        )
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting -= 1
+            connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                # Reserve the slot while connecting outside the lock
+                self._size += 1
+
+        if connection is not None and check is not None and not check(connection):
+            _close_quietly(connection)
+            connection = None
+        if connection is None:
+            try:
+                connection = connect()
+            except BaseException:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                raise
+        return connection
+
+    def release(self, connection: Any, *, reuse: bool = True):
+        """Returns a connection to the pool or, if it can't be reused, closes it."""
+        with self._condition:
+            reuse = reuse and not self._closed
+        if not reuse:
+            _close_quietly(connection)
+        with self._condition:
+            if reuse:
+                self._idle.append(connection)
+            else:
+                self._size -= 1
+            self._condition.notify()
+
+    def close_idle(self):
+        """Closes the connections that aren't in use."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for connection in idle:
+            _close_quietly(connection)
+
+    def close(self):
+        """Closes the idle connections and those in use once they are released."""
+        with self._condition:
+            self._closed = True
+        self.close_idle()
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return {
+                "size": self._size,
+                "in_use": self._size - len(self._idle),
+                "idle": len(self._idle),
+                "max": self.max_size,
+                "waiting": self._waiting,
+                "timeouts": self._timeouts,
+            }
+
+
+def _close_quietly(connection: Any):
+    try:
+        connection.close()
+    except Exception:  # Each driver raises its own errors
+        pass
+
+
+# The pool of each database alias in this process
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def connection_pool_get(
+    *,
+    alias: str,
+    params: Dict[str, Any],
+    max_size: int,
+    timeout: float,
+) -> ConnectionPool:
+    """Returns the pool of a database, creating it on first use in this process.
+
+    The pool is replaced when the connection `params` of the alias change (e.g.
+    when the test runner switches to the test database) so its connections are
+    never handed out for another database."""
+    replaced = None
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None or pool.pid != os.getpid() or pool.params != params:
+            if pool is not None and pool.pid == os.getpid():
+                replaced = pool
+            pool = _pools[alias] = ConnectionPool(
+                max_size=max_size, timeout=timeout, params=params
+            )
+    if replaced is not None:
+        replaced.close()
+    return pool
+
+
+def connection_pool_stats(*, alias: str) -> Optional[Dict[str, int]]:
+    """Usage of the pool of a database, `None` when it isn't pooled (or hasn't
+    connected yet) in this process."""
+    pool = _pools.get(alias)
+    if pool is None or pool.pid != os.getpid():
+        return None
+    return pool.stats()
+
+
+def connection_pool_close_idle():
+    """Closes the idle connections of every pool of this process."""
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == os.getpid()]
+    for pool in pools:
+        pool.close_idle()
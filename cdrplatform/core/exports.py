@@ -0,0 +1,147 @@
+import csv
+import gzip
+import importlib.util
+import io
+import json
+import uuid
+import zlib
+from typing import Any, Iterable, Iterator, Sequence
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+# Supported export file types and the content type they are served with
+EXPORT_FILE_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+EXPORT_COMPRESSIONS = ("gzip",)
+# File types that can be written by :func:`export_file_content`. Parquet needs the
+# optional `pyarrow` package, installed with `poetry install --extras parquet`.
+EXPORT_FILE_EXTENSIONS = {
+    "csv": "csv.gz",
+    "jsonl": "jsonl.gz",
+    "parquet": "parquet",
+}
+
+
+class Echo:
+    """A file-like object that returns what is written to it rather than
+    storing it, so a :func:`csv.writer` can be used to produce each line.
+
+    https://docs.djangoproject.com/en/4.2/howto/outputting-csv/#streaming-large-csv-files
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def export_lines_csv(
+    *,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+) -> Iterator[str]:
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_lines_jsonl(
+    *,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def export_gzip(*, lines: Iterable[str]) -> Iterator[bytes]:
+    """Compresses a stream of lines as they are produced."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)  # gzip container
+    for line in lines:
+        chunk = compressor.compress(line.encode())
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+def export_streaming_response(
+    *,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    file_type: str,
+    filename: str,
+    compression: str = "",
+) -> StreamingHttpResponse:
+    """Streams rows to the client as a (optionally gzipped) `csv` or `jsonl`
+    file. Rows should be an iterator (e.g. `QuerySet.iterator()`) so that memory
+    use stays flat however many rows are exported."""
+    if file_type == "csv":
+        lines = export_lines_csv(columns=columns, rows=rows)
+    else:
+        lines = export_lines_jsonl(columns=columns, rows=rows)
+
+    content_type = EXPORT_FILE_TYPES[file_type]
+    filename = f"{filename}.{file_type}"
+    if compression == "gzip":
+        lines = export_gzip(lines=lines)
+        content_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingHttpResponse(
+        lines,
+        content_type=content_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def export_parquet_is_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def export_parquet(
+    *,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+) -> bytes:
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImproperlyConfigured(
+            "Writing Parquet files requires `pyarrow`, install it with "
+            + "`poetry install --extras parquet`"
+        )
+
+    table = pyarrow.Table.from_pylist(
+        [
+            # Arrow has no UUID type so store them as strings
+            {
+                column: str(value) if isinstance(value, uuid.UUID) else value
+                for column, value in zip(columns, row)
+            }
+            for row in rows
+        ]
+    )
+    output = io.BytesIO()
+    pyarrow.parquet.write_table(table, output, compression="zstd")
+    return output.getvalue()
+
+
+def export_file_content(
+    *,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    file_type: str,
+) -> bytes:
+    """Returns the content of a whole file of rows: a Parquet file or a gzipped
+    `csv` or `jsonl` file. See :data:`EXPORT_FILE_EXTENSIONS`."""
+    if file_type == "parquet":
+        return export_parquet(columns=columns, rows=rows)
+    if file_type == "csv":
+        lines = export_lines_csv(columns=columns, rows=rows)
+    else:
+        lines = export_lines_jsonl(columns=columns, rows=rows)
+    return gzip.compress("".join(lines).encode())
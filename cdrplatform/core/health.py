@@ -0,0 +1,126 @@
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+from cdrplatform.core.consts import CACHE_KEY_HEALTH_CHECK
+from cdrplatform.core.db.pool import connection_pool_stats
+from cdrplatform.core.selectors import pricing_catalog_is_loaded
+from cdrplatform.core.warmup import warm_up_is_complete
+
+# The last readiness report of this process and when it expires
+_readiness: Dict[str, Any] = {"report": None, "expires": 0.0}
+_readiness_lock = threading.Lock()
+
+
+def _milliseconds_since(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def health_check_database(*, alias: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        ok = True
+    except DatabaseError:
+        ok = False
+    return {
+        "ok": ok,
+        "latency_ms": _milliseconds_since(start),
+        "pool": connection_pool_stats(alias=alias),
+    }
+
+
+def health_cache_pool(*, alias: str) -> Optional[Dict[str, Any]]:
+    """Connection pool usage of a Redis cache, `None` for other backends.
+
+    redis-py doesn't expose the usage of its pools so this reads their private
+    attributes; anything a version doesn't have is left out."""
+    pools = getattr(caches[alias], "_cache", None)
+    pools = getattr(pools, "_pools", None)
+    if not pools:
+        return None
+    usage = {}
+    for name, attribute, measure in (
+        ("created", "_created_connections", int),
+        ("in_use", "_in_use_connections", len),
+        ("max", "max_connections", int),
+    ):
+        values = [getattr(pool, attribute, None) for pool in pools.values()]
+        if None not in values:
+            usage[name] = sum(measure(value) for value in values)
+    return usage
+
+
+def health_check_cache(*, alias: str) -> Dict[str, Any]:
+    cache = caches[alias]
+    # Processes sharing the cache don't read each other's values
+    key = CACHE_KEY_HEALTH_CHECK.format(host=socket.gethostname(), pid=os.getpid())
+    value = time.time_ns()
+    start = time.perf_counter()
+    try:
+        cache.set(key, value, timeout=60)
+        ok = cache.get(key) == value
+    except Exception:  # Each backend raises its own connection errors
+        ok = False
+    return {
+        "ok": ok,
+        "latency_ms": _milliseconds_since(start),
+        "pool": health_cache_pool(alias=alias),
+    }
+
+
+def health_readiness_check() -> Dict[str, Any]:
+    """Checks every database and cache, whether there is anything to price and
+    whether the process has been warmed up (when `WARM_UP` is set)."""
+    databases = {
+        alias: health_check_database(alias=alias) for alias in settings.DATABASES
+    }
+    cache_checks = {alias: health_check_cache(alias=alias) for alias in settings.CACHES}
+    try:
+        catalog_loaded = databases["default"]["ok"] and pricing_catalog_is_loaded()
+    except DatabaseError:
+        catalog_loaded = False
+    warmed_up = warm_up_is_complete() or not settings.WARM_UP
+
+    return {
+        "ready": (
+            catalog_loaded
+            and warmed_up
+            and all(check["ok"] for check in databases.values())
+            and all(check["ok"] for check in cache_checks.values())
+        ),
+        "checked_at": timezone.now(),
+        "databases": databases,
+        "caches": cache_checks,
+        "pricing_catalog_loaded": catalog_loaded,
+        "warmed_up": warmed_up,
+    }
+
+
+def health_readiness_get() -> Dict[str, Any]:
+    """Returns the readiness report of this process, checking again at most every
+    `HEALTH_CHECK_MAX_AGE` seconds. Concurrent probes wait for a single check
+    rather than all checking at once."""
+    with _readiness_lock:
+        if _readiness["report"] is None or time.monotonic() >= _readiness["expires"]:
+            _readiness["report"] = health_readiness_check()
+            _readiness["expires"] = time.monotonic() + settings.HEALTH_CHECK_MAX_AGE
+        return _readiness["report"]
+
+
+async def health_readiness_aget() -> Dict[str, Any]:
+    """Async version of :func:`health_readiness_get`. A fresh report is returned
+    straight away and only running the checks (which block) is done in a thread."""
+    if _readiness["report"] is not None and time.monotonic() < _readiness["expires"]:
+        return _readiness["report"]
+    return await sync_to_async(health_readiness_get)()
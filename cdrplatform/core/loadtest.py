@@ -0,0 +1,300 @@
+import collections
+import http.client
+import itertools
+import json
+import re
+import subprocess  # nosec B404
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+HTTP_REQUEST_LINE_RE = re.compile(r"^(GET|POST|PUT|PATCH|DELETE|HEAD|OPTIONS) (\S+)")
+HTTP_VARIABLE_RE = re.compile(r"{{\s*([\w-]+)\s*}}")
+HTTP_VARIABLE_DEFINITION_RE = re.compile(r"^@([\w-]+)\s*=\s*(.*)$")
+
+# Requests that don't change any data and so can be replayed against any server
+LOADTEST_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# Paths of the POST endpoints that only read, e.g. pricing
+LOADTEST_READ_ONLY_PATHS = ("/v1/cdr/price/",)
+
+
+class LoadTestRequest:
+    """A request to replay, with `{{variables}}` already substituted."""
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        body: str = "",
+    ):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.body = body.encode()
+
+    def __repr__(self) -> str:
+        return f"<LoadTestRequest {self.name}>"
+
+    @property
+    def is_safe(self) -> bool:
+        """Whether replaying the request leaves the data as it was, unlike e.g.
+        `POST /v1/cdr/` which makes a purchase."""
+        path = urllib.parse.urlsplit(self.url).path
+        return self.method in LOADTEST_SAFE_METHODS or (
+            self.method == "POST" and path.endswith(LOADTEST_READ_ONLY_PATHS)
+        )
+
+
+def _substitute(*, text: str, variables: Dict[str, str]) -> str:
+    def replace(match):
+        try:
+            return variables[match.group(1)]
+        except KeyError:
+            raise ValueError(f"No value for the variable `{match.group(1)}`")
+
+    return HTTP_VARIABLE_RE.sub(replace, text)
+
+
+def loadtest_parse_http_file(
+    *,
+    path: Path,
+    variables: Dict[str, str],
+) -> List[LoadTestRequest]:
+    """Parses the requests in a REST Client `.http` file (as in `rest-examples/`).
+
+    Requests are separated by `###` lines, and the text after the `###` (if any)
+    names the request. `@name = value` lines define variables."""
+    variables = dict(variables)
+    requests = []
+    blocks = re.split(r"^###", path.read_text(), flags=re.MULTILINE)
+    for index, block in enumerate(blocks):
+        lines = block.splitlines()
+        name = ""
+        if index > 0 and lines:
+            # The rest of the `###` line
+            name = lines.pop(0).strip()
+
+        # Skip comments and variable definitions before the request line
+        while lines and not HTTP_REQUEST_LINE_RE.match(lines[0]):
+            definition = HTTP_VARIABLE_DEFINITION_RE.match(lines.pop(0).strip())
+            if definition:
+                variables[definition.group(1)] = definition.group(2)
+        if not lines:
+            continue
+
+        method, url = HTTP_REQUEST_LINE_RE.match(lines.pop(0)).groups()
+        headers = {}
+        while lines and lines[0].strip():
+            header, _, value = lines.pop(0).partition(":")
+            headers[header.strip()] = _substitute(
+                text=value.strip(), variables=variables
+            )
+        requests.append(
+            LoadTestRequest(
+                name=f"{path.stem}: {name or f'{method} {url}'}",
+                method=method,
+                url=_substitute(text=url, variables=variables),
+                headers=headers,
+                body=_substitute(text="\n".join(lines).strip(), variables=variables),
+            )
+        )
+    return requests
+
+
+def loadtest_parse_jsonl_file(
+    *,
+    path: Path,
+    variables: Dict[str, str],
+) -> List[LoadTestRequest]:
+    """Parses recorded requests, one JSON object per line with a `method`,
+    `path` and optionally `headers`, `body` and `name`."""
+    requests = []
+    with path.open() as lines:
+        for line in lines:
+            if not line.strip():
+                continue
+            recorded = json.loads(line)
+            body = recorded.get("body", "")
+            if not isinstance(body, str):
+                body = json.dumps(body)
+            requests.append(
+                LoadTestRequest(
+                    name=recorded.get(
+                        "name", f"{path.stem}: {recorded['method']} {recorded['path']}"
+                    ),
+                    method=recorded["method"],
+                    url=_substitute(
+                        text="{{host}}" + recorded["path"], variables=variables
+                    ),
+                    headers={
+                        header: _substitute(text=value, variables=variables)
+                        for header, value in recorded.get("headers", {}).items()
+                    },
+                    body=_substitute(text=body, variables=variables),
+                )
+            )
+    return requests
+
+
+def _percentiles(latencies: List[float]) -> Dict[str, Optional[float]]:
+    latencies = sorted(latencies)
+    if not latencies:
+        return dict.fromkeys(("mean", "p50", "p90", "p95", "p99", "max"))
+
+    def percentile(p: int) -> float:
+        # Nearest rank
+        rank = max(int(-(-p * len(latencies) // 100)) - 1, 0)
+        return round(latencies[rank] * 1000, 2)
+
+    return {
+        "mean": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50": percentile(50),
+        "p90": percentile(90),
+        "p95": percentile(95),
+        "p99": percentile(99),
+        "max": round(latencies[-1] * 1000, 2),
+    }
+
+
+def _summarise(results: List[tuple], duration: float) -> Dict[str, Any]:
+    errors = sum(1 for _, _, status, _ in results if status is None or status >= 500)
+    return {
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": round(errors / len(results), 4) if results else 0.0,
+        "throughput_rps": round(len(results) / duration, 2) if duration else 0.0,
+        "latency_ms": _percentiles([latency for _, latency, _, _ in results]),
+        "status_codes": dict(
+            collections.Counter(str(status or "error") for _, _, status, _ in results)
+        ),
+    }
+
+
+def loadtest_run(
+    *,
+    requests: List[LoadTestRequest],
+    concurrency: int,
+    duration: Optional[float] = None,
+    total: Optional[int] = None,
+    timeout: float = 30.0,
+) -> Dict[str, Any]:
+    """Replays the requests in turn from `concurrency` threads, each with its own
+    keep-alive connection, for `duration` seconds or until `total` requests have
+    been made.
+
+    Requests that fail or respond with a `5xx` status count as errors."""
+    counter = itertools.count()
+    stop = threading.Event()
+    results: List[tuple] = []
+    results_lock = threading.Lock()
+
+    def worker():
+        connections: Dict[str, http.client.HTTPConnection] = {}
+        while not stop.is_set():
+            index = next(counter)
+            if total is not None and index >= total:
+                break
+            request = requests[index % len(requests)]
+            url = urllib.parse.urlsplit(request.url)
+            if url.netloc not in connections:
+                connection_class = http.client.HTTPConnection
+                if url.scheme == "https":
+                    connection_class = http.client.HTTPSConnection
+                connections[url.netloc] = connection_class(url.netloc, timeout=timeout)
+            connection = connections[url.netloc]
+
+            path = url.path + (f"?{url.query}" if url.query else "")
+            status, error = None, ""
+            start = time.perf_counter()
+            try:
+                connection.request(
+                    request.method,
+                    path,
+                    body=request.body or None,
+                    headers=request.headers,
+                )
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as err:
+                error = repr(err)
+                connection.close()  # Reconnect for the next request
+            latency = time.perf_counter() - start
+            with results_lock:
+                results.append((request.name, latency, status, error))
+
+        for connection in connections.values():
+            connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+        if duration is not None:
+            stop.wait(duration)
+            stop.set()
+    elapsed = time.perf_counter() - start
+
+    by_scenario = collections.defaultdict(list)
+    for result in results:
+        by_scenario[result[0]].append(result)
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        **_summarise(results, elapsed),
+        "scenarios": {
+            name: _summarise(scenario_results, elapsed)
+            for name, scenario_results in sorted(by_scenario.items())
+        },
+    }
+
+
+def loadtest_compare(
+    *,
+    report: Dict[str, Any],
+    baseline: Dict[str, Any],
+) -> Iterable[str]:
+    """Describes how throughput, p95 latency and the error rate changed from a
+    baseline report for each concurrency level in both."""
+
+    def change(new, old) -> str:
+        if not old or new is None:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    baseline_runs = {run["concurrency"]: run for run in baseline["runs"]}
+    for run in report["runs"]:
+        old = baseline_runs.get(run["concurrency"])
+        if old is None:
+            continue
+        yield (
+            f"concurrency {run['concurrency']}: "
+            + f"throughput {run['throughput_rps']} rps "
+            + f"({change(run['throughput_rps'], old['throughput_rps'])}), "
+            + f"p95 {run['latency_ms']['p95']} ms "
+            + f"({change(run['latency_ms']['p95'], old['latency_ms']['p95'])}), "
+            + f"error rate {run['error_rate']} (was {old['error_rate']})"
+        )
+
+
+def git_commit_get() -> str:
+    """The commit the reports were made on, if known."""
+    try:
+        return subprocess.run(  # nosec B603 B607
+            ["git", "rev-parse", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
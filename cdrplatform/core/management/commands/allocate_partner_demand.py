@@ -0,0 +1,57 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from cdrplatform.core.services import partner_demand_allocate
+
+
+class Command(BaseCommand):
+    help = """Track CDR sold to customers that hasn't been ordered from partners yet
+and propose (or create) partner purchase orders.
+
+Each run only looks at removal request items added since the previous run, and
+runs wait for each other. Items committed more than --settle-seconds after they
+were requested are missed, so keep it longer than any request takes."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--create-orders",
+            action="store_true",
+            help="Create the proposed partner purchases rather than listing them.",
+        )
+        parser.add_argument(
+            "--min-order-kg",
+            type=int,
+            default=1000,
+            help="Only order from partners with at least this much demand.",
+        )
+        parser.add_argument(
+            "--settle-seconds",
+            type=int,
+            default=300,
+            help="Leave items requested within this many seconds for the next run.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would happen without saving anything.",
+        )
+
+    def handle(self, *args, **options):
+        added_grams, orders = partner_demand_allocate(
+            min_order_kg=options["min_order_kg"],
+            create_orders=options["create_orders"],
+            settle_time=datetime.timedelta(seconds=options["settle_seconds"]),
+            dry_run=options["dry_run"],
+        )
+
+        for partner_id, grams in added_grams.items():
+            self.stdout.write(f"Partner {partner_id}: +{grams}g of demand")
+
+        verb = "Created" if options["create_orders"] else "Proposed"
+        if options["dry_run"]:
+            verb = f"Would have {verb.lower()}"
+        for order in orders:
+            self.stdout.write(f"{verb} order for {order.removal_partner}: {order}")
+
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(orders)} orders."))
@@ -0,0 +1,128 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
+
+from cdrplatform.core.benchmarks import (
+    BENCHMARK_CACHES,
+    BENCHMARK_NAMES,
+    benchmark_compare,
+    benchmark_list,
+    benchmark_measure,
+    benchmark_seed,
+)
+from cdrplatform.core.loadtest import git_commit_get
+
+
+class Command(BaseCommand):
+    help = """Benchmark the pricing, purchase, API key and certificate hot paths
+against a seeded catalog and history.
+
+Reports operations per second, queries per call and peak memory as JSON. The
+seeded data is rolled back afterwards, and cached in local memory rather than
+CACHES, so it can run against any database."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--benchmark",
+            action="append",
+            dest="benchmarks",
+            choices=BENCHMARK_NAMES,
+            help="Only run these benchmarks. Can be given more than once.",
+        )
+        parser.add_argument("--iterations", type=int, default=100)
+        parser.add_argument(
+            "--rounds",
+            type=int,
+            default=5,
+            help="The fastest round of --iterations calls is reported.",
+        )
+        parser.add_argument("--partners", type=int, default=20)
+        parser.add_argument(
+            "--rate-days",
+            type=int,
+            default=365,
+            help="Days of conversion rate history to seed.",
+        )
+        parser.add_argument("--organisations", type=int, default=5)
+        parser.add_argument("--removal-requests", type=int, default=10_000)
+        parser.add_argument(
+            "--output",
+            help="Write the JSON report to this file rather than stdout.",
+        )
+        parser.add_argument(
+            "--baseline",
+            help="A previous report to compare the results with. Regressions "
+            + "make the command fail.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=10.0,
+            help="Percentage slowdown or memory increase that counts as a "
+            + "regression.",
+        )
+
+    def handle(self, *args, **options):
+        seed_options = {
+            "partners": options["partners"],
+            "rate_days": options["rate_days"],
+            "organisations": options["organisations"],
+            "removal_requests": options["removal_requests"],
+        }
+        results = {}
+        # The test client's requests are to `testserver`
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            CACHES=BENCHMARK_CACHES,
+        ):
+            with transaction.atomic():
+                self.stderr.write("Seeding...")
+                seeded = benchmark_seed(**seed_options)
+                benchmarks = benchmark_list(seeded=seeded)
+                for name in options["benchmarks"] or BENCHMARK_NAMES:
+                    results[name] = benchmark_measure(
+                        func=benchmarks[name],
+                        iterations=options["iterations"],
+                        rounds=options["rounds"],
+                    )
+                    self.stderr.write(
+                        f"{name}: {results[name]['ops_per_sec']} ops/sec, "
+                        + f"{results[name]['queries_per_call']} queries per call, "
+                        + f"{results[name]['peak_memory_kb']} KB peak memory"
+                    )
+                transaction.set_rollback(True)
+
+        report = {
+            "commit": git_commit_get(),
+            "created": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "seed": seed_options,
+            "iterations": options["iterations"],
+            "rounds": options["rounds"],
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline:
+                regressions = list(
+                    benchmark_compare(
+                        results=results,
+                        baseline=json.load(baseline)["results"],
+                        threshold=options["threshold"],
+                    )
+                )
+            for regression in regressions:
+                self.stderr.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions")
+            self.stderr.write(self.style.SUCCESS("No regressions."))
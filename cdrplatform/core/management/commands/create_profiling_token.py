@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cdrplatform.core.profiling import profiling_token_create
+
+
+class Command(BaseCommand):
+    help = """Create a token that profiles requests sent with it in the `X-Profile`
+header. Requires `PROFILING_ENABLED`."""
+
+    def handle(self, *args, **options):
+        if not settings.PROFILING_ENABLED:
+            self.stderr.write(
+                self.style.WARNING("PROFILING_ENABLED is off so nothing is profiled.")
+            )
+
+        self.stdout.write(profiling_token_create())
+        self.stdout.write(
+            f"Valid for {settings.PROFILING_TOKEN_MAX_AGE} seconds. Profiles are "
+            + f"saved to {settings.PROFILING_DIR}",
+            self.style.SUCCESS,
+        )
@@ -0,0 +1,81 @@
+import datetime
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from cdrplatform.core.exports import EXPORT_FILE_EXTENSIONS, export_parquet_is_available
+from cdrplatform.core.selectors import ANALYTICS_EXPORT_TABLES
+from cdrplatform.core.services import analytics_export
+
+
+class Command(BaseCommand):
+    help = """Export removal requests, their items, removal partners and currency
+conversion rates to files for analytics, partitioned by day.
+
+Each run only exports rows added since the previous run to the same place. Rows
+are exported once, so later changes to them (e.g. a removal request being
+invoiced) aren't exported."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            help="Export to this local directory rather than the default storage.",
+        )
+        parser.add_argument(
+            "--prefix",
+            help="Prefix of the exported files. Defaults to ANALYTICS_EXPORT_PREFIX "
+            + "or nothing when exporting to --path.",
+        )
+        parser.add_argument(
+            "--file-type",
+            choices=tuple(EXPORT_FILE_EXTENSIONS),
+            default="jsonl",
+            help="Parquet is opt-in as it needs `pyarrow`, installed with "
+            + "`poetry install --extras parquet`.",
+        )
+        parser.add_argument(
+            "--table",
+            action="append",
+            dest="tables",
+            choices=tuple(ANALYTICS_EXPORT_TABLES),
+            help="Only export these tables. Can be given more than once.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=50_000,
+            help="Number of rows to read (and write per file) at a time.",
+        )
+        parser.add_argument(
+            "--settle-seconds",
+            type=int,
+            default=300,
+            help="Leave rows created within this many seconds for the next run.",
+        )
+
+    def handle(self, *args, **options):
+        if options["file_type"] == "parquet" and not export_parquet_is_available():
+            raise CommandError(
+                "Writing Parquet files requires `pyarrow`, install it with "
+                + "`poetry install --extras parquet`."
+            )
+
+        storage = default_storage
+        prefix = options["prefix"]
+        if options["path"]:
+            storage = FileSystemStorage(location=options["path"])
+            prefix = prefix or ""
+
+        totals = {}
+        for table, count in analytics_export(
+            storage=storage,
+            prefix=prefix,
+            file_type=options["file_type"],
+            tables=options["tables"],
+            chunk_size=options["chunk_size"],
+            settle_time=datetime.timedelta(seconds=options["settle_seconds"]),
+        ):
+            totals[table] = totals.get(table, 0) + count
+            self.stdout.write(f"Exported {count} {table} rows")
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {sum(totals.values())} rows."))
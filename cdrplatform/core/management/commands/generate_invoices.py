@@ -0,0 +1,105 @@
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from cdrplatform.core.services import invoice_generate_for_period
+
+
+def month_start(value: str) -> datetime.date:
+    return datetime.datetime.strptime(value, "%Y-%m").date()
+
+
+def invoice_shard(**kwargs) -> int:
+    """Invoices a single shard and returns the number of invoices created. Runs in
+    a worker process when generating invoices in parallel."""
+    return sum(len(invoices) for invoices in invoice_generate_for_period(**kwargs))
+
+
+class Command(BaseCommand):
+    help = """Generate customer invoices for all live removal requests in a month.
+
+One invoice is created per organisation and currency. Requests that have already
+been invoiced are skipped so the command can be safely re-run if it is
+interrupted."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--month",
+            type=month_start,
+            help="Billing month to invoice (YYYY-MM). Defaults to last month.",
+        )
+        parser.add_argument(
+            "--issued-date",
+            type=datetime.date.fromisoformat,
+            help="Date to issue the invoices on (YYYY-MM-DD). Defaults to today.",
+        )
+        parser.add_argument(
+            "--shards",
+            type=int,
+            default=1,
+            help="Split organisations into this many shards.",
+        )
+        parser.add_argument(
+            "--shard",
+            type=int,
+            help="Only invoice this shard (0-indexed) e.g. when running a separate "
+            "process per shard. Defaults to all shards.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes to invoice shards in parallel with.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of invoices to create per batch.",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        period = options["month"] or (today.replace(day=1) - datetime.timedelta(1))
+        period_start = datetime.datetime.combine(
+            period.replace(day=1), datetime.time.min, tzinfo=datetime.timezone.utc
+        )
+        period_end = (period_start + datetime.timedelta(days=32)).replace(day=1)
+
+        shards = options["shards"]
+        if options["shard"] is None:
+            shard_numbers = range(shards)
+        elif 0 <= options["shard"] < shards:
+            shard_numbers = (options["shard"],)
+        else:
+            raise CommandError("--shard must be between 0 and --shards - 1")
+
+        jobs = [
+            {
+                "period_start": period_start,
+                "period_end": period_end,
+                "issued_date": options["issued_date"] or today,
+                "shard": shard,
+                "shards": shards,
+                "batch_size": options["batch_size"],
+            }
+            for shard in shard_numbers
+        ]
+
+        if options["workers"] > 1:
+            # Connections can't be shared with forked processes
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+                futures = [executor.submit(invoice_shard, **job) for job in jobs]
+                total = sum(future.result() for future in futures)
+        else:
+            total = sum(invoice_shard(**job) for job in jobs)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {total} invoices for {period_start:%Y-%m}.",
+            )
+        )
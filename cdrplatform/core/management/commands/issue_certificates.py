@@ -0,0 +1,58 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cdrplatform.core.services import certificate_bulk_issue
+
+
+class Command(BaseCommand):
+    help = """Issue certificates for all live removal requests that don't have one yet.
+
+Certificates are created in batches, each committed separately, so the command can
+be safely re-run if it is interrupted."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            type=datetime.date.fromisoformat,
+            help="Only include requests made before this date (YYYY-MM-DD). "
+            "Defaults to now.",
+        )
+        parser.add_argument(
+            "--issued-date",
+            type=datetime.date.fromisoformat,
+            help="Date to issue the certificates on (YYYY-MM-DD). Defaults to today.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of certificates to create per batch.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be issued without saving anything.",
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now()
+        if options["before"] is not None:
+            before = datetime.datetime.combine(
+                options["before"], datetime.time.min, tzinfo=datetime.timezone.utc
+            )
+        issued_date = options["issued_date"] or timezone.now().date()
+
+        verb = "Would issue" if options["dry_run"] else "Issued"
+        total = 0
+        for certificates in certificate_bulk_issue(
+            before=before,
+            issued_date=issued_date,
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+        ):
+            total += len(certificates)
+            self.stdout.write(f"{verb} {total} certificates so far...")
+
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} certificates."))
@@ -0,0 +1,163 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from cdrplatform.core.loadtest import (
+    git_commit_get,
+    loadtest_compare,
+    loadtest_parse_http_file,
+    loadtest_parse_jsonl_file,
+    loadtest_run,
+)
+
+
+class Command(BaseCommand):
+    help = """Replay the requests in `rest-examples/*.http` and/or recorded request
+logs (`.jsonl`) against a running server at each concurrency level.
+
+Reports latency percentiles, throughput and error rates as JSON that can be
+compared with the report of another commit using --baseline.
+
+Only requests that don't change any data (e.g. pricing) are replayed unless
+--include-unsafe is given."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--host",
+            default="http://localhost:8000",
+            help="Server to send the requests to.",
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            dest="scenarios",
+            help="A `.http` file or `.jsonl` request log to replay. Can be given "
+            + "more than once. Defaults to every file in `rest-examples/`.",
+        )
+        parser.add_argument(
+            "--var",
+            action="append",
+            dest="variables",
+            default=[],
+            metavar="NAME=VALUE",
+            help="Value of a `{{variable}}` in the requests, e.g. `api-key=...`.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            action="append",
+            type=int,
+            dest="concurrency_levels",
+            help="Number of concurrent clients. Can be given more than once to "
+            + "run at each level in turn. Defaults to 1, 4 and 16.",
+        )
+        limit = parser.add_mutually_exclusive_group()
+        limit.add_argument(
+            "--duration",
+            type=float,
+            help="Seconds to run each concurrency level for. Defaults to 10.",
+        )
+        limit.add_argument(
+            "--requests",
+            type=int,
+            help="Number of requests to make at each concurrency level.",
+        )
+        parser.add_argument(
+            "--include-unsafe",
+            action="store_true",
+            help="Also replay the requests that change data, e.g. purchases with "
+            + "`POST /v1/cdr/`. Never use it with a production API key.",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=30.0,
+            help="Seconds to wait for each response.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Write the JSON report to this file rather than stdout.",
+        )
+        parser.add_argument(
+            "--baseline",
+            help="A previous report to compare the results with.",
+        )
+
+    def handle(self, *args, **options):
+        variables = {"host": options["host"].rstrip("/")}
+        for variable in options["variables"]:
+            name, separator, value = variable.partition("=")
+            if not separator:
+                raise CommandError(f"--var must be NAME=VALUE, not `{variable}`")
+            variables[name] = value
+
+        paths = [Path(scenario) for scenario in options["scenarios"] or ()]
+        if not paths:
+            paths = sorted((Path(settings.BASE_DIR) / "rest-examples").glob("*.http"))
+
+        requests = []
+        try:
+            for path in paths:
+                if path.suffix == ".jsonl":
+                    requests += loadtest_parse_jsonl_file(
+                        path=path, variables=variables
+                    )
+                else:
+                    requests += loadtest_parse_http_file(path=path, variables=variables)
+        except (OSError, ValueError) as err:
+            raise CommandError(f"Could not read the scenarios: {err}") from err
+        if not options["include_unsafe"]:
+            unsafe = [request for request in requests if not request.is_safe]
+            if unsafe:
+                self.stderr.write(
+                    f"Skipping {len(unsafe)} requests that change data "
+                    + "(pass --include-unsafe to replay them): "
+                    + ", ".join(request.name for request in unsafe)
+                )
+            requests = [request for request in requests if request.is_safe]
+        if not requests:
+            raise CommandError("There are no requests to replay.")
+
+        duration = options["duration"]
+        if duration is None and options["requests"] is None:
+            duration = 10.0
+
+        runs = []
+        for concurrency in options["concurrency_levels"] or (1, 4, 16):
+            run = loadtest_run(
+                requests=requests,
+                concurrency=concurrency,
+                duration=duration,
+                total=options["requests"],
+                timeout=options["timeout"],
+            )
+            runs.append(run)
+            self.stderr.write(
+                f"concurrency {concurrency}: {run['requests']} requests, "
+                + f"{run['throughput_rps']} rps, p95 {run['latency_ms']['p95']} ms, "
+                + f"error rate {run['error_rate']}"
+            )
+
+        report = {
+            "host": variables["host"],
+            "commit": git_commit_get(),
+            "created": timezone.now().isoformat(),
+            "scenarios": [str(path) for path in paths],
+            "runs": runs,
+        }
+
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline:
+                for line in loadtest_compare(
+                    report=report, baseline=json.load(baseline)
+                ):
+                    self.stderr.write(line)
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
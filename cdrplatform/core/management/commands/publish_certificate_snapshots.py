@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from cdrplatform.core.models import Certificate
+from cdrplatform.core.services import certificate_snapshot_bulk_publish
+
+
+class Command(BaseCommand):
+    help = """(Re)publish static verification snapshots for all certificates.
+
+Snapshots are published automatically when certificates or their removal request
+items are saved or deleted, so this is only needed to backfill existing
+certificates, after changing the snapshot format or after bulk changes (e.g.
+`update()`) that don't send signals."""
+
+    def handle(self, *args, **options):
+        total = certificate_snapshot_bulk_publish(
+            certificates=Certificate.objects.all()
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Published {total} certificates."))
@@ -0,0 +1,37 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cdrplatform.core.services import usage_rollup_rebuild
+
+
+class Command(BaseCommand):
+    help = """Recompute the daily usage rollups of organisations from their removal
+request items.
+
+Rollups are kept up to date as removal requests are made so this is only needed
+to backfill them or to catch up with items changed e.g. in the admin."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start",
+            type=datetime.date.fromisoformat,
+            help="First day to rebuild (YYYY-MM-DD). Defaults to yesterday.",
+        )
+        parser.add_argument(
+            "--end",
+            type=datetime.date.fromisoformat,
+            help="Last day to rebuild (YYYY-MM-DD). Defaults to today.",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        start = options["start"] or today - datetime.timedelta(days=1)
+        end = options["end"] or today
+
+        count = usage_rollup_rebuild(start=start, end=end)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {count} usage rollups from {start} to {end}.")
+        )
@@ -0,0 +1,134 @@
+import datetime
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max
+from django.utils import timezone
+
+from cdrplatform.core.models import RemovalRequest
+from cdrplatform.core.seeding import (
+    synthetic_catalog_create,
+    synthetic_display_names,
+    synthetic_organisations_create,
+    synthetic_removal_requests_create,
+    synthetic_sequences_reset,
+)
+from cdrplatform.core.services import usage_rollup_rebuild
+
+
+class Command(BaseCommand):
+    help = """Fill the database with synthetic organisations, API keys, removal
+partners, conversion rate histories and removal requests for benchmarking and
+reviewing query plans. Never run it against production.
+
+Removal requests and their items are inserted in parallel chunks (with `COPY` on
+PostgreSQL) so tens of millions of rows load in minutes."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--organisations", type=int, default=1000)
+        parser.add_argument("--partners", type=int, default=10)
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=730,
+            help="Days of conversion rates and removal requests, up to today.",
+        )
+        parser.add_argument(
+            "--removal-requests",
+            type=int,
+            default=1_000_000,
+            help="Removal requests to create. Each has 1.4 items on average.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=50_000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Processes inserting chunks in parallel. Only PostgreSQL takes "
+            + "writes in parallel so elsewhere there is always one.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed for the random data, for repeatable datasets.",
+        )
+
+    def handle(self, *args, **options):
+        if options["organisations"] < 1 or options["partners"] < 1:
+            raise CommandError("At least one organisation and partner are needed.")
+        seed = options["seed"]
+        workers = options["workers"] if connection.vendor == "postgresql" else 1
+        started = time.monotonic()
+
+        removal_partners, rates = synthetic_catalog_create(
+            partners=options["partners"], rate_days=options["days"], seed=seed
+        )
+        customer_organisations, key = synthetic_organisations_create(
+            organisations=options["organisations"], seed=seed
+        )
+        self.stdout.write(
+            f"Created {len(removal_partners)} partners and "
+            + f"{len(customer_organisations)} organisations"
+        )
+
+        end = timezone.now()
+        start = end - datetime.timedelta(days=options["days"])
+        display_names = synthetic_display_names(count=100, seed=seed)
+        first_pk = (RemovalRequest.objects.aggregate(Max("pk"))["pk__max"] or 0) + 1
+        chunk_size = options["chunk_size"]
+        chunks = [
+            {
+                "first_pk": chunk_start,
+                "count": min(
+                    chunk_size, first_pk + options["removal_requests"] - chunk_start
+                ),
+                "organisation_ids": [o.pk for o in customer_organisations],
+                "partners": [
+                    (p.pk, p.cost_per_tonne, p.currency) for p in removal_partners
+                ],
+                "rates": {pair: float(rate) for pair, rate in rates.items()},
+                "start": start,
+                "end": end,
+                "display_names": display_names,
+                "seed": seed + chunk_start,
+            }
+            for chunk_start in range(
+                first_pk, first_pk + options["removal_requests"], chunk_size
+            )
+        ]
+
+        totals = [0, 0]
+        if workers > 1:
+            # Child processes must open their own connections
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("fork")
+            ) as executor:
+                for requests, items in executor.map(_chunk_create, chunks):
+                    totals = [totals[0] + requests, totals[1] + items]
+                    self.stdout.write(f"Inserted {totals[0]} removal requests")
+        else:
+            for chunk in chunks:
+                requests, items = synthetic_removal_requests_create(**chunk)
+                totals = [totals[0] + requests, totals[1] + items]
+                self.stdout.write(f"Inserted {totals[0]} removal requests")
+        synthetic_sequences_reset()
+
+        rollups = usage_rollup_rebuild(start=start.date(), end=end.date())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {totals[0]} removal requests, {totals[1]} items and "
+                + f"{rollups} usage rollups in {time.monotonic() - started:.0f}s. "
+                + f"API key of {customer_organisations[0].short_id}: {key}"
+            )
+        )
+
+
+def _chunk_create(chunk):
+    # In a worker process
+    return synthetic_removal_requests_create(**chunk)
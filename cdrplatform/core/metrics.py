@@ -0,0 +1,243 @@
+import collections
+import contextlib
+import fcntl
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List, Tuple
+
+from django.conf import settings
+
+# Upper bounds (in seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Metrics that are exposed, as name: (type, help)
+METRICS = {
+    "cdrplatform_http_request_duration_seconds": (
+        "histogram",
+        "Time taken to respond to requests by URL name.",
+    ),
+    "cdrplatform_http_requests": (
+        "counter",
+        "Requests by URL name and response status code.",
+    ),
+    "cdrplatform_db_queries": (
+        "counter",
+        "Database queries made while responding to requests by URL name.",
+    ),
+    "cdrplatform_api_key_lookups": (
+        "counter",
+        "API key lookups by result.",
+    ),
+    "cdrplatform_pricing_calculations": (
+        "counter",
+        "Removal costs calculated by removal partner.",
+    ),
+}
+
+# A sample is identified by its name and sorted label pairs
+SampleKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# Where the samples of processes that exited are added up, in `METRICS_DIR`
+METRICS_EXITED_FILE = "exited.json"
+
+
+class ProcessMetrics:
+    """Metrics of the current process.
+
+    Gunicorn runs several worker processes so each one writes its samples to
+    its own file in `METRICS_DIR` (at most every `METRICS_FLUSH_INTERVAL`
+    seconds) and :func:`metrics_collect` adds up the files of every process.
+    Files are named after the process ID and when the process started, so a
+    new process reusing the ID of one that exited doesn't overwrite its file.
+    """
+
+    def __init__(self):
+        self._start()
+        # Forked workers start from nothing rather than with the samples of
+        # the parent (e.g. with `gunicorn --preload`), which counts its own
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self.samples: Dict[SampleKey, float] = collections.defaultdict(float)
+        self.lock = threading.Lock()
+        self.flushed = 0.0
+        self.file_name = f"{os.getpid()}.{time.time_ns()}.json"
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = (f"{name}_total", tuple(sorted(labels.items())))
+        with self.lock:
+            self.samples[key] += value
+        self.flush()
+
+    def observe(self, name: str, value: float, **labels: str):
+        """Adds a value to a histogram."""
+        labels = tuple(sorted(labels.items()))
+        with self.lock:
+            # Buckets are cumulative so count the value in every bucket it fits
+            for bound in (*LATENCY_BUCKETS, math.inf):
+                if value <= bound:
+                    le = "+Inf" if bound == math.inf else str(bound)
+                    bucket_labels = tuple(sorted((*labels, ("le", le))))
+                    self.samples[(f"{name}_bucket", bucket_labels)] += 1
+            self.samples[(f"{name}_count", labels)] += 1
+            self.samples[(f"{name}_sum", labels)] += value
+        self.flush()
+
+    def dump(self) -> str:
+        with self.lock:
+            return _samples_dump(self.samples)
+
+    def flush(self, force: bool = False):
+        if not settings.METRICS_DIR:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        _file_replace(
+            directory=settings.METRICS_DIR, name=self.file_name, content=self.dump()
+        )
+
+
+metrics = ProcessMetrics()
+
+
+def _samples_dump(samples: Dict[SampleKey, float]) -> str:
+    return json.dumps(
+        [[name, dict(labels), value] for (name, labels), value in samples.items()]
+    )
+
+
+def _samples_add(*, path: str, samples: Dict[SampleKey, float]):
+    with open(path) as file:
+        for name, labels, value in json.load(file):
+            samples[(name, tuple(sorted(labels.items())))] += value
+
+
+def _file_replace(*, directory: str, name: str, content: str):
+    # Write to a temporary file of this thread first so readers never see half a
+    # file. It's named after the process so it's removed if the process exits
+    # before renaming it.
+    with tempfile.NamedTemporaryFile(
+        "w", dir=directory, prefix=f"{os.getpid()}.", suffix=".tmp", delete=False
+    ) as file:
+        file.write(content)
+    os.replace(file.name, os.path.join(directory, name))
+
+
+def _process_is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # It exists but belongs to another user
+        return True
+    return True
+
+
+@contextlib.contextmanager
+def _metrics_dir_lock(directory: str):
+    # So that processes collecting at the same time don't merge a file twice
+    with open(os.path.join(directory, ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _metrics_merge_exited(*, directory: str):
+    """Adds the samples of processes that exited to `METRICS_EXITED_FILE` and
+    removes their files (and any temporary files they left), so the totals keep
+    increasing without the files piling up."""
+    exited_path = os.path.join(directory, METRICS_EXITED_FILE)
+    exited: Dict[SampleKey, float] = collections.defaultdict(float)
+    merged: List[str] = []
+    for file_name in os.listdir(directory):
+        pid = file_name.partition(".")[0]
+        if not pid.isdigit() or _process_is_running(int(pid)):
+            continue
+        path = os.path.join(directory, file_name)
+        if file_name.endswith(".json"):
+            _samples_add(path=path, samples=exited)
+        merged.append(path)
+    if not merged:
+        return
+
+    if os.path.exists(exited_path):
+        _samples_add(path=exited_path, samples=exited)
+    _file_replace(
+        directory=directory, name=METRICS_EXITED_FILE, content=_samples_dump(exited)
+    )
+    for path in merged:
+        os.remove(path)
+
+
+def metrics_collect() -> Dict[SampleKey, float]:
+    """Adds up the samples of every process, including those that exited (or
+    only this one when `METRICS_DIR` isn't set)."""
+    metrics.flush(force=True)
+    if not settings.METRICS_DIR:
+        with metrics.lock:
+            return dict(metrics.samples)
+
+    samples = collections.defaultdict(float)
+    with _metrics_dir_lock(settings.METRICS_DIR):
+        _metrics_merge_exited(directory=settings.METRICS_DIR)
+        for file_name in os.listdir(settings.METRICS_DIR):
+            if file_name.endswith(".json"):
+                _samples_add(
+                    path=os.path.join(settings.METRICS_DIR, file_name),
+                    samples=samples,
+                )
+    return samples
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    pairs = (
+        '{}="{}"'.format(name, str(value).replace("\\", r"\\").replace('"', r"\""))
+        for name, value in labels
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+# Order of the samples of a histogram
+SUFFIX_ORDER = {"bucket": 0, "count": 1, "sum": 2}
+
+
+def _sort_key(sample: Tuple[SampleKey, float]):
+    # Samples with the same labels must be together with buckets in increasing
+    # order, followed by the count and sum
+    (name, labels), _ = sample
+    le = dict(labels).get("le", "0")
+    return (
+        tuple(label for label in labels if label[0] != "le"),
+        SUFFIX_ORDER.get(name.rpartition("_")[2], 0),
+        float(le),
+    )
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def metrics_render() -> Iterator[str]:
+    """Renders the samples of every process in the OpenMetrics text format.
+
+    https://github.com/OpenObservability/OpenMetrics/blob/main/specification/OpenMetrics.md
+    """
+    samples = sorted(metrics_collect().items(), key=_sort_key)
+    for family, (metric_type, help_text) in METRICS.items():
+        yield f"# HELP {family} {help_text}\n"
+        yield f"# TYPE {family} {metric_type}\n"
+        for (name, labels), value in samples:
+            if name.rpartition("_")[0] == family:
+                yield f"{name}{_format_labels(labels)} {_format_value(value)}\n"
+    yield "# EOF\n"
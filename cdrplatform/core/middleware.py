@@ -0,0 +1,323 @@
+import contextlib
+import logging
+import random
+import threading
+import time
+import uuid
+
+import newrelic.agent
+import whitenoise.middleware
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http.request import HttpRequest
+from django.utils.functional import SimpleLazyObject
+
+from cdrplatform.core.consts import SESSION_KEY_ORG_ID
+from cdrplatform.core.metrics import metrics
+from cdrplatform.core.models import CustomerOrganisation
+from cdrplatform.core.profiling import (
+    SQLTimeline,
+    StackSampler,
+    profile_save,
+    profiling_token_is_valid,
+)
+from cdrplatform.core.routers import (
+    db_primary_ais_sticky,
+    db_primary_astick,
+    db_primary_is_sticky,
+    db_primary_stick,
+    db_replica_is_configured,
+    db_replica_reads,
+    db_sticky_keys,
+    db_sticky_organisation_akeys,
+    db_sticky_organisation_keys,
+    db_sticky_organisations_remember,
+)
+from cdrplatform.core.selectors import customer_organisation_get_from_session
+from cdrplatform.core.services import customer_organisation_save_to_session
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCapableMiddleware:
+    """Base for middleware that can run in both sync and async middleware chains
+    so async views aren't forced into a thread by it.
+
+    https://docs.djangoproject.com/en/4.2/topics/http/middleware/#asynchronous-support
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+
+class CustomerOrganisationMiddleware(AsyncCapableMiddleware):
+    """Attaches the current organisation of a logged in user to the request as
+    `request.organisation`.
+
+    The organisation is looked up lazily, at most once per request, and only
+    when a view uses it. The resolved organisation is saved to the session so
+    later requests don't need to fall back to finding the default organisation.
+    """
+
+    def __call__(self, request: HttpRequest):
+        request.organisation = SimpleLazyObject(
+            lambda: self.get_organisation(request),
+        )
+        return self.get_response(request)
+
+    def get_organisation(self, request: HttpRequest) -> CustomerOrganisation:
+        organisation = customer_organisation_get_from_session(request=request)
+        if request.session.get(SESSION_KEY_ORG_ID) != organisation.short_id:
+            customer_organisation_save_to_session(
+                organisation=organisation,
+                request=request,
+            )
+        return organisation
+
+
+class QueryCounter:
+    """Database execute wrapper that counts queries and the time spent on them.
+
+    https://docs.djangoproject.com/en/4.2/topics/db/instrumentation/
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class WhiteNoiseMiddleware(
+    AsyncCapableMiddleware, whitenoise.middleware.WhiteNoiseMiddleware
+):
+    """WhiteNoise's middleware (which is sync only) that can also run in an async
+    middleware chain."""
+
+    def __init__(self, get_response):
+        whitenoise.middleware.WhiteNoiseMiddleware.__init__(self, get_response)
+        AsyncCapableMiddleware.__init__(self, get_response)
+
+    def __call__(self, request: HttpRequest):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request: HttpRequest):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            # Opens the file
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class QueryInstrumentationMiddleware(AsyncCapableMiddleware):
+    """Counts the database queries made while handling each request and the time
+    spent on them. They are reported in a `Server-Timing` header, to New Relic and
+    in `/metrics` along with the latency and status code of each request.
+
+    Views can declare the most queries they should need with a `query_budget`
+    attribute. Going over budget only logs a warning and is reported to New Relic,
+    never fails the request, as the view has already run (and e.g. committed a
+    purchase). Tests check budgets with `assertWithinQueryBudget`.
+    """
+
+    def __call__(self, request: HttpRequest):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with self.count_queries(counter):
+            response = self.get_response(request)
+        self.record(request, response, counter, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request: HttpRequest):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        # Database connections belong to a thread and async views query from the
+        # request's thread for sync code, so wrap the connections there
+        queries_counted = self.count_queries(counter)
+        await sync_to_async(queries_counted.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(queries_counted.__exit__)(None, None, None)
+        self.record(request, response, counter, time.perf_counter() - start)
+        return response
+
+    @contextlib.contextmanager
+    def count_queries(self, counter: QueryCounter):
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            yield
+
+    def record(self, request: HttpRequest, response, counter: QueryCounter, duration):
+        response["Server-Timing"] = ", ".join(
+            (
+                f'db;dur={counter.duration * 1000:.1f};desc="{counter.count} queries"',
+                f"total;dur={duration * 1000:.1f}",
+            )
+        )
+        view_name = "unresolved"
+        if request.resolver_match is not None:
+            view_name = request.resolver_match.view_name
+        metrics.observe(
+            "cdrplatform_http_request_duration_seconds", duration, view=view_name
+        )
+        metrics.inc(
+            "cdrplatform_http_requests",
+            view=view_name,
+            status=str(response.status_code),
+        )
+        metrics.inc("cdrplatform_db_queries", counter.count, view=view_name)
+
+        # No-ops when the New Relic agent isn't running
+        newrelic.agent.add_custom_attribute("db.queries", counter.count)
+        newrelic.agent.add_custom_attribute("db.duration", counter.duration)
+        newrelic.agent.record_custom_metric("Custom/DB/Queries", counter.count)
+        newrelic.agent.record_custom_metric("Custom/DB/Duration", counter.duration)
+
+        budget = getattr(request, "query_budget", None)
+        if budget is not None and counter.count > budget:
+            message = (
+                f"{view_name} made {counter.count} "
+                + f"queries, its budget is {budget}"
+            )
+            logger.warning(message)
+            newrelic.agent.record_custom_metric("Custom/DB/QueryBudgetExceeded", 1)
+
+    def process_view(self, request: HttpRequest, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "view_class", view_func)
+        request.query_budget = getattr(view_class, "query_budget", None)
+
+
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    """Sends the reads of safe (e.g. `GET`) requests to the replica database and
+    everything else to the primary, see :class:`cdrplatform.core.routers.ReplicaRouter`.
+
+    After a client writes, the reads of its organisation go to the primary for
+    the next `DB_REPLICA_STICKY_SECONDS` so they see the write even if the
+    replica is lagging behind. Only used when a replica is configured.
+    """
+
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        if not db_replica_is_configured():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def __call__(self, request: HttpRequest):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        replica = request.method in self.safe_methods
+        if replica:
+            keys = db_sticky_keys(request=request)
+            organisations = db_sticky_organisation_keys(keys=keys)
+            replica = not db_primary_is_sticky(keys=keys + organisations)
+        with db_replica_reads(replica=replica) as routing:
+            response = self.get_response(request)
+        if routing.wrote:
+            # The session (and its organisation) may have only been created by
+            # this request
+            keys = db_sticky_keys(request=request)
+            db_sticky_organisations_remember(request=request, keys=keys)
+            organisations = db_sticky_organisation_keys(keys=keys)
+            db_primary_stick(keys=keys + organisations)
+        return response
+
+    async def __acall__(self, request: HttpRequest):
+        replica = request.method in self.safe_methods
+        if replica:
+            keys = db_sticky_keys(request=request)
+            organisations = await db_sticky_organisation_akeys(keys=keys)
+            replica = not await db_primary_ais_sticky(keys=keys + organisations)
+        with db_replica_reads(replica=replica) as routing:
+            response = await self.get_response(request)
+        if routing.wrote:
+            keys = db_sticky_keys(request=request)
+            # Sessions don't have an async API yet
+            await sync_to_async(db_sticky_organisations_remember)(
+                request=request, keys=keys
+            )
+            organisations = await db_sticky_organisation_akeys(keys=keys)
+            await db_primary_astick(keys=keys + organisations)
+        return response
+
+
+class ProfilingMiddleware:
+    """Profiles requests sent with a valid `X-Profile` token (see
+    :func:`profiling_token_create`) and a `PROFILING_SAMPLE_RATE` share of all
+    other requests.
+
+    Each profile is saved to `PROFILING_DIR` under the ID returned in the
+    `X-Profile-Id` header. Only used when `PROFILING_ENABLED` is set so it adds
+    no overhead otherwise.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def should_profile(self, request: HttpRequest) -> bool:
+        token = request.headers.get("X-Profile")
+        if token:
+            return profiling_token_is_valid(token=token)
+        return random.random() < settings.PROFILING_SAMPLE_RATE  # nosec B311
+
+    def __call__(self, request: HttpRequest):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profile_id = uuid.uuid4().hex
+        sampler = StackSampler(
+            thread_id=threading.get_ident(),
+            interval=settings.PROFILING_INTERVAL,
+        )
+        timeline = SQLTimeline()
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timeline))
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                sampler.stop()
+
+        profile_save(
+            profile_id=profile_id,
+            sampler=sampler,
+            timeline=timeline,
+            meta={
+                "method": request.method,
+                "path": request.get_full_path(),
+                "view": getattr(request.resolver_match, "view_name", None),
+                "status": response.status_code,
+                "duration_ms": round((time.perf_counter() - timeline.start) * 1000, 3),
+                "samples": sum(sampler.stacks.values()),
+                "queries": len(timeline.queries),
+            },
+        )
+        response["X-Profile-Id"] = profile_id
+        return response
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:02
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Upper
+
+
+def check_duplicate_certificate_ids(apps, schema_editor):
+    """Certificate IDs must be unique (ignoring case) before the constraint can be
+    added. Report any duplicates so they can be fixed by hand rather than failing
+    with an opaque integrity error."""
+    Certificate = apps.get_model("core", "Certificate")
+    duplicates = (
+        Certificate.objects.annotate(normalised_id=Upper("certificate_id"))
+        .values("normalised_id")
+        .annotate(count=Count("pk"))
+        .filter(count__gt=1)
+        .order_by("normalised_id")
+    )
+    if duplicates:
+        report = "\n".join(
+            f"  {duplicate['normalised_id']}: {duplicate['count']} certificates"
+            for duplicate in duplicates
+        )
+        raise RuntimeError(
+            "Unable to add a unique constraint on Certificate.certificate_id as the "
+            f"following IDs are duplicated (ignoring case):\n{report}"
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0021_alter_removalrequest_is_test"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            check_duplicate_certificate_ids,
+            migrations.RunPython.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="certificate",
+            constraint=models.UniqueConstraint(
+                django.db.models.functions.text.Upper("certificate_id"),
+                name="core_certificate_certificate_id_upper_unique",
+            ),
+        ),
+    ]
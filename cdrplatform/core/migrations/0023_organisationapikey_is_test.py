@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:08
+
+from django.db import migrations, models
+
+
+def set_is_test_from_prefix(apps, schema_editor):
+    OrganisationAPIKey = apps.get_model("core", "OrganisationAPIKey")
+    OrganisationAPIKey.objects.filter(prefix__istartswith="test_").update(
+        is_test=True
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0022_certificate_certificate_id_upper_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="organisationapikey",
+            name="is_test",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(set_is_test_from_prefix, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="organisationapikey",
+            index=models.Index(
+                fields=["organisation", "is_test", "-created"],
+                name="core_apikey_org_kind_created",
+            ),
+        ),
+    ]
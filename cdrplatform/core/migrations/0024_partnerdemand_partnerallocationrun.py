@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0023_organisationapikey_is_test"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PartnerAllocationRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_datetime", models.DateTimeField(auto_now_add=True)),
+                ("item_watermark", models.PositiveBigIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PartnerDemand",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("unallocated_grams", models.PositiveBigIntegerField(default=0)),
+                (
+                    "removal_partner",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="demand",
+                        to="core.removalpartner",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0024_partnerdemand_partnerallocationrun"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UsageRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "currency",
+                    models.CharField(
+                        choices=[
+                            ("chf", "CHF"),
+                            ("usd", "USD"),
+                            ("gbp", "GBP"),
+                            ("eur", "EUR"),
+                        ],
+                        max_length=3,
+                    ),
+                ),
+                ("is_test", models.BooleanField()),
+                ("removal_count", models.PositiveIntegerField(default=0)),
+                ("cdr_grams", models.PositiveBigIntegerField(default=0)),
+                ("cdr_cost", models.PositiveBigIntegerField(default=0)),
+                ("variable_fees", models.PositiveBigIntegerField(default=0)),
+                (
+                    "customer_organisation",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usage_rollups",
+                        to="core.customerorganisation",
+                    ),
+                ),
+                (
+                    "removal_method",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="core.removalmethod",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="usagerollup",
+            constraint=models.UniqueConstraint(
+                fields=(
+                    "customer_organisation",
+                    "day",
+                    "currency",
+                    "removal_method",
+                    "is_test",
+                ),
+                name="core_usagerollup_unique_key",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0025_usagerollup"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="customerinvoice",
+            name="invoice_id",
+            field=models.CharField(max_length=10, unique=True),
+        ),
+    ]
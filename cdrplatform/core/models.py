@@ -5,6 +5,7 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.core.mail import send_mail
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from rest_framework_api_key.models import AbstractAPIKey
@@ -108,8 +109,79 @@ class PartnerPurchase(models.Model):
         )
 
 
+class PartnerDemand(models.Model):
+    """Running total of CDR sold to customers for a partner that hasn't been
+    ordered from the partner (as a :class:`PartnerPurchase`) yet."""
+
+    removal_partner = models.OneToOneField(
+        "RemovalPartner",
+        on_delete=models.CASCADE,
+        related_name="demand",
+    )
+    unallocated_grams = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.removal_partner_id} - {self.unallocated_grams}g"
+
+
+class PartnerAllocationRun(models.Model):
+    """Records each time demand was allocated to partners. The latest run's
+    watermark is where the next run continues from."""
+
+    created_datetime = models.DateTimeField(auto_now_add=True)
+    # Primary key of the last :class:`RemovalRequestItem` included in the run
+    item_watermark = models.PositiveBigIntegerField()
+
+    def __str__(self) -> str:
+        return f"{self.created_datetime.strftime('%Y-%m-%d')} - {self.item_watermark}"
+
+
+class UsageRollup(models.Model):
+    """Daily totals of the removal request items of an organisation so usage can
+    be reported without aggregating every item. Kept up to date when removal
+    requests are created and rebuilt by the `rebuild_usage_rollups` command."""
+
+    customer_organisation = models.ForeignKey(
+        "CustomerOrganisation",
+        on_delete=models.CASCADE,
+        related_name="usage_rollups",
+    )
+    day = models.DateField()
+    currency = models.CharField(max_length=3, choices=CurrencyChoices.choices)
+    removal_method = models.ForeignKey(
+        "RemovalMethod",
+        on_delete=models.CASCADE,
+    )
+    is_test = models.BooleanField()
+    removal_count = models.PositiveIntegerField(default=0)
+    cdr_grams = models.PositiveBigIntegerField(default=0)
+    cdr_cost = models.PositiveBigIntegerField(default=0)
+    variable_fees = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = (
+            # Also the index used to read an organisation's usage by day
+            models.UniqueConstraint(
+                fields=(
+                    "customer_organisation",
+                    "day",
+                    "currency",
+                    "removal_method",
+                    "is_test",
+                ),
+                name="core_usagerollup_unique_key",
+            ),
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"{self.customer_organisation_id} - {self.day.strftime('%Y/%m/%d')}"
+            + f" - {self.currency} - {self.removal_method_id}"
+        )
+
+
 class CustomerInvoice(models.Model):
-    invoice_id = models.CharField(max_length=10)
+    invoice_id = models.CharField(max_length=10, unique=True)
     issued_date = models.DateField()
     paid_date = models.DateField(null=True)
     fees = models.PositiveIntegerField()
@@ -173,6 +245,17 @@ class Certificate(models.Model):
     issued_date = models.DateField()
     display_name = models.CharField(max_length=128)
 
+    class Meta:
+        constraints = (
+            # IDs are looked up case-insensitively so uniqueness (and the index
+            # backing it) must be on the normalised ID.
+            # See :func:`cdrplatform.core.selectors.certificate_get_by_id`
+            models.UniqueConstraint(
+                Upper("certificate_id"),
+                name="core_certificate_certificate_id_upper_unique",
+            ),
+        )
+
     def __str__(self) -> str:
         return (
             f"{self.certificate_id} - "
@@ -373,6 +456,12 @@ class OrganisationAPIKey(AbstractAPIKey):
         on_delete=models.CASCADE,
         related_name="api_keys",
     )
+    # Stored so keys can be filtered by kind with an index rather than
+    # matching on the prefix. Set automatically from the prefix when saving.
+    is_test = models.BooleanField(
+        default=False,
+        editable=False,
+    )
 
     objects = ProdAPIKeyManager()
 
@@ -380,6 +469,18 @@ class OrganisationAPIKey(AbstractAPIKey):
     # e.g. OrganisationAPIKey.test_objects.create_key()
     test_objects = TestAPIKeyManager()
 
+    class Meta(AbstractAPIKey.Meta):
+        indexes = (
+            models.Index(
+                fields=("organisation", "is_test", "-created"),
+                name="core_apikey_org_kind_created",
+            ),
+        )
+
+    def save(self, *args, **kwargs):
+        self.is_test = self.is_test_key()
+        super().save(*args, **kwargs)
+
     def is_test_key(self):
         "Helper function if key is test or not"
         return is_test_api_key(prefix=self.prefix)
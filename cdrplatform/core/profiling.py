@@ -0,0 +1,113 @@
+import collections
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+
+PROFILING_TOKEN_SALT = "cdrplatform.core.profiling"
+
+
+class StackSampler:
+    """A statistical profiler: samples the call stack of a thread from a
+    background thread every `interval` seconds.
+
+    Stacks are counted in the "folded" format (`outer;inner count` per line) that
+    flame graph tools such as speedscope and `flamegraph.pl` read."""
+
+    def __init__(self, *, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+            frame = frame.f_back
+        if stack:
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+class SQLTimeline:
+    """Database execute wrapper that records when each query started (relative to
+    the start of the request) and how long it took."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries: List[Dict[str, Any]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                {
+                    "start_ms": round((start - self.start) * 1000, 3),
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                    "alias": context["connection"].alias,
+                    "sql": sql,
+                    "many": many,
+                }
+            )
+
+
+def profiling_token_create() -> str:
+    """Creates a token that profiles requests sent with it in the `X-Profile`
+    header for `PROFILING_TOKEN_MAX_AGE` seconds. Only staff with access to the
+    secret key can create one."""
+    return signing.TimestampSigner(salt=PROFILING_TOKEN_SALT).sign("profile")
+
+
+def profiling_token_is_valid(*, token: str) -> bool:
+    try:
+        signing.TimestampSigner(salt=PROFILING_TOKEN_SALT).unsign(
+            token, max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:  # Also raised when the token has expired
+        return False
+    return True
+
+
+def profile_save(
+    *,
+    profile_id: str,
+    sampler: StackSampler,
+    timeline: SQLTimeline,
+    meta: Dict[str, Any],
+) -> str:
+    """Saves a request's profile to `PROFILING_DIR/<profile_id>/` and returns the
+    directory."""
+    directory = os.path.join(settings.PROFILING_DIR, profile_id)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "stacks.folded"), "w") as stacks:
+        stacks.write(sampler.folded())
+    with open(os.path.join(directory, "sql.json"), "w") as sql:
+        json.dump(timeline.queries, sql, indent=2)
+    with open(os.path.join(directory, "meta.json"), "w") as meta_file:
+        json.dump(meta, meta_file, indent=2, cls=DjangoJSONEncoder)
+    return directory
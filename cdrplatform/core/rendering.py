@@ -0,0 +1,57 @@
+import io
+from pathlib import Path
+from typing import Any, Dict
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Bump this whenever the layout below changes so that previously rendered
+# artifacts are replaced rather than served forever.
+CERTIFICATE_RENDER_VERSION = 1
+
+# Supported artifact file types and the content type they are served with
+CERTIFICATE_ARTIFACT_TYPES = {
+    "pdf": "application/pdf",
+    "png": "image/png",
+}
+
+CERTIFICATE_SIZE = (1600, 1131)  # A4 landscape proportions
+CERTIFICATE_FONT = "DejaVuSans.ttf"
+# Shipped with the app for hosts without the font (e.g. slim container images).
+# Pillow's built in font can't draw "CO₂" nor be scaled.
+CERTIFICATE_FONT_BUNDLED = Path(__file__).parent / "fonts" / "DejaVuSans.ttf"
+
+
+def _font(size: int) -> ImageFont.FreeTypeFont:
+    try:
+        return ImageFont.truetype(CERTIFICATE_FONT, size)
+    except OSError:
+        return ImageFont.truetype(str(CERTIFICATE_FONT_BUNDLED), size)
+
+
+def certificate_image_render(*, data: Dict[str, Any]) -> Image.Image:
+    """Draws a certificate from its serialized representation
+    (see :class:`CertificateRetrievalView.OutputSerializer`)."""
+    width, height = CERTIFICATE_SIZE
+    image = Image.new("RGB", CERTIFICATE_SIZE, "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((40, 40, width - 40, height - 40), outline="#14532d", width=8)
+
+    lines = (
+        ("Certificate of CO₂ Removal", _font(72), 220),
+        (data["display_name"], _font(56), 420),
+        (f"{data['removal_amount_kg']:,} kg of CO₂ removed", _font(48), 560),
+        (f"Issued {data['issued_date']}", _font(36), 760),
+        (f"Certificate ID {data['certificate_id']}", _font(36), 840),
+    )
+    for text, font, y in lines:
+        draw.text((width / 2, y), text, fill="#111827", font=font, anchor="mm")
+
+    return image
+
+
+def certificate_artifact_render(*, data: Dict[str, Any], file_type: str) -> bytes:
+    """Renders a certificate to the bytes of a `pdf` or `png` file."""
+    image = certificate_image_render(data=data)
+    output = io.BytesIO()
+    image.save(output, format=file_type.upper(), resolution=150)
+    return output.getvalue()
@@ -0,0 +1,97 @@
+import re
+from typing import IO, Dict, Optional, Tuple
+
+from django.http import FileResponse, HttpRequest, HttpResponse
+from django.utils.http import parse_etags
+
+BYTE_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class LimitedReader:
+    """Wraps a file so that at most `length` bytes can be read from it."""
+
+    def __init__(self, file: IO[bytes], length: int):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def byte_range_parse(*, header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parses a `Range` header for a single range into an inclusive
+    `(start, end)` tuple. Returns `None` when the header is missing or asks for
+    something we don't support (e.g. multiple ranges) so the full file is served.
+
+    Raises `ValueError` when the range can't be satisfied."""
+    match = BYTE_RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if start == "" and end == "":
+        return None
+    if start == "":
+        # Suffix range e.g. `bytes=-500` is the last 500 bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+
+    if start > end or start >= size:
+        raise ValueError("Unsatisfiable byte range")
+    return start, end
+
+
+def ranged_file_response(
+    *,
+    request: HttpRequest,
+    file: IO[bytes],
+    size: int,
+    content_type: str,
+    filename: str = "",
+    headers: Optional[Dict[str, str]] = None,
+) -> HttpResponse:
+    """Streams a file with a :class:`FileResponse`, honouring single byte
+    `Range` requests with a `206 Partial Content` response."""
+    headers = headers or {}
+    byte_range = None
+
+    # Only serve part of the file when the client's copy (if any) is current
+    if_range = request.headers.get("If-Range")
+    if if_range is None or if_range in parse_etags(headers.get("ETag", "")):
+        try:
+            byte_range = byte_range_parse(
+                header=request.headers.get("Range", ""), size=size
+            )
+        except ValueError:
+            file.close()
+            return HttpResponse(
+                status=416,
+                headers={"Content-Range": f"bytes */{size}"},
+            )
+
+    status = 200
+    start, end = 0, size - 1
+    if byte_range is not None:
+        status = 206
+        start, end = byte_range
+        file.seek(start)
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    response = FileResponse(
+        LimitedReader(file, end - start + 1),
+        status=status,
+        content_type=content_type,
+        filename=filename,
+        headers=headers,
+    )
+    response["Content-Length"] = end - start + 1
+    response["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1,199 @@
+import contextlib
+from contextvars import ContextVar
+from typing import Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.http.request import HttpRequest
+
+from cdrplatform.api_key_utils import extract_key_from_header
+from cdrplatform.core.consts import (
+    CACHE_KEY_DB_CLIENT_ORGANISATION,
+    CACHE_KEY_DB_PRIMARY_STICKY,
+    SESSION_KEY_ORG_ID,
+)
+from cdrplatform.core.selectors import (
+    api_key_aget_organisation_short_id,
+    api_key_get_organisation_short_id,
+)
+
+REPLICA_DB_ALIAS = "replica"
+
+
+class ReplicaRouting:
+    """Where the reads of the current request (or block) go. Once anything has
+    been written they go to the primary too, so they see the write."""
+
+    def __init__(self, *, replica: bool):
+        self.replica = replica
+        self.wrote = False
+
+
+# Unset outside requests so commands and background jobs only use the primary
+_routing: ContextVar[Optional[ReplicaRouting]] = ContextVar(
+    "replica_routing", default=None
+)
+
+
+def db_replica_is_configured() -> bool:
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+@contextlib.contextmanager
+def db_replica_reads(*, replica: bool = True):
+    """Sends reads in the block to the replica (if `replica` and one is
+    configured) until the first write. Yields the :class:`ReplicaRouting`."""
+    routing = ReplicaRouting(replica=replica and db_replica_is_configured())
+    token = _routing.set(routing)
+    try:
+        yield routing
+    finally:
+        _routing.reset(token)
+
+
+class ReplicaRouter:
+    """Sends reads to the `replica` database inside :func:`db_replica_reads`
+    (i.e. safe requests, see :class:`ReplicaRoutingMiddleware`) and everything
+    else, including all writes, to the primary.
+
+    https://docs.djangoproject.com/en/4.2/topics/db/multi-db/#automatic-database-routing
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None and routing.replica and not routing.wrote:
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        # Even for objects read from the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != REPLICA_DB_ALIAS
+
+
+def db_sticky_keys(*, request: HttpRequest) -> List[str]:
+    """What identifies the client of a request: the session of logged in users and
+    the API key of organisations using the API. Neither needs a query."""
+    keys = []
+    session = getattr(request, "session", None)
+    session_key = getattr(session, "session_key", None) or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME
+    )
+    if session_key:
+        keys.append(f"session:{session_key}")
+    if "HTTP_AUTHORIZATION" in request.META:
+        prefix, dot, _ = extract_key_from_header(request=request).partition(".")
+        if dot:
+            keys.append(f"api_key:{prefix}")
+    return keys
+
+
+def _organisation_cache_keys(keys: Iterable[str]) -> List[str]:
+    return [CACHE_KEY_DB_CLIENT_ORGANISATION.format(key=key) for key in keys]
+
+
+def _timeout(short_id: Optional[str]) -> Optional[float]:
+    # Keys never move to another organisation but may be created shortly
+    return None if short_id else settings.DB_REPLICA_STICKY_SECONDS
+
+
+def _organisation_keys(short_ids: Iterable[Optional[str]]) -> List[str]:
+    return sorted({f"organisation:{short_id}" for short_id in short_ids if short_id})
+
+
+def db_sticky_organisation_keys(*, keys: List[str]) -> List[str]:
+    """The organisations of the clients `keys` (see :func:`db_sticky_keys`) so that
+    a write by any client of an organisation (e.g. a purchase with one API key)
+    is read by all of them (e.g. listing usage with another key).
+
+    The organisation of each client is cached. Sessions only have one once they
+    wrote (see :func:`db_sticky_organisations_remember`) and API keys are looked
+    up the first time they are seen."""
+    cache_keys = _organisation_cache_keys(keys)
+    short_ids = cache.get_many(cache_keys)
+    for key, cache_key in zip(keys, cache_keys):
+        kind, _, value = key.partition(":")
+        if cache_key not in short_ids and kind == "api_key":
+            short_ids[cache_key] = api_key_get_organisation_short_id(prefix=value)
+            cache.set(
+                cache_key, short_ids[cache_key], timeout=_timeout(short_ids[cache_key])
+            )
+    return _organisation_keys(short_ids.values())
+
+
+async def db_sticky_organisation_akeys(*, keys: List[str]) -> List[str]:
+    """Async version of :func:`db_sticky_organisation_keys`."""
+    cache_keys = _organisation_cache_keys(keys)
+    short_ids = await cache.aget_many(cache_keys)
+    for key, cache_key in zip(keys, cache_keys):
+        kind, _, value = key.partition(":")
+        if cache_key not in short_ids and kind == "api_key":
+            short_ids[cache_key] = await api_key_aget_organisation_short_id(
+                prefix=value
+            )
+            await cache.aset(
+                cache_key, short_ids[cache_key], timeout=_timeout(short_ids[cache_key])
+            )
+    return _organisation_keys(short_ids.values())
+
+
+def db_sticky_organisations_remember(*, request: HttpRequest, keys: List[str]):
+    """Caches the organisation of the session of a request that wrote, which may
+    have just been chosen, for :func:`db_sticky_organisation_keys`."""
+    session = getattr(request, "session", None)
+    short_id = session.get(SESSION_KEY_ORG_ID) if session is not None else None
+    if not short_id:
+        return
+    cache.set_many(
+        {
+            cache_key: short_id
+            for key, cache_key in zip(keys, _organisation_cache_keys(keys))
+            if key.startswith("session:")
+        },
+        timeout=settings.SESSION_COOKIE_AGE,
+    )
+
+
+def _sticky_cache_keys(keys: Iterable[str]) -> List[str]:
+    return [CACHE_KEY_DB_PRIMARY_STICKY.format(key=key) for key in keys]
+
+
+def db_primary_is_sticky(*, keys: Iterable[str]) -> bool:
+    """Whether a client (or organisation) wrote in the last
+    `DB_REPLICA_STICKY_SECONDS`, in which case its reads go to the primary as the
+    replica may not have the write yet."""
+    cache_keys = _sticky_cache_keys(keys)
+    return bool(cache_keys and cache.get_many(cache_keys))
+
+
+async def db_primary_ais_sticky(*, keys: Iterable[str]) -> bool:
+    """Async version of :func:`db_primary_is_sticky`."""
+    cache_keys = _sticky_cache_keys(keys)
+    return bool(cache_keys and await cache.aget_many(cache_keys))
+
+
+def db_primary_stick(*, keys: Iterable[str]):
+    """Sends the reads of a client (or organisation) to the primary for the next
+    `DB_REPLICA_STICKY_SECONDS`."""
+    cache.set_many(
+        dict.fromkeys(_sticky_cache_keys(keys), True),
+        timeout=settings.DB_REPLICA_STICKY_SECONDS,
+    )
+
+
+async def db_primary_astick(*, keys: Iterable[str]):
+    """Async version of :func:`db_primary_stick`."""
+    await cache.aset_many(
+        dict.fromkeys(_sticky_cache_keys(keys), True),
+        timeout=settings.DB_REPLICA_STICKY_SECONDS,
+    )
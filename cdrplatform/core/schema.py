@@ -0,0 +1,114 @@
+import gzip
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.http import HttpRequest
+from django.utils.http import quote_etag
+from drf_spectacular.settings import spectacular_settings
+from rest_framework.renderers import BaseRenderer
+
+# Content codings the schema is compressed with, the preferred first
+SCHEMA_ENCODINGS = ("br", "gzip")
+
+# The schema of this process by API version and format
+_schemas: Dict[Tuple[Optional[str], str], Dict[str, Any]] = {}
+_schemas_lock = threading.Lock()
+
+
+def schema_content_generate(
+    *,
+    api_version: Optional[str],
+    renderer: BaseRenderer,
+) -> bytes:
+    """Generates the OpenAPI schema like drf-spectacular's `spectacular` command."""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(api_version=api_version)
+    schema = generator.get_schema(request=None, public=True)
+    return renderer.render(schema, renderer_context={})
+
+
+def schema_content_read(*, api_version: Optional[str], format: str) -> Optional[bytes]:
+    """Reads a schema generated at build time (`<version>.<format>` in
+    `SCHEMA_DIR`), `None` if there isn't one."""
+    if not settings.SCHEMA_DIR:
+        return None
+    try:
+        return (Path(settings.SCHEMA_DIR) / f"{api_version}.{format}").read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _schema_entry(*, content: bytes) -> Dict[str, Any]:
+    digest = hashlib.sha256(content).hexdigest()
+    variants = {
+        "identity": content,
+        "gzip": gzip.compress(content, compresslevel=9, mtime=0),
+    }
+    # Brotli is only installed with whitenoise's `brotli` extra
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants["br"] = brotli.compress(content)
+    return {
+        "variants": variants,
+        # Each encoding of the content is a different representation
+        "etags": {
+            encoding: quote_etag(
+                digest if encoding == "identity" else f"{digest}-{encoding}"
+            )
+            for encoding in variants
+        },
+    }
+
+
+def schema_get(*, api_version: Optional[str], renderer: BaseRenderer) -> Dict[str, Any]:
+    """Returns the schema in the format of `renderer`: its `variants` by content
+    coding and their `etags`.
+
+    The schema is read from `SCHEMA_DIR` or generated, which takes a while, on
+    first use and then kept for the life of the process, so a deploy (which
+    starts new processes) is all it takes to serve a new schema."""
+    key = (api_version, renderer.format)
+    # Concurrent requests wait for a single generation
+    with _schemas_lock:
+        if key not in _schemas:
+            content = schema_content_read(
+                api_version=api_version, format=renderer.format
+            )
+            if content is None:
+                content = schema_content_generate(
+                    api_version=api_version, renderer=renderer
+                )
+            _schemas[key] = _schema_entry(content=content)
+        return _schemas[key]
+
+
+def schema_cache_clear():
+    """Forgets the schemas of this process so they are generated again."""
+    with _schemas_lock:
+        _schemas.clear()
+
+
+def content_encoding_negotiate(
+    *,
+    request: HttpRequest,
+    available: Iterable[str],
+) -> str:
+    """The preferred of `SCHEMA_ENCODINGS` that the client accepts and is
+    `available`, otherwise `identity`."""
+    accepted = set()
+    for coding in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = coding.partition(";")
+        params = params.replace(" ", "")
+        # `q=0` means not acceptable
+        if params.startswith("q=") and params[2:].strip("0.") == "":
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in SCHEMA_ENCODINGS:
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
@@ -0,0 +1,340 @@
+import bisect
+import csv
+import datetime
+import io
+import itertools
+import math
+import random
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.utils.text import slugify
+
+from cdrplatform.core.crypto import ProdKeyGenerator, TestKeyGenerator
+from cdrplatform.core.models import (
+    CurrencyChoices,
+    CurrencyConversionRate,
+    CustomerOrganisation,
+    OrganisationAPIKey,
+    RemovalMethod,
+    RemovalPartner,
+    RemovalRequest,
+    RemovalRequestItem,
+    WeightUnitChoices,
+)
+from cdrplatform.core.selectors import cdr_weight_get_in_grams, variable_fees_calculate
+
+SYNTHETIC_SLUG_PREFIX = "synthetic-"
+
+# Shares of removal requests by weight unit, currency and number of items, and
+# the (mu, sigma) of the log-normal distribution of amounts in each weight unit
+SYNTHETIC_WEIGHT_UNITS = {
+    WeightUnitChoices.GRAM: 0.1,
+    WeightUnitChoices.KILOGRAM: 0.6,
+    WeightUnitChoices.TONNE: 0.3,
+}
+SYNTHETIC_CURRENCIES = {
+    CurrencyChoices.USD: 0.4,
+    CurrencyChoices.EUR: 0.3,
+    CurrencyChoices.CHF: 0.2,
+    CurrencyChoices.GBP: 0.1,
+}
+SYNTHETIC_ITEM_COUNTS = {1: 0.7, 2: 0.2, 3: 0.1}
+SYNTHETIC_AMOUNTS = {
+    WeightUnitChoices.GRAM: (6.0, 1.5),
+    WeightUnitChoices.KILOGRAM: (3.0, 1.2),
+    WeightUnitChoices.TONNE: (0.5, 1.0),
+}
+SYNTHETIC_TEST_SHARE = 0.3
+
+REMOVAL_REQUEST_FIELDS = (
+    "id",
+    "weight_unit",
+    "requested_datetime",
+    "currency",
+    "customer_organisation",
+    "uuid",
+    "is_test",
+    "meta_client_reference_id",
+    "meta_certificate_display_name",
+)
+REMOVAL_REQUEST_ITEM_FIELDS = (
+    "removal_partner",
+    "removal_request",
+    "cdr_cost",
+    "variable_fees",
+    "cdr_amount",
+)
+
+
+def _faker(*, seed: int):
+    # Faker is only a development dependency
+    try:
+        from faker import Faker
+    except ImportError:
+        raise ImproperlyConfigured("Generating synthetic data requires `Faker`")
+
+    Faker.seed(seed)
+    return Faker()
+
+
+def rows_insert(
+    *,
+    model: type[models.Model],
+    fields: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+) -> int:
+    """Inserts rows of values for `fields` with `COPY` on PostgreSQL and a
+    multi-row `INSERT` elsewhere.
+
+    Much faster than `bulk_create` for millions of rows and, unlike it, keeps the
+    values given for `auto_now_add` fields. Returns the number of rows."""
+    model_fields = [model._meta.get_field(field) for field in fields]
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ", ".join(connection.ops.quote_name(f.column) for f in model_fields)
+    prepared = [
+        [
+            field.get_db_prep_save(value, connection)
+            for field, value in zip(model_fields, row)
+        ]
+        for row in rows
+    ]
+    if not prepared:
+        return 0
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(
+                [r"\N" if value is None else value for value in row] for row in prepared
+            )
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer,
+            )
+        else:
+            placeholders = ", ".join(["%s"] * len(fields))
+            cursor.executemany(
+                f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",  # nosec
+                prepared,
+            )
+    return len(prepared)
+
+
+def synthetic_catalog_create(
+    *,
+    partners: int,
+    rate_days: int,
+    seed: int = 0,
+) -> Tuple[List[RemovalPartner], Dict[Tuple[str, str], Decimal]]:
+    """Creates removal partners, each with its own removal method, and a daily
+    history of conversion rates between every pair of currencies that follows a
+    random walk.
+
+    Returns the partners and the latest conversion rates."""
+    fake = _faker(seed=seed)
+    randomiser = random.Random(seed)  # nosec B311
+    start = max(RemovalMethod.objects.count(), RemovalPartner.objects.count())
+    names = [fake.unique.company() for _ in range(partners)]
+    methods = RemovalMethod.objects.bulk_create(
+        RemovalMethod(
+            name=f"{fake.word().title()} removal",
+            slug=f"{SYNTHETIC_SLUG_PREFIX}{start + i}",
+            description=fake.paragraph(),
+        )
+        for i in range(partners)
+    )
+    removal_partners = RemovalPartner.objects.bulk_create(
+        RemovalPartner(
+            removal_method=method,
+            name=name,
+            slug=f"{SYNTHETIC_SLUG_PREFIX}{start + i}-{slugify(name)}"[:50],
+            description=fake.paragraph(),
+            website=fake.url(),
+            cost_per_tonne=randomiser.randint(50, 1000) * 100,
+            currency=randomiser.choice(CurrencyChoices.values),
+        )
+        for i, (name, method) in enumerate(zip(names, methods))
+    )
+
+    latest = {}
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    rates = []
+    for from_currency, to_currency in itertools.product(
+        CurrencyChoices.values, repeat=2
+    ):
+        rate = 1.0 if from_currency == to_currency else randomiser.uniform(0.7, 1.4)
+        for day in range(rate_days, 0, -1):
+            if from_currency != to_currency:
+                rate = min(max(rate * randomiser.gauss(1, 0.005), 0.1), 99.0)
+            rates.append(
+                (
+                    from_currency,
+                    to_currency,
+                    Decimal(rate).quantize(Decimal("0.0001")),
+                    now - datetime.timedelta(days=day - 1),
+                )
+            )
+        latest[(from_currency, to_currency)] = rates[-1][2]
+    rows_insert(
+        model=CurrencyConversionRate,
+        fields=("from_currency", "to_currency", "rate", "date_time"),
+        rows=rates,
+    )
+    return removal_partners, latest
+
+
+def synthetic_organisations_create(
+    *,
+    organisations: int,
+    seed: int = 0,
+) -> Tuple[List[CustomerOrganisation], str]:
+    """Creates organisations with one to three test and production API keys each.
+
+    Hashing keys is deliberately slow so only the first organisation gets a key
+    that can be used, which is returned. The others can't be used but there are as
+    many rows as there would be."""
+    fake = _faker(seed=seed)
+    randomiser = random.Random(seed)  # nosec B311
+    customer_organisations = CustomerOrganisation.objects.bulk_create(
+        CustomerOrganisation(organisation_name=fake.company()[:64])
+        for _ in range(organisations)
+    )
+    unusable_hash = make_password(None)
+    api_keys = []
+    for organisation in customer_organisations:
+        for _ in range(randomiser.choice((1, 1, 2, 3))):
+            generator = randomiser.choice((ProdKeyGenerator, TestKeyGenerator))()
+            prefix = generator.get_prefix()
+            api_keys.append(
+                OrganisationAPIKey(
+                    id=f"{prefix}.{unusable_hash}",
+                    prefix=prefix,
+                    hashed_key=unusable_hash,
+                    name=fake.word(),
+                    organisation=organisation,
+                    is_test=generator.prefix == TestKeyGenerator.prefix,
+                    revoked=randomiser.random() < 0.1,
+                )
+            )
+    OrganisationAPIKey.objects.bulk_create(api_keys, batch_size=1000)
+
+    _, key = OrganisationAPIKey.objects.create_key(
+        organisation=customer_organisations[0], name="synthetic"
+    )
+    return customer_organisations, key
+
+
+def synthetic_display_names(*, count: int, seed: int = 0) -> List[str]:
+    """Names customers might want on their certificates."""
+    fake = _faker(seed=seed)
+    return [fake.company() for _ in range(count)]
+
+
+def _weighted(randomiser: random.Random, shares: Dict[Any, float]):
+    return randomiser.choices(tuple(shares), weights=tuple(shares.values()))[0]
+
+
+def synthetic_removal_requests_create(
+    *,
+    first_pk: int,
+    count: int,
+    organisation_ids: Sequence[int],
+    partners: Sequence[Tuple[int, int, str]],
+    rates: Dict[Tuple[str, str], float],
+    start: datetime.datetime,
+    end: datetime.datetime,
+    display_names: Sequence[str],
+    seed: int,
+) -> Tuple[int, int]:
+    """Inserts `count` removal requests with primary keys from `first_pk`, and
+    their items, in a transaction of its own so chunks can be inserted in
+    parallel.
+
+    Organisations' activity is Pareto distributed and requests become more frequent
+    over time. Partners are `(pk, cost_per_tonne, currency)`. Returns the number of
+    requests and items."""
+    randomiser = random.Random(seed)  # nosec B311
+    # A few organisations make most of the requests
+    cumulative_weights = list(
+        itertools.accumulate(randomiser.paretovariate(1.16) for _ in organisation_ids)
+    )
+    span = (end - start).total_seconds()
+
+    requests, items = [], []
+    for pk in range(first_pk, first_pk + count):
+        weight_unit = _weighted(randomiser, SYNTHETIC_WEIGHT_UNITS)
+        currency = _weighted(randomiser, SYNTHETIC_CURRENCIES)
+        organisation_id = organisation_ids[
+            bisect.bisect(
+                cumulative_weights, randomiser.random() * cumulative_weights[-1]
+            )
+        ]
+        reference = ""
+        if randomiser.random() < 0.5:
+            reference = f"order-{randomiser.getrandbits(32):08x}"
+        display_name = ""
+        if randomiser.random() < 0.2:
+            display_name = randomiser.choice(display_names)
+        requests.append(
+            (
+                pk,
+                weight_unit,
+                # The square root skews requests towards the end: growing usage
+                start
+                + datetime.timedelta(seconds=span * math.sqrt(randomiser.random())),
+                currency,
+                organisation_id,
+                randomiser.getrandbits(128).to_bytes(16, "big").hex(),
+                randomiser.random() < SYNTHETIC_TEST_SHARE,
+                reference,
+                display_name,
+            )
+        )
+
+        item_count = min(_weighted(randomiser, SYNTHETIC_ITEM_COUNTS), len(partners))
+        for partner_pk, cost_per_tonne, partner_currency in randomiser.sample(
+            partners, k=item_count
+        ):
+            mu, sigma = SYNTHETIC_AMOUNTS[weight_unit]
+            cdr_amount = max(1, int(randomiser.lognormvariate(mu, sigma)))
+            grams = cdr_weight_get_in_grams(
+                cdr_amount=cdr_amount, weight_unit=weight_unit
+            )
+            removal_cost = math.ceil(
+                cost_per_tonne
+                * grams
+                / (1000 * 1000)
+                * rates[(partner_currency, currency)]
+            )
+            items.append(
+                (
+                    partner_pk,
+                    pk,
+                    removal_cost,
+                    variable_fees_calculate(removal_cost=removal_cost),
+                    cdr_amount,
+                )
+            )
+
+    with transaction.atomic():
+        rows_insert(model=RemovalRequest, fields=REMOVAL_REQUEST_FIELDS, rows=requests)
+        rows_insert(
+            model=RemovalRequestItem, fields=REMOVAL_REQUEST_ITEM_FIELDS, rows=items
+        )
+    return len(requests), len(items)
+
+
+def synthetic_sequences_reset():
+    """Moves the primary key sequences past the keys inserted explicitly."""
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), [RemovalRequest, RemovalRequestItem]
+    )
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
@@ -1,14 +1,39 @@
+import datetime
 import math
 from decimal import Decimal
-from typing import Iterable, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import (
+    BigIntegerField,
+    Case,
+    Count,
+    DateField,
+    Exists,
+    F,
+    Max,
+    OuterRef,
+    QuerySet,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import (
+    Cast,
+    Coalesce,
+    Mod,
+    NullIf,
+    TruncDate,
+    TruncMonth,
+    Upper,
+)
 from django.http.request import HttpRequest
 from rest_framework import serializers
 from rest_framework.exceptions import PermissionDenied
 
-from cdrplatform.core.consts import SESSION_KEY_ORG_ID
-from cdrplatform.core.crypto import TestKeyGenerator
+from cdrplatform.core.consts import CACHE_KEY_CERTIFICATE, SESSION_KEY_ORG_ID
 from cdrplatform.core.data import FEES
 from cdrplatform.core.exceptions import (
     APIKeyExpiredException,
@@ -16,6 +41,7 @@ from cdrplatform.core.exceptions import (
     CustomerOrganizationNotFound,
     MissingData,
 )
+from cdrplatform.core.metrics import metrics
 
 from .models import (
     Certificate,
@@ -23,7 +49,13 @@ from .models import (
     CurrencyConversionRate,
     CustomerOrganisation,
     OrganisationAPIKey,
+    PartnerAllocationRun,
+    PartnerConfirmation,
+    PartnerPurchase,
     RemovalPartner,
+    RemovalRequest,
+    RemovalRequestItem,
+    UsageRollup,
     WeightUnitChoices,
 )
 
@@ -41,18 +73,28 @@ def api_key_list_test_only(
     *,
     org: CustomerOrganisation,
 ) -> Iterable[OrganisationAPIKey]:
-    return api_key_list_all(org=org).filter(
-        prefix__istartswith=TestKeyGenerator.prefix,
-    )
+    return api_key_list_all(org=org).filter(is_test=True)
 
 
 def api_key_list_prod_only(
     *,
     org: CustomerOrganisation,
 ) -> Iterable[OrganisationAPIKey]:
-    return api_key_list_all(org=org).exclude(
-        prefix__istartswith=TestKeyGenerator.prefix,
-    )
+    return api_key_list_all(org=org).filter(is_test=False)
+
+
+def api_key_list_search(
+    *,
+    org: CustomerOrganisation,
+    name: str = "",
+) -> QuerySet[OrganisationAPIKey]:
+    """Lists both production and test keys (production keys first) so they can be
+    fetched with a single query, optionally filtered to names containing
+    `name`."""
+    api_keys = api_key_list_all(org=org)
+    if name:
+        api_keys = api_keys.filter(name__icontains=name)
+    return api_keys.order_by("is_test", "-created")
 
 
 def api_key_get_from_key(*, key: str) -> OrganisationAPIKey:
@@ -62,6 +104,24 @@ def api_key_get_from_key(*, key: str) -> OrganisationAPIKey:
         raise err  # be explicit
 
 
+def api_key_get_organisation_short_id(*, prefix: str) -> Optional[str]:
+    """The short ID of the organisation of the API key with `prefix`, if any."""
+    return (
+        OrganisationAPIKey.objects.filter(prefix=prefix)
+        .values_list("organisation__short_id", flat=True)
+        .first()
+    )
+
+
+async def api_key_aget_organisation_short_id(*, prefix: str) -> Optional[str]:
+    """Async version of :func:`api_key_get_organisation_short_id`."""
+    return (
+        await OrganisationAPIKey.objects.filter(prefix=prefix)
+        .values_list("organisation__short_id", flat=True)
+        .afirst()
+    )
+
+
 def api_key_must_be_present_and_valid(
     *,
     key: str,
@@ -74,14 +134,18 @@ def api_key_must_be_present_and_valid(
     - Key expired: :class:`APIKeyExpiredException`
     """
     if key is None or key == "":
+        metrics.inc("cdrplatform_api_key_lookups", result="missing")
         raise APIKeyNotPresentOrRevoked
     try:
         api_key = api_key_get_from_key(key=key)
     except OrganisationAPIKey.DoesNotExist:
+        metrics.inc("cdrplatform_api_key_lookups", result="not_found")
         raise APIKeyNotPresentOrRevoked
 
     if api_key.has_expired or api_key.revoked:
+        metrics.inc("cdrplatform_api_key_lookups", result="expired")
         raise APIKeyExpiredException
+    metrics.inc("cdrplatform_api_key_lookups", result="valid")
     return api_key
 
 
@@ -95,10 +159,27 @@ def removal_partner_get_from_method_slug(
         raise err  # be explicit
 
 
+async def removal_partner_aget_from_method_slug(
+    *,
+    method_slug: str,
+) -> RemovalPartner:
+    """Async version of :func:`removal_partner_get_from_method_slug`."""
+    try:
+        return await RemovalPartner.objects.aget(removal_method__slug=method_slug)
+    except RemovalPartner.DoesNotExist as err:
+        raise err  # be explicit
+
+
 def removal_partner_list() -> Iterable[RemovalPartner]:
     return RemovalPartner.objects.filter(disabled=False)
 
 
+def pricing_catalog_is_loaded() -> bool:
+    """Whether there is something to price: an enabled removal partner and
+    currency conversion rates."""
+    return removal_partner_list().exists() and CurrencyConversionRate.objects.exists()
+
+
 def currency_conversion_rate_get_latest(
     *, from_currency: str, to_currency: str
 ) -> CurrencyConversionRate:
@@ -112,6 +193,16 @@ def currency_conversion_rate_get_latest(
     ).first()  # Limit to 1 record to get the latest conversion rate
 
 
+async def currency_conversion_rate_aget_latest(
+    *, from_currency: str, to_currency: str
+) -> Optional[CurrencyConversionRate]:
+    """Async version of :func:`currency_conversion_rate_get_latest`."""
+    return await CurrencyConversionRate.objects.filter(
+        from_currency=from_currency,
+        to_currency=to_currency,
+    ).afirst()
+
+
 def cdr_weight_get_in_grams(*, cdr_amount: int, weight_unit: WeightUnitChoices) -> int:
     if weight_unit == "t":
         cdr_amount_g = cdr_amount * 1000 * 1000
@@ -123,6 +214,19 @@ def cdr_weight_get_in_grams(*, cdr_amount: int, weight_unit: WeightUnitChoices)
     return cdr_amount_g
 
 
+def cdr_weight_in_grams_expression(*, amount: str, weight_unit: str) -> Case:
+    """SQL equivalent of :func:`cdr_weight_get_in_grams` for aggregating weights
+    stored in different units e.g. `Sum(cdr_weight_in_grams_expression(...))`."""
+    # Cast first so large amounts in tonnes don't overflow a 32 bit integer
+    amount_big = Cast(amount, output_field=BigIntegerField())
+    return Case(
+        When(**{weight_unit: WeightUnitChoices.TONNE}, then=amount_big * 1000 * 1000),
+        When(**{weight_unit: WeightUnitChoices.KILOGRAM}, then=amount_big * 1000),
+        default=amount_big,
+        output_field=BigIntegerField(),
+    )
+
+
 def partner_cost_calculate(*, partner: RemovalPartner, cdr_amount_g: int) -> Decimal:
     return Decimal(partner.cost_per_tonne * cdr_amount_g / (1000 * 1000))
 
@@ -138,6 +242,39 @@ def removal_method_choices():
     return _partners
 
 
+async def removal_method_achoices():
+    """Async version of :func:`removal_method_choices`."""
+    return [
+        (m.removal_method.slug, m.removal_method.name)
+        async for m in removal_partner_list().select_related("removal_method")
+    ]
+
+
+def _removal_cost_convert(
+    *,
+    partner: RemovalPartner,
+    currency_conversion_rate: Optional[CurrencyConversionRate],
+    currency: CurrencyChoices,
+    cdr_amount: int,
+    weight_unit: WeightUnitChoices,
+) -> int:
+    if currency_conversion_rate is None:
+        raise serializers.ValidationError(
+            f'Unable to convert partner currency "{partner.currency}"'
+            + f' to "{currency}"'
+        )
+
+    partner_cost = partner_cost_calculate(
+        partner=partner,
+        cdr_amount_g=cdr_weight_get_in_grams(
+            cdr_amount=cdr_amount, weight_unit=weight_unit
+        ),
+    )
+
+    metrics.inc("cdrplatform_pricing_calculations", partner=partner.slug)
+    return math.ceil(partner_cost * currency_conversion_rate.rate)
+
+
 def removal_method_calculate_removal_cost(
     *,
     removal_partner: Optional[RemovalPartner] = None,
@@ -170,22 +307,45 @@ def removal_method_calculate_removal_cost(
         from_currency=_partner.currency,
         to_currency=currency,
     )
+    return _removal_cost_convert(
+        partner=_partner,
+        currency_conversion_rate=currency_conversion_rate,
+        currency=currency,
+        cdr_amount=cdr_amount,
+        weight_unit=weight_unit,
+    )
 
-    if currency_conversion_rate is None:
-        raise serializers.ValidationError(
-            f'Unable to convert partner currency "{_partner.currency}"'
-            + f' to "{input.validated_data.get("currency")}"'
+
+async def removal_method_acalculate_removal_cost(
+    *,
+    removal_partner: Optional[RemovalPartner] = None,
+    removal_method_slug: Optional[str] = None,
+    currency: CurrencyChoices,
+    cdr_amount: int,
+    weight_unit: WeightUnitChoices,
+) -> int:
+    """Async version of :func:`removal_method_calculate_removal_cost`."""
+    if removal_partner is None and removal_method_slug is None:
+        raise MissingData
+
+    _partner = removal_partner
+    if removal_partner is None:
+        _partner = await removal_partner_aget_from_method_slug(
+            method_slug=removal_method_slug,
         )
 
-    partner_cost = partner_cost_calculate(
+    currency_conversion_rate = await currency_conversion_rate_aget_latest(
+        from_currency=_partner.currency,
+        to_currency=currency,
+    )
+    return _removal_cost_convert(
         partner=_partner,
-        cdr_amount_g=cdr_weight_get_in_grams(
-            cdr_amount=cdr_amount, weight_unit=weight_unit
-        ),
+        currency_conversion_rate=currency_conversion_rate,
+        currency=currency,
+        cdr_amount=cdr_amount,
+        weight_unit=weight_unit,
     )
 
-    return math.ceil(partner_cost * currency_conversion_rate.rate)
-
 
 def variable_fees_calculate(*, removal_cost: int) -> int:
     """Given a removal cost, calculates the variable fee."""
@@ -196,8 +356,21 @@ def variable_fees_calculate(*, removal_cost: int) -> int:
     )
 
 
-def customer_organisation_get_by_short_id(*, short_id: str) -> CustomerOrganisation:
-    return CustomerOrganisation.objects.filter(short_id=short_id)
+def customer_organisation_get_by_short_id(
+    *,
+    short_id: str,
+    user: Optional[User] = None,
+) -> Optional[CustomerOrganisation]:
+    """Returns the organisation with the given short ID or `None` if it doesn't
+    exist. If a user is given then they must also be a member of the
+    organisation."""
+    organisations = CustomerOrganisation.objects.filter(short_id=short_id)
+    if user is not None:
+        organisations = organisations.filter(users=user)
+    try:
+        return organisations.get()
+    except CustomerOrganisation.DoesNotExist:
+        return None
 
 
 def customer_organisation_get_default(*, user: User) -> CustomerOrganisation:
@@ -209,15 +382,23 @@ def customer_organisation_get_default(*, user: User) -> CustomerOrganisation:
 def customer_organisation_get_from_session(
     *, request: HttpRequest
 ) -> CustomerOrganisation:
-    """Looks up an organisation from a session. If not present
-    then uses the users default organisation."""
+    """Looks up an organisation from a session. If not present, or the user
+    is no longer a member of it, then uses the users default organisation.
+
+    Prefer `request.organisation` (set by
+    :class:`cdrplatform.core.middleware.CustomerOrganisationMiddleware`) which
+    only looks up the organisation once per request."""
     if not request.user.is_authenticated:
         raise PermissionDenied
+    org = None
     org_short_id = request.session.get(SESSION_KEY_ORG_ID)
-    if org_short_id is None:
+    if org_short_id is not None:
+        org = customer_organisation_get_by_short_id(
+            short_id=org_short_id,
+            user=request.user,
+        )
+    if org is None:
         org = customer_organisation_get_default(user=request.user)
-    else:
-        org = customer_organisation_get_by_short_id(short_id=org_short_id)
 
     if org is None:
         raise CustomerOrganizationNotFound
@@ -225,9 +406,600 @@ def customer_organisation_get_from_session(
     return org
 
 
+def certificate_id_normalise(*, certificate_id: str) -> str:
+    """Certificate IDs are case-insensitive so normalise them to upper case."""
+    return certificate_id.strip().upper()
+
+
 def certificate_get_by_id(*, certificate_id: str) -> Certificate:
-    """Looks up a certificate by its public ID."""
+    """Looks up a certificate by its public ID, ignoring case.
+
+    The lookup matches the expression of the unique index on the certificate ID
+    (`UPPER(certificate_id)`) so the index can be used."""
+    try:
+        return Certificate.objects.annotate(
+            normalised_id=Upper("certificate_id"),
+        ).get(normalised_id=certificate_id_normalise(certificate_id=certificate_id))
+    except Certificate.DoesNotExist as err:
+        raise err  # be explicit
+
+
+async def certificate_aget_by_id(*, certificate_id: str) -> Certificate:
+    """Async version of :func:`certificate_get_by_id`."""
     try:
-        return Certificate.objects.get(certificate_id=certificate_id)
+        return await Certificate.objects.annotate(
+            normalised_id=Upper("certificate_id"),
+        ).aget(normalised_id=certificate_id_normalise(certificate_id=certificate_id))
     except Certificate.DoesNotExist as err:
         raise err  # be explicit
+
+
+def certificate_get_details(*, certificate: Certificate) -> Dict[str, Any]:
+    """Returns the public details of a certificate that are shown to anyone
+    verifying it."""
+    removal_request = certificate.removal_request
+    return {
+        "certificate_id": certificate.certificate_id,
+        "display_name": certificate.display_name,
+        "issued_date": certificate.issued_date,
+        "removal_amount_kg": removal_request.total_kg if removal_request else 0,
+    }
+
+
+def certificate_list_details(
+    *,
+    certificates: QuerySet[Certificate],
+) -> Iterator[Dict[str, Any]]:
+    """Like :func:`certificate_get_details` for each of `certificates`, with the
+    removed amounts summed in the same query."""
+    rows = (
+        certificates.annotate(
+            removal_grams=Sum(
+                cdr_weight_in_grams_expression(
+                    amount="removal_request__item__cdr_amount",
+                    weight_unit="removal_request__weight_unit",
+                )
+            )
+        )
+        .order_by("pk")
+        .values("certificate_id", "display_name", "issued_date", "removal_grams")
+    )
+    for row in rows.iterator(chunk_size=1000):
+        removal_grams = row.pop("removal_grams")
+        row["removal_amount_kg"] = (removal_grams or 0) / 1000
+        yield row
+
+
+def certificate_cache_get(*, certificate_id: str) -> Optional[Dict[str, Any]]:
+    """Looks up the cached representation of a certificate. Returns a dict with
+    the serialized `data` and its `etag` or `None` if it hasn't been cached yet."""
+    return cache.get(
+        CACHE_KEY_CERTIFICATE.format(
+            certificate_id=certificate_id_normalise(certificate_id=certificate_id)
+        )
+    )
+
+
+async def certificate_aget_details(*, certificate: Certificate) -> Dict[str, Any]:
+    """Async version of :func:`certificate_get_details`."""
+    removal_amount_kg = 0
+    if certificate.removal_request_id is not None:
+        total = await RemovalRequestItem.objects.filter(
+            removal_request_id=certificate.removal_request_id
+        ).aaggregate(
+            grams=Sum(
+                cdr_weight_in_grams_expression(
+                    amount="cdr_amount", weight_unit="removal_request__weight_unit"
+                )
+            )
+        )
+        removal_amount_kg = (total["grams"] or 0) / 1000
+    return {
+        "certificate_id": certificate.certificate_id,
+        "display_name": certificate.display_name,
+        "issued_date": certificate.issued_date,
+        "removal_amount_kg": removal_amount_kg,
+    }
+
+
+async def certificate_cache_aget(*, certificate_id: str) -> Optional[Dict[str, Any]]:
+    """Async version of :func:`certificate_cache_get`."""
+    return await cache.aget(
+        CACHE_KEY_CERTIFICATE.format(
+            certificate_id=certificate_id_normalise(certificate_id=certificate_id)
+        )
+    )
+
+
+def removal_request_list_eligible_for_certificate(
+    *,
+    before: datetime.datetime,
+) -> QuerySet[RemovalRequest]:
+    """Lists live removal requests made before a point in time that have items
+    but no certificate yet, ordered by primary key.
+
+    Each request is annotated with the `certificate_display_name` to issue,
+    falling back to the organisation name when the customer didn't provide one."""
+    return (
+        RemovalRequest.objects.filter(
+            is_test=False,
+            requested_datetime__lt=before,
+        )
+        .filter(
+            Exists(RemovalRequestItem.objects.filter(removal_request=OuterRef("pk"))),
+            ~Exists(Certificate.objects.filter(removal_request=OuterRef("pk"))),
+        )
+        .annotate(
+            certificate_display_name=Coalesce(
+                NullIf("meta_certificate_display_name", Value("")),
+                "customer_organisation__organisation_name",
+                Value(""),
+            )
+        )
+        .order_by("pk")
+    )
+
+
+def invoice_line_list_uninvoiced(
+    *,
+    period_start: datetime.datetime,
+    period_end: datetime.datetime,
+    shard: int = 0,
+    shards: int = 1,
+) -> QuerySet:
+    """Lists the organisations and currencies of all live, un-invoiced removal
+    requests made in a period, i.e. the invoices to create, in a single query.
+
+    Organisations can be split across `shards` (by primary key) so that separate
+    processes can each work through their own `shard`."""
+    return (
+        RemovalRequestItem.objects.filter(
+            removal_request__is_test=False,
+            removal_request__invoice__isnull=True,
+            removal_request__customer_organisation__isnull=False,
+            removal_request__requested_datetime__gte=period_start,
+            removal_request__requested_datetime__lt=period_end,
+        )
+        .alias(
+            shard=Mod("removal_request__customer_organisation_id", shards),
+        )
+        .filter(shard=shard)
+        .values(
+            organisation_id=F("removal_request__customer_organisation_id"),
+            currency=F("removal_request__currency"),
+        )
+        .order_by("organisation_id", "currency")
+        .distinct()
+    )
+
+
+def invoice_fees_sum(*, invoice_ids: Iterable[int]) -> Dict[int, int]:
+    """Totals the cost of the removal requests linked to each invoice. Invoices
+    without any are left out."""
+    return dict(
+        RemovalRequestItem.objects.filter(removal_request__invoice__in=invoice_ids)
+        .values("removal_request__invoice")
+        .annotate(total=Sum(F("cdr_cost") + F("variable_fees")))
+        .values_list("removal_request__invoice", "total")
+    )
+
+
+def customer_organisation_list_receiver_emails(
+    *,
+    organisation_ids: Iterable[int],
+) -> Dict[int, str]:
+    """Returns the email address of the longest standing member of each
+    organisation, used as the receiver of invoices."""
+    emails = {}
+    members = (
+        User.objects.filter(organisations__in=organisation_ids)
+        .order_by("date_joined")
+        .values_list("organisations", "email")
+    )
+    for organisation_id, email in members:
+        emails.setdefault(organisation_id, email)
+    return emails
+
+
+REMOVAL_HISTORY_EXPORT_COLUMNS = {
+    "transaction_uuid": "removal_request__uuid",
+    "requested_datetime": "removal_request__requested_datetime",
+    "is_test": "removal_request__is_test",
+    "client_reference_id": "removal_request__meta_client_reference_id",
+    "certificate_display_name": "removal_request__meta_certificate_display_name",
+    "invoice_id": "removal_request__invoice__invoice_id",
+    "method_type": "removal_partner__removal_method__slug",
+    "removal_partner": "removal_partner__slug",
+    "weight_unit": "removal_request__weight_unit",
+    "cdr_amount": "cdr_amount",
+    "currency": "removal_request__currency",
+    "cdr_cost": "cdr_cost",
+    "variable_fees": "variable_fees",
+}
+
+
+def removal_history_list_for_export(
+    *,
+    org: CustomerOrganisation,
+    chunk_size: int = 2000,
+) -> Iterator[tuple]:
+    """Streams every removal request item of an organisation joined with its
+    request, one row per item in the order of
+    :data:`REMOVAL_HISTORY_EXPORT_COLUMNS`.
+
+    Rows are fetched in chunks with a server-side cursor where supported so
+    memory use doesn't grow with the size of the history."""
+    return (
+        RemovalRequestItem.objects.filter(removal_request__customer_organisation=org)
+        .order_by("removal_request__requested_datetime", "pk")
+        .values_list(*REMOVAL_HISTORY_EXPORT_COLUMNS.values())
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def partner_allocation_watermark_get() -> int:
+    """Returns the primary key of the last removal request item that has been
+    allocated to partners, or 0 if nothing has been allocated yet."""
+    run = PartnerAllocationRun.objects.order_by("-pk").first()
+    return run.item_watermark if run is not None else 0
+
+
+def removal_request_item_sum_grams_by_partner(
+    *,
+    after_pk: int,
+    up_to_pk: int,
+) -> Dict[int, int]:
+    """Sums the weight (in grams) of live removal request items per partner for
+    items with a primary key in `(after_pk, up_to_pk]`."""
+    totals = (
+        RemovalRequestItem.objects.filter(
+            pk__gt=after_pk,
+            pk__lte=up_to_pk,
+            removal_request__is_test=False,
+            removal_partner__isnull=False,
+        )
+        .values("removal_partner")
+        .annotate(
+            grams=Sum(
+                cdr_weight_in_grams_expression(
+                    amount="cdr_amount",
+                    weight_unit="removal_request__weight_unit",
+                )
+            )
+        )
+        .order_by()
+    )
+    return {total["removal_partner"]: total["grams"] for total in totals}
+
+
+def removal_request_item_get_max_pk(
+    *,
+    after_pk: int,
+    before: datetime.datetime,
+) -> int:
+    """Returns the largest primary key (greater than `after_pk`) of items
+    requested before a point in time, or `after_pk` if there are none."""
+    return (
+        RemovalRequestItem.objects.filter(
+            pk__gt=after_pk,
+            removal_request__requested_datetime__lt=before,
+        ).aggregate(max_pk=Max("pk"))["max_pk"]
+        or after_pk
+    )
+
+
+PARTNER_RECONCILIATION_COLUMNS = (
+    "removal_partner",
+    "month",
+    "sold_grams",
+    "purchased_grams",
+    "confirmed_grams",
+    "cumulative_sold_grams",
+    "cumulative_purchased_grams",
+    "cumulative_confirmed_grams",
+    "unconfirmed_grams",
+)
+
+
+def partner_reconciliation_list() -> List[Dict[str, Any]]:
+    """Compares CDR sold to customers (live removal request items) with CDR
+    purchased from partners and purchases that partners have confirmed, per
+    partner and month, along with the running totals of each.
+
+    `unconfirmed_grams` is how much of everything sold up to (and including)
+    that month isn't covered by a partner confirmation yet.
+
+    Monthly totals are aggregated by the database and the running totals are
+    computed with window functions so the work doesn't grow in Python with the
+    number of items."""
+    zero = Value(0, output_field=BigIntegerField())
+    sold = (
+        RemovalRequestItem.objects.filter(
+            removal_request__is_test=False,
+            removal_partner__isnull=False,
+        )
+        .values(
+            partner_id=F("removal_partner"),
+            month=Cast(
+                TruncMonth("removal_request__requested_datetime"),
+                output_field=DateField(),
+            ),
+        )
+        .annotate(
+            sold_grams=Sum(
+                cdr_weight_in_grams_expression(
+                    amount="cdr_amount",
+                    weight_unit="removal_request__weight_unit",
+                )
+            ),
+            purchased_grams=zero,
+            confirmed_grams=zero,
+        )
+        .order_by()
+    )
+    purchase_grams = cdr_weight_in_grams_expression(
+        amount="cdr_amount",
+        weight_unit="weight_unit",
+    )
+    purchased = (
+        PartnerPurchase.objects.filter(
+            ordered_date__isnull=False,
+            removal_partner__isnull=False,
+        )
+        .values(
+            partner_id=F("removal_partner"),
+            month=TruncMonth("ordered_date"),
+        )
+        .annotate(
+            sold_grams=zero,
+            purchased_grams=Sum(purchase_grams),
+            confirmed_grams=Sum(
+                Case(
+                    When(
+                        Exists(
+                            PartnerConfirmation.objects.filter(
+                                partner_purchase=OuterRef("pk"),
+                            )
+                        ),
+                        then=purchase_grams,
+                    ),
+                    default=zero,
+                )
+            ),
+        )
+        .order_by()
+    )
+    monthly_sql, params = sold.union(purchased, all=True).query.sql_with_params()
+
+    sql = f"""
+        SELECT
+            partner_id,
+            month,
+            sold_grams,
+            purchased_grams,
+            confirmed_grams,
+            SUM(sold_grams) OVER partner_months,
+            SUM(purchased_grams) OVER partner_months,
+            SUM(confirmed_grams) OVER partner_months,
+            SUM(sold_grams - confirmed_grams) OVER partner_months
+        FROM (
+            SELECT
+                partner_id,
+                month,
+                SUM(sold_grams) AS sold_grams,
+                SUM(purchased_grams) AS purchased_grams,
+                SUM(confirmed_grams) AS confirmed_grams
+            FROM ({monthly_sql}) AS monthly
+            GROUP BY partner_id, month
+        ) AS totals
+        WINDOW partner_months AS (PARTITION BY partner_id ORDER BY month)
+        ORDER BY partner_id, month
+    """  # nosec B608 - only contains SQL generated by the ORM
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    partners = RemovalPartner.objects.in_bulk({row[0] for row in rows})
+    return [
+        dict(
+            zip(
+                PARTNER_RECONCILIATION_COLUMNS,
+                (
+                    partners.get(partner_id),
+                    # SQLite returns dates as strings
+                    month
+                    if isinstance(month, datetime.date)
+                    else datetime.date.fromisoformat(month),
+                    *(int(total) for total in totals),
+                ),
+            )
+        )
+        for partner_id, month, *totals in rows
+    ]
+
+
+# Fields that identify a :class:`UsageRollup` row
+USAGE_ROLLUP_KEY = (
+    "customer_organisation_id",
+    "day",
+    "currency",
+    "removal_method_id",
+    "is_test",
+)
+
+
+def removal_request_item_list_usage(
+    *,
+    removal_request: Optional[RemovalRequest] = None,
+    start: Optional[datetime.date] = None,
+    end: Optional[datetime.date] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Totals of removal request items grouped by the :class:`UsageRollup` key,
+    either for a single removal request or for the days between `start` and
+    `end` (inclusive)."""
+    items = RemovalRequestItem.objects.filter(
+        removal_request__customer_organisation__isnull=False,
+        removal_partner__removal_method__isnull=False,
+    )
+    if removal_request is not None:
+        items = items.filter(removal_request=removal_request)
+    if start is not None:
+        items = items.filter(removal_request__requested_datetime__date__gte=start)
+    if end is not None:
+        items = items.filter(removal_request__requested_datetime__date__lte=end)
+
+    totals = (
+        items.values(
+            customer_organisation_id=F("removal_request__customer_organisation"),
+            day=TruncDate("removal_request__requested_datetime"),
+            currency=F("removal_request__currency"),
+            removal_method_id=F("removal_partner__removal_method"),
+            is_test=F("removal_request__is_test"),
+        )
+        .annotate(
+            Sum("cdr_cost"),
+            Sum("variable_fees"),
+            removal_count=Count("pk"),
+            cdr_grams=Sum(
+                cdr_weight_in_grams_expression(
+                    amount="cdr_amount",
+                    weight_unit="removal_request__weight_unit",
+                )
+            ),
+        )
+        .order_by()
+    )
+    for row in totals:
+        # Can't annotate with the names of the item's own fields
+        row["cdr_cost"] = row.pop("cdr_cost__sum")
+        row["variable_fees"] = row.pop("variable_fees__sum")
+        yield row
+
+
+def usage_rollup_list_daily(
+    *,
+    org: CustomerOrganisation,
+    start: datetime.date,
+    end: datetime.date,
+    is_test: bool = False,
+) -> QuerySet[UsageRollup]:
+    """Usage of an organisation per day, currency and removal method between
+    `start` and `end` (inclusive). Only reads the rollup so the cost depends on
+    the number of days rather than the number of removal requests."""
+    return (
+        UsageRollup.objects.filter(
+            customer_organisation=org,
+            is_test=is_test,
+            day__range=(start, end),
+        )
+        .select_related("removal_method")
+        .order_by("day", "currency", "removal_method_id")
+    )
+
+
+def usage_rollup_sum_by_currency(
+    *,
+    org: CustomerOrganisation,
+    start: datetime.date,
+    end: datetime.date,
+    is_test: bool = False,
+) -> QuerySet:
+    """Usage of an organisation between `start` and `end` (inclusive) summed per
+    currency."""
+    return (
+        usage_rollup_list_daily(org=org, start=start, end=end, is_test=is_test)
+        .values("currency")
+        .annotate(
+            Sum("removal_count"),
+            Sum("cdr_grams"),
+            Sum("cdr_cost"),
+            Sum("variable_fees"),
+        )
+        .order_by("currency")
+    )
+
+
+# Tables exported for analytics as (model, columns, datetime partitioning the
+# files). Tables without a datetime are small and exported in full every time.
+ANALYTICS_EXPORT_TABLES = {
+    "removal_request": (
+        RemovalRequest,
+        (
+            "id",
+            "uuid",
+            "requested_datetime",
+            "weight_unit",
+            "currency",
+            "is_test",
+            "customer_organisation_id",
+            "invoice_id",
+        ),
+        "requested_datetime",
+    ),
+    "removal_request_item": (
+        RemovalRequestItem,
+        (
+            "id",
+            "removal_request_id",
+            "removal_partner_id",
+            "cdr_amount",
+            "cdr_cost",
+            "variable_fees",
+        ),
+        "removal_request__requested_datetime",
+    ),
+    "currency_conversion_rate": (
+        CurrencyConversionRate,
+        ("id", "from_currency", "to_currency", "rate", "date_time"),
+        "date_time",
+    ),
+    "removal_partner": (
+        RemovalPartner,
+        (
+            "id",
+            "name",
+            "slug",
+            "removal_method_id",
+            "cost_per_tonne",
+            "currency",
+            "disabled",
+        ),
+        None,
+    ),
+}
+
+
+def analytics_export_get_max_pk(
+    *,
+    table: str,
+    after_pk: int = 0,
+    before: Optional[datetime.datetime] = None,
+) -> int:
+    """Returns the largest primary key (greater than `after_pk`) of an analytics
+    table's rows from before a point in time, or `after_pk` if there are none."""
+    model, _, partition_by = ANALYTICS_EXPORT_TABLES[table]
+    rows = model.objects.filter(pk__gt=after_pk)
+    if before is not None and partition_by is not None:
+        rows = rows.filter(**{f"{partition_by}__lt": before})
+    return rows.aggregate(max_pk=Max("pk"))["max_pk"] or after_pk
+
+
+def analytics_export_list_rows(
+    *,
+    table: str,
+    after_pk: int,
+    up_to_pk: int,
+    limit: int,
+) -> List[tuple]:
+    """Returns the next `limit` rows of an analytics table after `after_pk` in
+    primary key order. The last value of each row is the date the row is
+    partitioned by (`None` for tables that aren't partitioned)."""
+    model, columns, partition_by = ANALYTICS_EXPORT_TABLES[table]
+    partition = Value(None, output_field=DateField())
+    if partition_by is not None:
+        partition = TruncDate(partition_by)
+    return list(
+        model.objects.filter(pk__gt=after_pk, pk__lte=up_to_pk)
+        .order_by("pk")
+        .values_list(*columns, partition)[:limit]
+    )
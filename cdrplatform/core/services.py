@@ -1,31 +1,81 @@
-from typing import Dict, List, Tuple
+import datetime
+import functools
+import hashlib
+import itertools
+import json
+import logging
+import math
+import operator
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage, default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, QuerySet, When
 from django.http.request import HttpRequest
+from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.http import quote_etag
 from rest_framework.exceptions import PermissionDenied
+from shortuuid import ShortUUID
 
-from cdrplatform.core.consts import SESSION_KEY_ORG_ID
+from cdrplatform.core.consts import CACHE_KEY_CERTIFICATE, SESSION_KEY_ORG_ID
+from cdrplatform.core.crypto import CertificateIDGenerator
+from cdrplatform.core.db.locks import db_advisory_xact_lock
+from cdrplatform.core.exports import EXPORT_FILE_EXTENSIONS, export_file_content
+from cdrplatform.core.rendering import (
+    CERTIFICATE_RENDER_VERSION,
+    certificate_artifact_render,
+)
 from cdrplatform.core.selectors import (
-    customer_organisation_get_from_session,
+    ANALYTICS_EXPORT_TABLES,
+    USAGE_ROLLUP_KEY,
+    analytics_export_get_max_pk,
+    analytics_export_list_rows,
+    certificate_get_details,
+    certificate_id_normalise,
+    certificate_list_details,
+    customer_organisation_list_receiver_emails,
+    invoice_fees_sum,
+    invoice_line_list_uninvoiced,
+    partner_allocation_watermark_get,
+    partner_cost_calculate,
     removal_method_calculate_removal_cost,
     removal_partner_get_from_method_slug,
+    removal_request_item_get_max_pk,
+    removal_request_item_list_usage,
+    removal_request_item_sum_grams_by_partner,
+    removal_request_list_eligible_for_certificate,
     variable_fees_calculate,
 )
 
 from .models import (
     CDRUser,
+    Certificate,
     CurrencyChoices,
+    CustomerInvoice,
     CustomerOrganisation,
     OrganisationAPIKey,
+    PartnerAllocationRun,
+    PartnerDemand,
+    PartnerPurchase,
     RemovalPartner,
     RemovalRequest,
     RemovalRequestItem,
+    UsageRollup,
     WeightUnitChoices,
 )
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
 
 def user_signup_with_default_customer_organisation(
     *,
@@ -47,26 +97,29 @@ def removal_request_create(
     org_id: int,
     request_items: List[Dict[str, str | int]],
 ) -> RemovalRequest:
-    removal_request = RemovalRequest.objects.create(
-        is_test=is_test,
-        weight_unit=weight_unit,
-        requested_datetime=timezone.now(),
-        currency=currency,
-        customer_organisation_id=org_id,
-    )
-
-    for item in request_items:
-        # These items should be typed better but for now they need
-        # to have a `method_type` and `cdr_amount` attribute
-        removal_partner = removal_partner_get_from_method_slug(
-            method_slug=item.get("method_type")
+    with transaction.atomic():
+        removal_request = RemovalRequest.objects.create(
+            is_test=is_test,
+            weight_unit=weight_unit,
+            requested_datetime=timezone.now(),
+            currency=currency,
+            customer_organisation_id=org_id,
         )
 
-        removal_request_item_create(
-            removal_partner=removal_partner,
-            removal_request=removal_request,
-            cdr_amount=item.get("cdr_amount"),
-        )
+        for item in request_items:
+            # These items should be typed better but for now they need
+            # to have a `method_type` and `cdr_amount` attribute
+            removal_partner = removal_partner_get_from_method_slug(
+                method_slug=item.get("method_type")
+            )
+
+            removal_request_item_create(
+                removal_partner=removal_partner,
+                removal_request=removal_request,
+                cdr_amount=item.get("cdr_amount"),
+            )
+
+        usage_rollup_add(removal_request=removal_request)
 
     return removal_request
 
@@ -144,12 +197,11 @@ def api_key_create_from_session(
     api_key_name: str,
     test_key: bool = False,
 ) -> Tuple[OrganisationAPIKey, str]:
-    """Generates an API key by extracting the current organisation from
-    the HTTP request"""
-    org = customer_organisation_get_from_session(request=request)
-
+    """Generates an API key for the current organisation of the HTTP request"""
     return api_key_create(
-        organisation=org, api_key_name=api_key_name, test_key=test_key
+        organisation=request.organisation,
+        api_key_name=api_key_name,
+        test_key=test_key,
     )
 
 
@@ -162,3 +214,563 @@ def api_key_revoke(
     _ = OrganisationAPIKey.objects.filter(prefix=key_prefix, organisation=org).update(
         expiry_date=timezone.now()
     )
+
+
+def certificate_cache_set(
+    *,
+    certificate_id: str,
+    data: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Caches the serialized representation of a certificate along with a
+    strong ETag computed from its content.
+
+    Certificates don't change once issued so the entry never expires, it is only
+    removed by :func:`certificate_cache_invalidate`."""
+    cached = _certificate_cache_entry(data=data)
+    cache.set(
+        CACHE_KEY_CERTIFICATE.format(
+            certificate_id=certificate_id_normalise(certificate_id=certificate_id)
+        ),
+        cached,
+        timeout=None,
+    )
+    return cached
+
+
+async def certificate_cache_aset(
+    *,
+    certificate_id: str,
+    data: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Async version of :func:`certificate_cache_set`."""
+    cached = _certificate_cache_entry(data=data)
+    await cache.aset(
+        CACHE_KEY_CERTIFICATE.format(
+            certificate_id=certificate_id_normalise(certificate_id=certificate_id)
+        ),
+        cached,
+        timeout=None,
+    )
+    return cached
+
+
+def _certificate_cache_entry(*, data: Dict[str, Any]) -> Dict[str, Any]:
+    content = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return {
+        "data": dict(data),
+        "etag": quote_etag(hashlib.sha256(content.encode()).hexdigest()),
+    }
+
+
+def certificate_cache_invalidate(*, certificate_id: str):
+    """Removes a certificate from the cache e.g. after it has been edited."""
+    cache.delete(
+        CACHE_KEY_CERTIFICATE.format(
+            certificate_id=certificate_id_normalise(certificate_id=certificate_id)
+        )
+    )
+
+
+def certificate_create_each(*, certificates: List[Certificate]) -> List[Certificate]:
+    """Saves certificates one at a time, skipping those whose ID is taken, and
+    returns the saved ones."""
+    created = []
+    for certificate in certificates:
+        try:
+            with transaction.atomic():
+                # Like `certificate_bulk_issue`, without `post_save` signals
+                Certificate.objects.bulk_create([certificate])
+        except IntegrityError:
+            logger.warning(
+                "Certificate ID %s of removal request %s is taken, skipping it",
+                certificate.certificate_id,
+                certificate.removal_request_id,
+            )
+            continue
+        created.append(certificate)
+    return created
+
+
+def certificate_bulk_issue(
+    *,
+    before: datetime.datetime,
+    issued_date: datetime.date,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+) -> Iterator[List[Certificate]]:
+    """Issues certificates for every removal request eligible before a point in
+    time, yielding each batch of certificates once it has been created.
+
+    IDs are derived from the removal request primary key so they never collide
+    with each other. They may still collide with certificates issued another way,
+    in which case the request is skipped (and logged) rather than failing the
+    batch. Each batch is committed on its own and issued requests are no longer
+    eligible, so an interrupted run can simply be started again."""
+    id_generator = CertificateIDGenerator()
+    last_pk = 0
+    while True:
+        removal_requests = list(
+            removal_request_list_eligible_for_certificate(before=before)
+            .filter(pk__gt=last_pk)
+            .values_list("pk", "certificate_display_name")[:batch_size]
+        )
+        if not removal_requests:
+            return
+        last_pk = removal_requests[-1][0]
+
+        certificates = [
+            Certificate(
+                removal_request_id=pk,
+                certificate_id=id_generator.generate(pk),
+                issued_date=issued_date,
+                display_name=display_name,
+            )
+            for pk, display_name in removal_requests
+        ]
+        if not dry_run:
+            try:
+                with transaction.atomic():
+                    Certificate.objects.bulk_create(certificates)
+            except IntegrityError:
+                certificates = certificate_create_each(certificates=certificates)
+            # `bulk_create` doesn't send `post_save` signals so publish here
+            if settings.CERTIFICATE_SNAPSHOT_ENABLED:
+                certificate_snapshot_bulk_publish(
+                    certificates=Certificate.objects.filter(
+                        pk__in=[certificate.pk for certificate in certificates]
+                    )
+                )
+        yield certificates
+
+
+def certificate_artifact_get_or_create(
+    *,
+    data: Dict[str, Any],
+    file_type: str,
+) -> Tuple[str, str]:
+    """Returns the storage name of a rendered certificate and its ETag, rendering
+    and saving it first if needed.
+
+    The name is derived from the fields that are rendered, so an artifact is only
+    rendered once and a new one is only rendered when those fields change."""
+    content = json.dumps(
+        {"data": data, "file_type": file_type, "version": CERTIFICATE_RENDER_VERSION},
+        sort_keys=True,
+        cls=DjangoJSONEncoder,
+    )
+    digest = hashlib.sha256(content.encode()).hexdigest()
+    name = f"{settings.CERTIFICATE_ARTIFACT_PREFIX}{digest}.{file_type}"
+
+    if not default_storage.exists(name):
+        artifact = certificate_artifact_render(data=data, file_type=file_type)
+        saved = default_storage.save(name, ContentFile(artifact))
+        if saved != name:
+            # Another worker saved the artifact first and storages don't overwrite
+            # files, so ours got a new name. Keep theirs, it's the same.
+            default_storage.delete(saved)
+
+    return name, quote_etag(digest)
+
+
+def certificate_snapshot_names(*, certificate_id: str) -> Dict[str, str]:
+    """Returns the storage names of a certificate's static snapshots, keyed by
+    file type."""
+    name = settings.CERTIFICATE_SNAPSHOT_PREFIX + certificate_id_normalise(
+        certificate_id=certificate_id
+    )
+    names = {"json": f"{name}.json"}
+    if settings.CERTIFICATE_SNAPSHOT_HTML:
+        names["html"] = f"{name}.html"
+    return names
+
+
+def storage_overwrite(*, storage: Storage, name: str, content: bytes):
+    """Replaces the file `name` so that readers (e.g. a CDN) see either the old or
+    the new file, never a missing one.
+
+    Storages don't overwrite files, they pick a new name instead. Local files
+    are written under a temporary name and renamed over the old one. Storages
+    that can overwrite (e.g. S3 with `file_overwrite`) replace it in place. Others
+    have the old file deleted first."""
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        path = None
+    if path is not None:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=directory, prefix=".", suffix=".tmp", delete=False
+        ) as file:
+            file.write(content)
+        permissions = getattr(storage, "file_permissions_mode", None)
+        if permissions is not None:
+            os.chmod(file.name, permissions)
+        os.replace(file.name, path)
+        return
+    if not getattr(storage, "file_overwrite", False):
+        storage.delete(name)
+    storage.save(name, ContentFile(content))
+
+
+def certificate_snapshot_publish(*, certificate: Certificate):
+    """Writes static JSON (and optionally HTML) snapshots of a certificate to
+    storage so verification requests can be served without hitting the app."""
+    _certificate_snapshot_write(
+        details=certificate_get_details(certificate=certificate)
+    )
+
+
+def certificate_snapshot_bulk_publish(*, certificates: QuerySet[Certificate]) -> int:
+    """Like :func:`certificate_snapshot_publish` for many certificates, reading
+    them all in one query. Returns how many were published."""
+    total = 0
+    for details in certificate_list_details(certificates=certificates):
+        _certificate_snapshot_write(details=details)
+        total += 1
+    return total
+
+
+def _certificate_snapshot_write(*, details: Dict[str, Any]):
+    contents = {
+        "json": json.dumps(details, cls=DjangoJSONEncoder),
+        "html": render_to_string("core/certificate/verification.html", details),
+    }
+    for file_type, name in certificate_snapshot_names(
+        certificate_id=details["certificate_id"]
+    ).items():
+        storage_overwrite(
+            storage=default_storage, name=name, content=contents[file_type].encode()
+        )
+
+
+def certificate_refresh(*, removal_request_id: int):
+    """Removes the certificates of a removal request from the cache and publishes
+    their snapshots again e.g. when its items change the removed amount."""
+    certificates = Certificate.objects.filter(removal_request_id=removal_request_id)
+    for certificate_id in certificates.values_list("certificate_id", flat=True):
+        certificate_cache_invalidate(certificate_id=certificate_id)
+    if settings.CERTIFICATE_SNAPSHOT_ENABLED:
+        certificate_snapshot_bulk_publish(certificates=certificates)
+
+
+def certificate_snapshot_delete(*, certificate_id: str):
+    """Removes the static snapshots of a certificate."""
+    for name in certificate_snapshot_names(certificate_id=certificate_id).values():
+        default_storage.delete(name)
+
+
+INVOICE_IDS = ShortUUID(alphabet="0123456789ABCDEFGHJKLMNPQRSTUVWXYZ")
+
+
+def invoice_bulk_create(
+    *,
+    invoices: List[CustomerInvoice],
+    attempts: int = 3,
+) -> List[CustomerInvoice]:
+    """Saves invoices with random IDs, drawing new ones if any is taken."""
+    while True:
+        attempts -= 1
+        for invoice in invoices:
+            invoice.invoice_id = INVOICE_IDS.random(length=10)
+        try:
+            with transaction.atomic():
+                return CustomerInvoice.objects.bulk_create(invoices)
+        except IntegrityError:
+            if not attempts:
+                raise
+
+
+def invoice_generate_for_period(
+    *,
+    period_start: datetime.datetime,
+    period_end: datetime.datetime,
+    issued_date: datetime.date,
+    shard: int = 0,
+    shards: int = 1,
+    batch_size: int = 500,
+) -> Iterator[List[CustomerInvoice]]:
+    """Invoices all live, un-invoiced removal requests made in a period with one
+    invoice per organisation and currency, yielding each batch of invoices once
+    it has been created.
+
+    Each batch is committed on its own and requests are linked to their invoice
+    with a single UPDATE. Invoiced requests are no longer picked up so an
+    interrupted run can simply be started again.
+
+    The organisations of a batch are locked until it is committed so that
+    concurrent runs over the same organisations (e.g. with different `shards`)
+    take turns. Fees are totalled from the requests actually linked to each
+    invoice, and invoices left without any (because another run invoiced them
+    first) are deleted."""
+    lines = list(
+        invoice_line_list_uninvoiced(
+            period_start=period_start,
+            period_end=period_end,
+            shard=shard,
+            shards=shards,
+        )
+    )
+
+    for i in range(0, len(lines), batch_size):
+        batch = lines[i : i + batch_size]
+        organisation_ids = sorted({line["organisation_id"] for line in batch})
+        emails = customer_organisation_list_receiver_emails(
+            organisation_ids=organisation_ids,
+        )
+
+        with transaction.atomic():
+            # Locked in order so runs don't deadlock
+            list(
+                CustomerOrganisation.objects.select_for_update()
+                .filter(pk__in=organisation_ids)
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            )
+            invoices = invoice_bulk_create(
+                invoices=[
+                    CustomerInvoice(
+                        issued_date=issued_date,
+                        fees=0,
+                        currency=line["currency"],
+                        customer_organisation_id=line["organisation_id"],
+                        receiver_email=emails.get(line["organisation_id"], ""),
+                    )
+                    for line in batch
+                ]
+            )
+            groups = [
+                Q(
+                    customer_organisation_id=invoice.customer_organisation_id,
+                    currency=invoice.currency,
+                )
+                for invoice in invoices
+            ]
+            RemovalRequest.objects.filter(
+                functools.reduce(operator.or_, groups),
+                is_test=False,
+                invoice__isnull=True,
+                requested_datetime__gte=period_start,
+                requested_datetime__lt=period_end,
+            ).update(
+                invoice=Case(
+                    *(
+                        When(group, then=invoice.pk)
+                        for group, invoice in zip(groups, invoices)
+                    ),
+                ),
+            )
+
+            fees = invoice_fees_sum(invoice_ids=[invoice.pk for invoice in invoices])
+            CustomerInvoice.objects.filter(
+                pk__in=[invoice.pk for invoice in invoices if invoice.pk not in fees]
+            ).delete()
+            invoices = [invoice for invoice in invoices if invoice.pk in fees]
+            for invoice in invoices:
+                invoice.fees = fees[invoice.pk]
+            CustomerInvoice.objects.bulk_update(invoices, ["fees"])
+        yield invoices
+
+
+def partner_demand_allocate(
+    *,
+    min_order_kg: int = 1000,
+    create_orders: bool = False,
+    settle_time: datetime.timedelta = datetime.timedelta(minutes=5),
+    dry_run: bool = False,
+) -> Tuple[Dict[int, int], List[PartnerPurchase]]:
+    """Adds the weight of live removal request items made since the last run to
+    each partner's un-allocated demand and proposes a :class:`PartnerPurchase`
+    (in the partner's currency) for partners with at least `min_order_kg` of
+    demand. When `create_orders` is set the orders are saved and removed from
+    the partner's demand.
+
+    Only items after the last run's watermark are scanned. Items from the last
+    `settle_time` are left for the next run as transactions that are still in
+    progress may commit items with lower primary keys. An item committed more
+    than `settle_time` after it was requested is below the watermark by then and
+    never allocated, so `settle_time` must be longer than any transaction that
+    creates removal requests.
+
+    Runs take turns (on PostgreSQL) so concurrent runs don't add the same items
+    twice.
+
+    Returns the grams added per partner ID and the proposed/created orders."""
+    with transaction.atomic():
+        db_advisory_xact_lock(name="partner_demand_allocate")
+        watermark = partner_allocation_watermark_get()
+        up_to_pk = removal_request_item_get_max_pk(
+            after_pk=watermark,
+            before=timezone.now() - settle_time,
+        )
+        added_grams = removal_request_item_sum_grams_by_partner(
+            after_pk=watermark,
+            up_to_pk=up_to_pk,
+        )
+        for partner_id, grams in added_grams.items():
+            PartnerDemand.objects.get_or_create(removal_partner_id=partner_id)
+            PartnerDemand.objects.filter(removal_partner_id=partner_id).update(
+                unallocated_grams=F("unallocated_grams") + grams
+            )
+        PartnerAllocationRun.objects.create(item_watermark=up_to_pk)
+
+        orders = []
+        demands = PartnerDemand.objects.select_for_update().filter(
+            unallocated_grams__gte=min_order_kg * 1000,
+        )
+        for demand in demands.select_related("removal_partner"):
+            partner = demand.removal_partner
+            order_kg = demand.unallocated_grams // 1000
+            order = PartnerPurchase(
+                cdr_amount=order_kg,
+                weight_unit=WeightUnitChoices.KILOGRAM,
+                cdr_cost=math.ceil(
+                    partner_cost_calculate(
+                        partner=partner, cdr_amount_g=order_kg * 1000
+                    )
+                ),
+                currency=partner.currency,
+                removal_partner=partner,
+                ordered_date=timezone.now().date(),
+            )
+            if create_orders:
+                order.save()
+                demand.unallocated_grams -= order_kg * 1000
+                demand.save(update_fields=("unallocated_grams",))
+            orders.append(order)
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    return added_grams, orders
+
+
+def usage_rollup_add(*, removal_request: RemovalRequest):
+    """Adds the items of a new removal request to its organisation's
+    :class:`UsageRollup`. Call it in the transaction that creates the request so
+    the rollup is never out of step with the items."""
+    for row in removal_request_item_list_usage(removal_request=removal_request):
+        key = {field: row.pop(field) for field in USAGE_ROLLUP_KEY}
+        increments = {field: F(field) + value for field, value in row.items()}
+
+        if UsageRollup.objects.filter(**key).update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                UsageRollup.objects.create(**key, **row)
+        except IntegrityError:
+            # Another request created the row for this day in the meantime
+            UsageRollup.objects.filter(**key).update(**increments)
+
+
+def usage_rollup_rebuild(*, start: datetime.date, end: datetime.date) -> int:
+    """Recomputes the :class:`UsageRollup` for the days between `start` and
+    `end` (inclusive) from the removal request items e.g. to backfill it or to
+    catch up with items changed outside of :func:`removal_request_create`.
+
+    Returns the number of rollup rows written."""
+    with transaction.atomic():
+        UsageRollup.objects.filter(day__range=(start, end)).delete()
+        rollups = UsageRollup.objects.bulk_create(
+            UsageRollup(**row)
+            for row in removal_request_item_list_usage(start=start, end=end)
+        )
+    return len(rollups)
+
+
+def analytics_export_watermarks_get(*, storage: Storage, prefix: str) -> Dict[str, int]:
+    """The last primary key exported for each analytics table. Kept next to the
+    exported files so each destination is exported to incrementally."""
+    name = f"{prefix}_watermarks.json"
+    if not storage.exists(name):
+        return {}
+    with storage.open(name) as watermarks:
+        return json.load(watermarks)
+
+
+def analytics_export_file_save(*, storage: Storage, name: str, content: bytes):
+    # Storages don't overwrite files, they pick a new name instead
+    storage.delete(name)
+    storage.save(name, ContentFile(content))
+
+
+def analytics_export(
+    *,
+    storage: Storage = default_storage,
+    prefix: Optional[str] = None,
+    file_type: str = "jsonl",
+    tables: Optional[Iterable[str]] = None,
+    chunk_size: int = 50_000,
+    settle_time: datetime.timedelta = datetime.timedelta(minutes=5),
+) -> Iterator[Tuple[str, int]]:
+    """Exports tables for analytics to files, yielding the table and number of
+    rows of each chunk written.
+
+    New rows are appended as `<table>/date=YYYY-MM-DD/part-<first pk>.<ext>` so
+    tools can read the files as a dataset partitioned by day. Only rows after the
+    previous run's watermark are exported and they're read `chunk_size` at a time
+    so memory use doesn't grow with the size of the tables. Rows newer than
+    `settle_time` are left for the next run as transactions that are still in
+    flight could commit rows with smaller primary keys.
+
+    Rows are only exported once: changes to rows already exported (e.g. a removal
+    request's `invoice_id` being set later) are never exported. Join with a fresh
+    copy of the table when those columns matter.
+
+    Tables that aren't partitioned are small and rewritten every run."""
+    if prefix is None:
+        prefix = settings.ANALYTICS_EXPORT_PREFIX
+    extension = EXPORT_FILE_EXTENSIONS[file_type]
+    watermarks = analytics_export_watermarks_get(storage=storage, prefix=prefix)
+    before = timezone.now() - settle_time
+
+    for table in tables or ANALYTICS_EXPORT_TABLES:
+        _, columns, partition_by = ANALYTICS_EXPORT_TABLES[table]
+        last_pk = watermarks.get(table, 0) if partition_by is not None else 0
+        up_to_pk = analytics_export_get_max_pk(
+            table=table, after_pk=last_pk, before=before
+        )
+        if partition_by is None:
+            rows = analytics_export_list_rows(
+                table=table, after_pk=0, up_to_pk=up_to_pk, limit=up_to_pk
+            )
+            analytics_export_file_save(
+                storage=storage,
+                name=f"{prefix}{table}/{table}.{extension}",
+                content=export_file_content(
+                    columns=columns,
+                    rows=(row[:-1] for row in rows),
+                    file_type=file_type,
+                ),
+            )
+            yield table, len(rows)
+            continue
+
+        while last_pk < up_to_pk:
+            rows = analytics_export_list_rows(
+                table=table, after_pk=last_pk, up_to_pk=up_to_pk, limit=chunk_size
+            )
+            partitions = itertools.groupby(
+                sorted(rows, key=lambda row: row[-1]), key=lambda row: row[-1]
+            )
+            for day, partition_rows in partitions:
+                partition_rows = [row[:-1] for row in partition_rows]
+                analytics_export_file_save(
+                    storage=storage,
+                    name=(
+                        f"{prefix}{table}/date={day.isoformat()}/"
+                        + f"part-{partition_rows[0][0]:012d}.{extension}"
+                    ),
+                    content=export_file_content(
+                        columns=columns, rows=partition_rows, file_type=file_type
+                    ),
+                )
+
+            # Save progress after each chunk so an interrupted run resumes here
+            last_pk = watermarks[table] = rows[-1][0]
+            analytics_export_file_save(
+                storage=storage,
+                name=f"{prefix}_watermarks.json",
+                content=json.dumps(watermarks).encode(),
+            )
+            yield table, len(rows)
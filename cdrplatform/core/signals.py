@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from cdrplatform.core.models import Certificate, RemovalRequestItem
+from cdrplatform.core.services import (
+    certificate_refresh,
+    certificate_snapshot_delete,
+    certificate_snapshot_publish,
+)
+
+
+@receiver(post_save, sender=Certificate)
+def certificate_publish_snapshot(sender, instance: Certificate, **kwargs):
+    if settings.CERTIFICATE_SNAPSHOT_ENABLED:
+        transaction.on_commit(
+            lambda: certificate_snapshot_publish(certificate=instance),
+        )
+
+
+@receiver(post_delete, sender=Certificate)
+def certificate_delete_snapshot(sender, instance: Certificate, **kwargs):
+    if settings.CERTIFICATE_SNAPSHOT_ENABLED:
+        transaction.on_commit(
+            lambda: certificate_snapshot_delete(
+                certificate_id=instance.certificate_id,
+            ),
+        )
+
+
+@receiver((post_save, post_delete), sender=RemovalRequestItem)
+def removal_request_item_refresh_certificates(
+    sender, instance: RemovalRequestItem, created: bool = False, **kwargs
+):
+    # Items are added when a request is made, before it can be certified.
+    # Bulk changes (e.g. `update()`) need `publish_certificate_snapshots`.
+    if not created:
+        transaction.on_commit(
+            lambda: certificate_refresh(
+                removal_request_id=instance.removal_request_id,
+            ),
+        )
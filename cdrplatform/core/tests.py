@@ -1,35 +1,126 @@
+import contextlib
+import csv
 import datetime
+import gzip
+import io
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
 import uuid
 from datetime import timedelta
+from functools import partial
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, router
+from django.http import HttpResponse
+from django.test import (
+    AsyncRequestFactory,
+    LiveServerTestCase,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import NoReverseMatch, reverse
 from django.utils import timezone
 from faker import Faker
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from cdrplatform.core.admin import CertificateAdmin
+from cdrplatform.core.api.base import api_view_for_deployment
+from cdrplatform.core.api.cdr.pricing import AsyncCDRPricingView, CDRPricingView
+from cdrplatform.core.api.cdr.purchase import CDRRemovalView
+from cdrplatform.core.api.certificate.retrieve import (
+    AsyncCertificateRetrievalView,
+    CertificateRetrievalView,
+)
+from cdrplatform.core.api.healthcheck import AsyncLivenessView, AsyncReadinessView
+from cdrplatform.core.benchmarks import benchmark_compare, benchmark_seed
+from cdrplatform.core.consts import SESSION_KEY_ORG_ID
+from cdrplatform.core.converters import CertificateIDConverter
+from cdrplatform.core.crypto import CertificateIDGenerator
+from cdrplatform.core.db.locks import db_advisory_xact_lock
+from cdrplatform.core.db.pool import (
+    ConnectionPool,
+    ConnectionPoolTimeout,
+    connection_pool_get,
+    connection_pool_stats,
+)
 from cdrplatform.core.exceptions import (
     APIKeyExpiredException,
     APIKeyNotPresentOrRevoked,
 )
+from cdrplatform.core.health import health_cache_pool
+from cdrplatform.core.loadtest import (
+    loadtest_compare,
+    loadtest_parse_http_file,
+)
+from cdrplatform.core.metrics import metrics
+from cdrplatform.core.middleware import (
+    QueryInstrumentationMiddleware,
+    ReplicaRoutingMiddleware,
+)
+from cdrplatform.core.profiling import profiling_token_create
+from cdrplatform.core.rendering import _font
+from cdrplatform.core.routers import db_replica_reads, db_sticky_keys
+from cdrplatform.core.schema import schema_cache_clear, schema_content_generate
 from cdrplatform.core.selectors import (
     api_key_list_all,
     api_key_list_prod_only,
     api_key_list_test_only,
     api_key_must_be_present_and_valid,
+    certificate_cache_get,
+    partner_reconciliation_list,
+    removal_request_list_eligible_for_certificate,
+    variable_fees_calculate,
+)
+from cdrplatform.core.services import (
+    api_key_create,
+    certificate_cache_invalidate,
+    certificate_snapshot_bulk_publish,
+    customer_organisation_list_receiver_emails,
+    invoice_bulk_create,
+    invoice_generate_for_period,
+    partner_demand_allocate,
+    removal_request_create,
+    usage_rollup_rebuild,
+    user_signup_with_default_customer_organisation,
 )
-from cdrplatform.core.services import api_key_create
+from cdrplatform.core.warmup import app_warm_up
 
 from .models import (
     Certificate,
     CurrencyChoices,
     CurrencyConversionRate,
+    CustomerInvoice,
     CustomerOrganisation,
     OrganisationAPIKey,
+    PartnerConfirmation,
+    PartnerDemand,
+    PartnerPurchase,
+    RemovalPartner,
     RemovalRequest,
     RemovalRequestItem,
+    UsageRollup,
     WeightUnitChoices,
 )
+from .views.org.settings import APIKeysView
 
 fake = Faker()
 
@@ -56,6 +147,35 @@ class APIKeyMixin:
         return super().setUp()
 
 
+class QueryBudgetMixin:
+    """Checks views stay within their `query_budget`, which the
+    :class:`QueryInstrumentationMiddleware` only warns about."""
+
+    @contextlib.contextmanager
+    def assertWithinQueryBudget(self, view_class):
+        with CaptureQueriesContext(connection) as queries:
+            yield
+        self.assertLessEqual(
+            len(queries),
+            view_class.query_budget,
+            f"{view_class.__name__} went over its query budget",
+        )
+
+
+class TemporaryMediaMixin:
+    """Saves any files written to the default storage to a temporary
+    directory that is removed after each test."""
+
+    def setUp(self) -> None:
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        return super().setUp()
+
+
 class APIKeyTestCase(APIKeyMixin, APITestCase):
     def test_api_key_generation(self):
         # We should have 1 key from the :class:`APIKeyMixin.setUp` method
@@ -77,6 +197,7 @@ class APIKeyTestCase(APIKeyMixin, APITestCase):
         )
         self.assertTrue(api_key.prefix.startswith("test_"))
         self.assertTrue(key.startswith("test_"))
+        self.assertTrue(api_key.is_test)
         # Check that both objects and test_objects returns the key is valid
         self.assertTrue(OrganisationAPIKey.test_objects.is_valid(key))
         self.assertTrue(OrganisationAPIKey.objects.is_valid(key))
@@ -156,7 +277,7 @@ class APIKeyTestCase(APIKeyMixin, APITestCase):
         self.assertEqual(api_key_list_all(org=self.org).count(), 2)
 
 
-class CDRPricingViewTestCase(APIKeyMixin, APITestCase):
+class CDRPricingViewTestCase(QueryBudgetMixin, APIKeyMixin, APITestCase):
     fixtures = ("removal_methods_partners", "currency_conversion_rates")
 
     @classmethod
@@ -280,7 +401,8 @@ class CDRPricingViewTestCase(APIKeyMixin, APITestCase):
                 {"method_type": "bio-oil", "cdr_amount": 10},
             ],
         }
-        response = self.client.post(url, data)
+        with self.assertWithinQueryBudget(CDRPricingView):
+            response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(
             response.data,
@@ -300,7 +422,7 @@ class CDRPricingViewTestCase(APIKeyMixin, APITestCase):
         )
 
 
-class CDRRemovalViewTestCase(APIKeyMixin, APITestCase):
+class CDRRemovalViewTestCase(QueryBudgetMixin, APIKeyMixin, APITestCase):
     fixtures = ("removal_methods_partners", "currency_conversion_rates")
 
     @classmethod
@@ -443,7 +565,8 @@ class CDRRemovalViewTestCase(APIKeyMixin, APITestCase):
                 {"method_type": "bio-oil", "cdr_amount": 10},
             ],
         }
-        response = self.client.post(url, data)
+        with self.assertWithinQueryBudget(CDRRemovalView):
+            response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         transaction_uuid = uuid.UUID(
             response.data["transaction_uuid"]
@@ -469,7 +592,7 @@ class CDRRemovalViewTestCase(APIKeyMixin, APITestCase):
         self.assertEqual(removal_requests.count(), 2)
 
 
-class CertificateRetrievalViewTestCase(APIKeyMixin, APITestCase):
+class CertificateRetrievalViewTestCase(QueryBudgetMixin, APIKeyMixin, APITestCase):
     validCertificateId = "XXX-YYY-ZZZ"
 
     @classmethod
@@ -494,6 +617,11 @@ class CertificateRetrievalViewTestCase(APIKeyMixin, APITestCase):
         )
         return super().setUpTestData()
 
+    def setUp(self) -> None:
+        # Certificates are cached across requests so start each test fresh
+        cache.clear()
+        return super().setUp()
+
     def test_certificate_retrieval_exists(self):
         """
         Ensure we can successfully retrieve a certificate.
@@ -504,7 +632,8 @@ class CertificateRetrievalViewTestCase(APIKeyMixin, APITestCase):
         self.assertEqual(removal_request.count(), 0)
 
         url = reverse("v1:certificate_retrieve", kwargs={"id": "XXX-YYY-ZZZ"})
-        response = self.client.get(url)
+        with self.assertWithinQueryBudget(CertificateRetrievalView):
+            response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(
             response.data,
@@ -543,3 +672,2011 @@ class CertificateRetrievalViewTestCase(APIKeyMixin, APITestCase):
         """
         with self.assertRaises(NoReverseMatch):
             reverse("v1:certificate_retrieve", kwargs={"id": "123-XXX-XXX"})
+
+    def test_certificate_retrieval_ignores_case(self):
+        """
+        Ensure certificate IDs are looked up case-insensitively.
+        """
+        url = reverse("v1:certificate_retrieve", kwargs={"id": "xxx-yyY-zzz"})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["certificate_id"], "XXX-YYY-ZZZ")
+
+    def test_certificate_id_must_be_unique_ignoring_case(self):
+        with self.assertRaises(IntegrityError):
+            Certificate.objects.create(
+                certificate_id="xxx-yyy-zzz",
+                issued_date=datetime.date(2020, 1, 1),
+                display_name="Duplicate Certificate",
+            )
+
+    def test_certificate_retrieval_is_cached(self):
+        """
+        Ensure certificates are served from the cache once retrieved and
+        only refreshed when invalidated.
+        """
+        url = reverse("v1:certificate_retrieve", kwargs={"id": "XXX-YYY-ZZZ"})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("max-age=", response.headers["Cache-Control"])
+
+        # Updating outside the admin doesn't change the cached representation
+        Certificate.objects.filter(certificate_id="XXX-YYY-ZZZ").update(
+            display_name="Updated Certificate"
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.data["display_name"], "Test Certificate")
+
+        certificate_cache_invalidate(certificate_id="XXX-YYY-ZZZ")
+        response = self.client.get(url)
+        self.assertEqual(response.data["display_name"], "Updated Certificate")
+
+    def test_certificate_cache_invalidated_when_items_change(self):
+        url = reverse("v1:certificate_retrieve", kwargs={"id": "XXX-YYY-ZZZ"})
+        self.client.get(url)
+        item = RemovalRequestItem.objects.get(
+            removal_request__certificate__certificate_id="XXX-YYY-ZZZ"
+        )
+        item.cdr_amount = 700
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data["removal_amount_kg"], 700)
+
+    def test_certificate_admin_invalidates_on_commit(self):
+        url = reverse("v1:certificate_retrieve", kwargs={"id": "XXX-YYY-ZZZ"})
+        self.client.get(url)
+        certificate = Certificate.objects.get(certificate_id="XXX-YYY-ZZZ")
+        model_admin = CertificateAdmin(Certificate, admin.site)
+        with self.captureOnCommitCallbacks() as callbacks:
+            model_admin.delete_model(None, certificate)
+        # Still cached until the deletion is committed
+        self.assertIsNotNone(certificate_cache_get(certificate_id="XXX-YYY-ZZZ"))
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(certificate_cache_get(certificate_id="XXX-YYY-ZZZ"))
+
+    def test_certificate_retrieval_not_modified(self):
+        """
+        Ensure a matching `If-None-Match` header returns a 304 without a body.
+        """
+        url = reverse("v1:certificate_retrieve", kwargs={"id": "XXX-YYY-ZZZ"})
+        response = self.client.get(url)
+        etag = response.headers["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"not-the-etag"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class CertificateDownloadViewTestCase(TemporaryMediaMixin, APIKeyMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        removal_request = RemovalRequest.objects.create(
+            weight_unit=WeightUnitChoices.KILOGRAM,
+            currency=CurrencyChoices.CHF,
+        )
+        RemovalRequestItem.objects.create(
+            removal_request=removal_request,
+            cdr_cost=1000,
+            variable_fees=150,
+            cdr_amount=500,
+        )
+        Certificate.objects.create(
+            certificate_id="XXX-YYY-ZZZ",
+            issued_date=datetime.date(2020, 1, 1),
+            display_name="Test Certificate",
+            removal_request=removal_request,
+        )
+        return super().setUpTestData()
+
+    def setUp(self) -> None:
+        cache.clear()
+        super().setUp()
+        self.artifact_dir = os.path.join(self.media_root, "certificates")
+
+    def download(self, file_type: str, **extra):
+        url = reverse(
+            "v1:certificate_download",
+            kwargs={"id": "XXX-YYY-ZZZ", "file_type": file_type},
+        )
+        return self.client.get(url, **extra)
+
+    def test_certificate_download(self):
+        """
+        Ensure certificates can be downloaded as PDF and PNG files.
+        """
+        response = self.download("pdf", HTTP_ACCEPT="application/pdf")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers["Content-Type"], "application/pdf")
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+        response = self.download("png")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers["Content-Type"], "image/png")
+
+        response = self.download("gif")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_certificate_rendered_without_system_font(self):
+        """
+        Ensure certificates render with the bundled font when the system has none.
+        """
+        with mock.patch(
+            "cdrplatform.core.rendering.CERTIFICATE_FONT", "not-installed.ttf"
+        ):
+            self.assertEqual(_font(72).size, 72)
+            response = self.download("png")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"\x89PNG"))
+
+    def test_certificate_download_range(self):
+        """
+        Ensure part of a certificate can be downloaded with a `Range` header.
+        """
+        full = b"".join(self.download("png").streaming_content)
+
+        response = self.download("png", HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response.headers["Content-Range"], f"bytes 10-19/{len(full)}")
+        self.assertEqual(b"".join(response.streaming_content), full[10:20])
+
+        response = self.download("png", HTTP_RANGE=f"bytes={len(full)}-")
+        self.assertEqual(
+            response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+
+    def test_certificate_only_rendered_when_changed(self):
+        """
+        Ensure certificates are rendered once and again only when they change.
+        """
+        self.download("png")
+        self.download("png")
+        self.assertEqual(len(os.listdir(self.artifact_dir)), 1)
+
+        Certificate.objects.filter(certificate_id="XXX-YYY-ZZZ").update(
+            display_name="Updated Certificate"
+        )
+        certificate_cache_invalidate(certificate_id="XXX-YYY-ZZZ")
+        self.download("png")
+        self.assertEqual(len(os.listdir(self.artifact_dir)), 2)
+
+    def test_certificate_rendered_concurrently(self):
+        """
+        Ensure a worker rendering an artifact another worker just saved doesn't
+        leave a duplicate and serves it with the same ETag.
+        """
+        first = self.download("png")
+        # As if the other worker saved it between the check and the save
+        exists = default_storage.exists
+        checked = []
+
+        def exists_after_check(name):
+            checked.append(name)
+            return len(checked) > 1 and exists(name)
+
+        with mock.patch.object(default_storage, "exists", exists_after_check):
+            second = self.download("png")
+        self.assertEqual(len(os.listdir(self.artifact_dir)), 1)
+        self.assertEqual(second.headers["ETag"], first.headers["ETag"])
+        self.assertEqual(
+            b"".join(second.streaming_content), b"".join(first.streaming_content)
+        )
+
+
+class CertificateIssuanceTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.org = CustomerOrganisation.objects.create(
+            organisation_name="Certified Org",
+        )
+        for is_test, display_name in (
+            (False, ""),
+            (False, "Custom Name"),
+            (True, ""),
+        ):
+            removal_request = RemovalRequest.objects.create(
+                weight_unit=WeightUnitChoices.KILOGRAM,
+                currency=CurrencyChoices.CHF,
+                customer_organisation=cls.org,
+                is_test=is_test,
+                meta_certificate_display_name=display_name,
+            )
+            RemovalRequestItem.objects.create(
+                removal_request=removal_request,
+                cdr_cost=1000,
+                variable_fees=150,
+                cdr_amount=500,
+            )
+        # A live request without items shouldn't get a certificate
+        RemovalRequest.objects.create(
+            weight_unit=WeightUnitChoices.KILOGRAM,
+            currency=CurrencyChoices.CHF,
+            customer_organisation=cls.org,
+            is_test=False,
+        )
+        return super().setUpTestData()
+
+    def test_certificate_id_generation(self):
+        """
+        Ensure generated IDs are unique and valid in certificate URLs.
+        """
+        generator = CertificateIDGenerator(secret="testing")
+        ids = {generator.generate(n) for n in range(2000)}
+        self.assertEqual(len(ids), 2000)
+        for certificate_id in ids:
+            self.assertTrue(
+                re.fullmatch(CertificateIDConverter.regex, certificate_id),
+            )
+        self.assertEqual(generator.generate(42), generator.generate(42))
+        with self.assertRaises(ValueError):
+            generator.generate(generator.keyspace)
+
+    def test_issue_certificates(self):
+        """
+        Ensure certificates are only issued once for live requests with items.
+        """
+        call_command("issue_certificates", "--batch-size=1", stdout=io.StringIO())
+        self.assertEqual(
+            sorted(Certificate.objects.values_list("display_name", flat=True)),
+            ["Certified Org", "Custom Name"],
+        )
+
+        # Running again is a no-op as everything has been issued
+        call_command("issue_certificates", stdout=io.StringIO())
+        self.assertEqual(Certificate.objects.count(), 2)
+
+    def test_issue_certificates_id_taken(self):
+        """
+        Ensure a certificate whose ID is already taken is skipped rather than
+        failing the whole batch.
+        """
+        removal_request = (
+            removal_request_list_eligible_for_certificate(before=timezone.now())
+            .order_by("pk")
+            .first()
+        )
+        Certificate.objects.create(
+            certificate_id=CertificateIDGenerator()
+            .generate(removal_request.pk)
+            .lower(),
+            issued_date=datetime.date(2023, 1, 1),
+            display_name="Issued elsewhere",
+        )
+        with self.assertLogs("cdrplatform.core.services", "WARNING"):
+            call_command("issue_certificates", stdout=io.StringIO())
+        self.assertEqual(Certificate.objects.count(), 2)
+        self.assertFalse(
+            Certificate.objects.filter(removal_request=removal_request).exists()
+        )
+
+    @override_settings(CERTIFICATE_ID_KEY="")
+    def test_certificate_id_key_required(self):
+        with self.assertRaises(ImproperlyConfigured):
+            CertificateIDGenerator()
+
+    def test_issue_certificates_dry_run(self):
+        out = io.StringIO()
+        call_command("issue_certificates", "--dry-run", stdout=out)
+        self.assertIn("Would issue 2 certificates so far", out.getvalue())
+        self.assertNotIn("Issued", out.getvalue())
+        self.assertIn("Would issue 2 certificates.", out.getvalue())
+        self.assertEqual(Certificate.objects.count(), 0)
+
+
+@override_settings(CERTIFICATE_SNAPSHOT_ENABLED=True)
+class CertificateSnapshotTestCase(TemporaryMediaMixin, APITestCase):
+    def create_certificate(self) -> Certificate:
+        removal_request = RemovalRequest.objects.create(
+            weight_unit=WeightUnitChoices.TONNE,
+            currency=CurrencyChoices.CHF,
+        )
+        RemovalRequestItem.objects.create(
+            removal_request=removal_request,
+            cdr_cost=1000,
+            variable_fees=150,
+            cdr_amount=2,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            return Certificate.objects.create(
+                certificate_id="AAA-BBB-CCC",
+                issued_date=datetime.date(2020, 1, 1),
+                display_name="Snapshot Certificate",
+                removal_request=removal_request,
+            )
+
+    def test_snapshot_published_on_save(self):
+        """
+        Ensure a static snapshot is written when a certificate is saved.
+        """
+        certificate = self.create_certificate()
+        snapshot_path = os.path.join(self.media_root, "verify", "AAA-BBB-CCC.json")
+        with open(snapshot_path) as f:
+            self.assertEqual(
+                json.load(f),
+                {
+                    "certificate_id": "AAA-BBB-CCC",
+                    "display_name": "Snapshot Certificate",
+                    "issued_date": "2020-01-01",
+                    "removal_amount_kg": 2000,
+                },
+            )
+        html_path = os.path.join(self.media_root, "verify", "AAA-BBB-CCC.html")
+        self.assertTrue(os.path.exists(html_path))
+
+        certificate.display_name = "Updated Certificate"
+        # Replaced without ever being missing
+        with mock.patch.object(
+            default_storage, "delete", side_effect=AssertionError
+        ), self.captureOnCommitCallbacks(execute=True):
+            certificate.save()
+        with open(snapshot_path) as f:
+            self.assertEqual(json.load(f)["display_name"], "Updated Certificate")
+        # Overwriting shouldn't leave any other files behind
+        self.assertEqual(len(os.listdir(os.path.dirname(snapshot_path))), 2)
+
+    def test_snapshot_refreshed_when_items_change(self):
+        certificate = self.create_certificate()
+        item = certificate.removal_request.items.get()
+        item.cdr_amount = 3
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        snapshot_path = os.path.join(self.media_root, "verify", "AAA-BBB-CCC.json")
+        with open(snapshot_path) as f:
+            self.assertEqual(json.load(f)["removal_amount_kg"], 3000)
+
+        RemovalRequestItem.objects.create(
+            removal_request=certificate.removal_request,
+            cdr_cost=1000,
+            variable_fees=150,
+            cdr_amount=1,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        with open(snapshot_path) as f:
+            self.assertEqual(json.load(f)["removal_amount_kg"], 1000)
+
+    def test_snapshot_bulk_publish(self):
+        certificate = self.create_certificate()
+        Certificate.objects.create(
+            certificate_id="DDD-EEE-FFF",
+            issued_date=datetime.date(2020, 1, 1),
+            display_name="No Request",
+        )
+        os.remove(os.path.join(self.media_root, "verify", "AAA-BBB-CCC.json"))
+        # One query whatever the number of certificates
+        with self.assertNumQueries(1):
+            total = certificate_snapshot_bulk_publish(
+                certificates=Certificate.objects.all()
+            )
+        self.assertEqual(total, 2)
+        for certificate_id, removal_amount_kg in (
+            (certificate.certificate_id, 2000),
+            ("DDD-EEE-FFF", 0),
+        ):
+            path = os.path.join(self.media_root, "verify", f"{certificate_id}.json")
+            with open(path) as f:
+                self.assertEqual(json.load(f)["removal_amount_kg"], removal_amount_kg)
+
+    def test_snapshot_removed_on_delete(self):
+        certificate = self.create_certificate()
+        with self.captureOnCommitCallbacks(execute=True):
+            certificate.delete()
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "verify")), [])
+
+
+# Dashboard templates use static files but there is no manifest when testing
+@override_settings(
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage"
+)
+class APIKeysViewTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = user_signup_with_default_customer_organisation(
+            name=fake.name(),
+            email=fake.email(),
+            password=fake.password(),
+        )
+        cls.org = cls.user.organisations.get()
+        # An organisation the user isn't a member of
+        cls.other_org = CustomerOrganisation.objects.create(
+            organisation_name=fake.company(),
+        )
+        return super().setUpTestData()
+
+    def setUp(self) -> None:
+        self.client.force_login(self.user)
+        return super().setUp()
+
+    def test_api_key_created_for_current_organisation(self):
+        """
+        Ensure API keys are created for the organisation in the session.
+        """
+        url = reverse("org:settings:api_keys")
+        response = self.client.post(url, {"name": "my-key"}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(api_key_list_all(org=self.org).count(), 1)
+        self.assertEqual(len(response.context["api_keys_prod"]), 1)
+        # The resolved organisation is remembered in the session
+        self.assertEqual(self.client.session[SESSION_KEY_ORG_ID], self.org.short_id)
+
+    def test_organisation_membership_is_validated(self):
+        """
+        Ensure an organisation in the session the user isn't a member of
+        is ignored.
+        """
+        session = self.client.session
+        session[SESSION_KEY_ORG_ID] = self.other_org.short_id
+        session.save()
+
+        url = reverse("org:settings:api_keys")
+        self.client.post(url, {"name": "my-key"}, format="multipart")
+        self.assertEqual(api_key_list_all(org=self.other_org).count(), 0)
+        self.assertEqual(api_key_list_all(org=self.org).count(), 1)
+
+    def test_api_keys_search_and_pagination(self):
+        """
+        Ensure API keys can be searched by name and are paginated.
+        """
+        api_key_create(organisation=self.org, api_key_name="store-1")
+        api_key_create(organisation=self.org, api_key_name="store-2", test_key=True)
+        api_key_create(organisation=self.org, api_key_name="warehouse")
+
+        url = reverse("org:settings:api_keys")
+        response = self.client.get(url, {"q": "STORE"})
+        self.assertEqual(
+            [key.name for key in response.context["api_keys_prod"]], ["store-1"]
+        )
+        self.assertEqual(
+            [key.name for key in response.context["api_keys_test"]], ["store-2"]
+        )
+
+        with mock.patch.object(APIKeysView, "paginate_by", 2):
+            response = self.client.get(url, {"page": 2})
+        self.assertEqual(response.context["page_obj"].paginator.num_pages, 2)
+        self.assertEqual(response.context["api_keys_prod"], [])
+        self.assertEqual(
+            [key.name for key in response.context["api_keys_test"]], ["store-2"]
+        )
+
+
+class InvoiceGenerationTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = user_signup_with_default_customer_organisation(
+            name=fake.name(),
+            email=fake.email(),
+            password=fake.password(),
+        )
+        cls.org = cls.user.organisations.get()
+        cls.other_org = CustomerOrganisation.objects.create(
+            organisation_name=fake.company(),
+        )
+
+        in_period = datetime.datetime(2023, 3, 15, tzinfo=datetime.timezone.utc)
+        after_period = datetime.datetime(2023, 4, 1, tzinfo=datetime.timezone.utc)
+        for org, currency, is_test, requested_datetime in (
+            (cls.org, CurrencyChoices.CHF, False, in_period),
+            (cls.org, CurrencyChoices.CHF, False, in_period),
+            (cls.org, CurrencyChoices.USD, False, in_period),
+            (cls.org, CurrencyChoices.CHF, True, in_period),
+            (cls.org, CurrencyChoices.CHF, False, after_period),
+            (cls.other_org, CurrencyChoices.EUR, False, in_period),
+        ):
+            removal_request = RemovalRequest.objects.create(
+                weight_unit=WeightUnitChoices.KILOGRAM,
+                currency=currency,
+                customer_organisation=org,
+                is_test=is_test,
+            )
+            RemovalRequest.objects.filter(pk=removal_request.pk).update(
+                requested_datetime=requested_datetime
+            )
+            RemovalRequestItem.objects.create(
+                removal_request=removal_request,
+                cdr_cost=1000,
+                variable_fees=150,
+                cdr_amount=500,
+            )
+        return super().setUpTestData()
+
+    def test_generate_invoices(self):
+        """
+        Ensure one invoice is generated per organisation and currency for live
+        requests in the billing period.
+        """
+        call_command(
+            "generate_invoices", "--month=2023-03", "--shards=2", stdout=io.StringIO()
+        )
+        invoices = CustomerInvoice.objects.filter(customer_organisation=self.org)
+        self.assertEqual(
+            sorted(invoices.values_list("currency", "fees")),
+            [("chf", 2300), ("usd", 1150)],
+        )
+        self.assertEqual(
+            set(invoices.values_list("receiver_email", flat=True)), {self.user.email}
+        )
+        self.assertEqual(
+            CustomerInvoice.objects.filter(
+                customer_organisation=self.other_org
+            ).count(),
+            1,
+        )
+        # Test requests and requests outside of the period aren't invoiced
+        self.assertEqual(RemovalRequest.objects.filter(invoice__isnull=True).count(), 2)
+        for invoice in CustomerInvoice.objects.all():
+            self.assertEqual(
+                sum(
+                    removal_request.total_cost
+                    for removal_request in RemovalRequest.objects.filter(
+                        invoice=invoice
+                    )
+                ),
+                invoice.fees,
+            )
+
+        # Running again doesn't invoice anything twice
+        call_command("generate_invoices", "--month=2023-03", stdout=io.StringIO())
+        self.assertEqual(CustomerInvoice.objects.count(), 3)
+
+    def test_generate_invoices_concurrently(self):
+        """
+        Ensure overlapping runs don't leave invoices without requests or with fees
+        that don't match the requests linked to them.
+        """
+        period = {
+            "period_start": datetime.datetime(2023, 3, 1, tzinfo=datetime.timezone.utc),
+            "period_end": datetime.datetime(2023, 4, 1, tzinfo=datetime.timezone.utc),
+            "issued_date": datetime.date(2023, 4, 1),
+        }
+        emails_target = (
+            "cdrplatform.core.services.customer_organisation_list_receiver_emails"
+        )
+
+        def other_run_first(**kwargs):
+            # Another run invoices the same requests after this one listed them
+            with mock.patch(emails_target, customer_organisation_list_receiver_emails):
+                for shard in range(2):
+                    for _ in invoice_generate_for_period(
+                        **period, shard=shard, shards=2
+                    ):
+                        pass
+            return customer_organisation_list_receiver_emails(**kwargs)
+
+        with mock.patch(emails_target, side_effect=other_run_first):
+            invoices = list(invoice_generate_for_period(**period))
+        self.assertEqual(invoices, [[]])
+        self.assertEqual(CustomerInvoice.objects.count(), 3)
+        for invoice in CustomerInvoice.objects.all():
+            self.assertEqual(
+                sum(
+                    removal_request.total_cost
+                    for removal_request in RemovalRequest.objects.filter(
+                        invoice=invoice
+                    )
+                ),
+                invoice.fees,
+            )
+
+    def test_invoice_id_collision(self):
+        """
+        Ensure a new invoice ID is drawn when a random one is already taken.
+        """
+        CustomerInvoice.objects.create(
+            invoice_id="TAKEN00000",
+            issued_date=datetime.date(2023, 4, 1),
+            fees=0,
+            currency=CurrencyChoices.CHF,
+        )
+        with mock.patch(
+            "cdrplatform.core.services.INVOICE_IDS.random",
+            side_effect=["TAKEN00000", "FRESH00000"],
+        ):
+            (invoice,) = invoice_bulk_create(
+                invoices=[
+                    CustomerInvoice(
+                        issued_date=datetime.date(2023, 4, 1),
+                        fees=0,
+                        currency=CurrencyChoices.CHF,
+                    )
+                ]
+            )
+        self.assertEqual(invoice.invoice_id, "FRESH00000")
+
+
+class CDRExportViewTestCase(APIKeyMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        super().setUpTestData()
+        other_org = CustomerOrganisation.objects.create(
+            organisation_name=fake.company(),
+        )
+        for org, cdr_amount in ((cls.org, 500), (cls.org, 250), (other_org, 100)):
+            removal_request = RemovalRequest.objects.create(
+                weight_unit=WeightUnitChoices.KILOGRAM,
+                currency=CurrencyChoices.CHF,
+                customer_organisation=org,
+                meta_client_reference_id="order-1",
+            )
+            RemovalRequestItem.objects.create(
+                removal_request=removal_request,
+                cdr_cost=1000,
+                variable_fees=150,
+                cdr_amount=cdr_amount,
+            )
+
+    def test_export_csv(self):
+        """
+        Ensure an organisation can export its removal history as CSV.
+        """
+        response = self.client.get(reverse("v1:cdr_export"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.headers["Content-Type"], "text/csv")
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row["cdr_amount"] for row in rows], ["500", "250"])
+        self.assertEqual(rows[0]["client_reference_id"], "order-1")
+
+    def test_export_jsonl_gzip(self):
+        response = self.client.get(
+            reverse("v1:cdr_export"),
+            {"file_type": "jsonl", "compression": "gzip"},
+            HTTP_ACCEPT="application/gzip",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(".jsonl.gz", response.headers["Content-Disposition"])
+        content = gzip.decompress(b"".join(response.streaming_content))
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([row["cdr_amount"] for row in rows], [500, 250])
+
+    def test_export_invalid_file_type(self):
+        response = self.client.get(reverse("v1:cdr_export"), {"file_type": "xlsx"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_from_dashboard(self):
+        user = user_signup_with_default_customer_organisation(
+            name=fake.name(),
+            email=fake.email(),
+            password=fake.password(),
+        )
+        self.client.force_login(user)
+        response = self.client.get(reverse("org:export"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Only the header as the user's organisation has no history
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 1)
+
+
+class PartnerDemandAllocationTestCase(APITestCase):
+    fixtures = ("removal_methods_partners",)
+
+    def create_item(self, *, weight_unit, cdr_amount, is_test=False):
+        removal_request = RemovalRequest.objects.create(
+            weight_unit=weight_unit,
+            currency=CurrencyChoices.CHF,
+            is_test=is_test,
+        )
+        return RemovalRequestItem.objects.create(
+            removal_partner_id=1,
+            removal_request=removal_request,
+            cdr_cost=1000,
+            variable_fees=150,
+            cdr_amount=cdr_amount,
+        )
+
+    def allocate(self, **kwargs):
+        return partner_demand_allocate(settle_time=datetime.timedelta(0), **kwargs)
+
+    def test_demand_is_tracked_incrementally(self):
+        """
+        Ensure each run only adds demand from live items since the last run.
+        """
+        self.create_item(weight_unit=WeightUnitChoices.TONNE, cdr_amount=1)
+        self.create_item(weight_unit=WeightUnitChoices.KILOGRAM, cdr_amount=500)
+        self.create_item(
+            weight_unit=WeightUnitChoices.TONNE, cdr_amount=9, is_test=True
+        )
+
+        added_grams, orders = self.allocate(min_order_kg=2000)
+        self.assertEqual(added_grams, {1: 1_500_000})
+        self.assertEqual(orders, [])
+
+        # Nothing new so nothing is added
+        added_grams, _ = self.allocate(min_order_kg=2000)
+        self.assertEqual(added_grams, {})
+
+        self.create_item(weight_unit=WeightUnitChoices.GRAM, cdr_amount=600_500)
+        added_grams, _ = self.allocate(min_order_kg=2000)
+        self.assertEqual(added_grams, {1: 600_500})
+        self.assertEqual(
+            PartnerDemand.objects.get(removal_partner_id=1).unallocated_grams,
+            2_100_500,
+        )
+
+    def test_orders_are_created_in_partner_currency(self):
+        self.create_item(weight_unit=WeightUnitChoices.KILOGRAM, cdr_amount=2500)
+        self.create_item(weight_unit=WeightUnitChoices.GRAM, cdr_amount=400)
+
+        _, orders = self.allocate(create_orders=True)
+        self.assertEqual(len(orders), 1)
+        order = PartnerPurchase.objects.get()
+        self.assertEqual(order.cdr_amount, 2500)
+        self.assertEqual(order.weight_unit, WeightUnitChoices.KILOGRAM)
+        self.assertEqual(order.currency, CurrencyChoices.USD)
+        self.assertEqual(order.cdr_cost, 1380)  # 2.5t at 552 per tonne
+        # The part that wasn't ordered is left over for next time
+        self.assertEqual(
+            PartnerDemand.objects.get(removal_partner_id=1).unallocated_grams, 400
+        )
+
+    def test_runs_take_turns(self):
+        """
+        Ensure runs take an advisory lock before reading the watermark.
+        """
+        with mock.patch("cdrplatform.core.services.db_advisory_xact_lock") as lock:
+            self.allocate()
+        lock.assert_called_once_with(name="partner_demand_allocate")
+
+        # Tests run in a transaction
+        with mock.patch.object(connection, "vendor", "postgresql"), mock.patch.object(
+            connection, "cursor"
+        ) as cursor:
+            db_advisory_xact_lock(name="partner_demand_allocate")
+        sql, (key,) = cursor.return_value.__enter__.return_value.execute.call_args[0]
+        self.assertEqual(sql, "SELECT pg_advisory_xact_lock(%s)")
+        self.assertTrue(-(2**63) <= key < 2**63)
+
+
+@override_settings(
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage"
+)
+class PartnerReconciliationTestCase(APITestCase):
+    fixtures = ("removal_methods_partners",)
+
+    def create_item(self, *, requested_datetime, weight_unit, cdr_amount):
+        removal_request = RemovalRequest.objects.create(
+            weight_unit=weight_unit,
+            currency=CurrencyChoices.CHF,
+            is_test=False,
+        )
+        # `requested_datetime` is set automatically on creation
+        RemovalRequest.objects.filter(pk=removal_request.pk).update(
+            requested_datetime=requested_datetime
+        )
+        RemovalRequestItem.objects.create(
+            removal_partner_id=1,
+            removal_request=removal_request,
+            cdr_cost=1000,
+            variable_fees=150,
+            cdr_amount=cdr_amount,
+        )
+
+    def create_purchase(self, *, ordered_date, cdr_amount, confirmed=False):
+        purchase = PartnerPurchase.objects.create(
+            removal_partner_id=1,
+            cdr_amount=cdr_amount,
+            weight_unit=WeightUnitChoices.KILOGRAM,
+            cdr_cost=1000,
+            currency=CurrencyChoices.USD,
+            ordered_date=ordered_date,
+        )
+        if confirmed:
+            PartnerConfirmation.objects.create(
+                partner_purchase=purchase,
+                confirmation_id=fake.uuid4(),
+            )
+
+    def setUp(self) -> None:
+        january = datetime.datetime(2023, 1, 15, tzinfo=datetime.timezone.utc)
+        self.create_item(
+            requested_datetime=january,
+            weight_unit=WeightUnitChoices.TONNE,
+            cdr_amount=2,
+        )
+        self.create_item(
+            requested_datetime=january + timedelta(days=40),
+            weight_unit=WeightUnitChoices.KILOGRAM,
+            cdr_amount=500,
+        )
+        self.create_purchase(
+            ordered_date=datetime.date(2023, 1, 20), cdr_amount=2000, confirmed=True
+        )
+        self.create_purchase(ordered_date=datetime.date(2023, 2, 3), cdr_amount=500)
+        return super().setUp()
+
+    def test_reconciliation_totals(self):
+        rows = partner_reconciliation_list()
+        self.assertEqual(
+            [(row["month"], row["sold_grams"], row["confirmed_grams"]) for row in rows],
+            [
+                (datetime.date(2023, 1, 1), 2_000_000, 2_000_000),
+                (datetime.date(2023, 2, 1), 500_000, 0),
+            ],
+        )
+        february = rows[1]
+        self.assertEqual(february["removal_partner"].pk, 1)
+        self.assertEqual(february["cumulative_sold_grams"], 2_500_000)
+        self.assertEqual(february["cumulative_purchased_grams"], 2_500_000)
+        self.assertEqual(february["unconfirmed_grams"], 500_000)
+
+    def test_reconciliation_admin_csv(self):
+        user = get_user_model().objects.create_superuser(
+            email=fake.email(), password=fake.password()
+        )
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("admin:core_partnerpurchase_reconciliation"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.context["rows"]), 2)
+
+        response = self.client.get(
+            reverse("admin:core_partnerpurchase_reconciliation_csv")
+        )
+        rows = list(
+            csv.reader(io.StringIO(b"".join(response.streaming_content).decode()))
+        )
+        self.assertEqual(rows[0][-1], "unconfirmed_grams")
+        self.assertEqual(rows[2][-1], "500000")
+
+
+@override_settings(
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage"
+)
+class UsageRollupTestCase(APIKeyMixin, APITestCase):
+    fixtures = ("removal_methods_partners", "currency_conversion_rates")
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        CurrencyConversionRate.objects.create(
+            from_currency=CurrencyChoices.USD,
+            to_currency=CurrencyChoices.CHF,
+            rate=2.0,
+            date_time=timezone.now(),
+        )
+        return super().setUpTestData()
+
+    def create_removal_request(self, *, is_test=False, **item):
+        return removal_request_create(
+            is_test=is_test,
+            weight_unit=WeightUnitChoices.KILOGRAM,
+            currency=CurrencyChoices.CHF,
+            org_id=self.org.pk,
+            request_items=[item],
+        )
+
+    def rollups(self):
+        return list(
+            UsageRollup.objects.order_by("pk").values(
+                "removal_method__slug",
+                "is_test",
+                "removal_count",
+                "cdr_grams",
+                "cdr_cost",
+                "variable_fees",
+            )
+        )
+
+    def test_rollup_updated_with_removal_request(self):
+        """
+        Ensure each removal request adds to its organisation's daily usage.
+        """
+        self.create_removal_request(method_type="forestation", cdr_amount=500)
+        self.create_removal_request(method_type="forestation", cdr_amount=250)
+        self.create_removal_request(method_type="dacs", cdr_amount=1)
+        self.create_removal_request(method_type="dacs", cdr_amount=1, is_test=True)
+
+        rollups = self.rollups()
+        self.assertEqual(
+            [
+                (r["removal_method__slug"], r["is_test"], r["cdr_grams"])
+                for r in rollups
+            ],
+            [
+                ("forestation", False, 750_000),
+                ("dacs", False, 1000),
+                ("dacs", True, 1000),
+            ],
+        )
+        self.assertEqual(rollups[0]["removal_count"], 2)
+        items = RemovalRequestItem.objects.filter(
+            removal_request__is_test=False,
+            removal_partner__removal_method__slug="forestation",
+        )
+        self.assertEqual(rollups[0]["cdr_cost"], sum(item.cdr_cost for item in items))
+
+    def test_rollup_rebuild_matches_incremental(self):
+        self.create_removal_request(method_type="forestation", cdr_amount=500)
+        self.create_removal_request(method_type="forestation", cdr_amount=250)
+        self.create_removal_request(method_type="dacs", cdr_amount=1)
+        expected = self.rollups()
+
+        UsageRollup.objects.all().delete()
+        today = timezone.localdate()
+        self.assertEqual(usage_rollup_rebuild(start=today, end=today), 2)
+        self.assertCountEqual(self.rollups(), expected)
+
+    def test_usage_api(self):
+        self.create_removal_request(method_type="forestation", cdr_amount=500)
+        self.create_removal_request(method_type="dacs", cdr_amount=1, is_test=True)
+
+        # The API key, its organisation and the usage however many requests
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("v1:cdr_usage"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["end"], str(timezone.localdate()))
+        self.assertEqual(len(response.data["days"]), 1)
+        self.assertEqual(response.data["days"][0]["method_type"], "forestation")
+        self.assertEqual(response.data["days"][0]["cdr_amount_g"], 500_000)
+
+        response = self.client.get(
+            reverse("v1:cdr_usage"), {"start": "2023-02-01", "end": "2023-01-01"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_usage_dashboard(self):
+        user = user_signup_with_default_customer_organisation(
+            name=fake.name(),
+            email=fake.email(),
+            password=fake.password(),
+        )
+        self.org = user.organisations.get()
+        self.create_removal_request(method_type="forestation", cdr_amount=500)
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("org:usage"), {"days": 7})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.context["days"], 7)
+        self.assertEqual(
+            [row["cdr_grams__sum"] for row in response.context["totals"]], [500_000]
+        )
+
+
+class AnalyticsExportTestCase(TemporaryMediaMixin, APITestCase):
+    fixtures = ("removal_methods_partners",)
+
+    def create_removal_request(self, *, requested_datetime):
+        removal_request = RemovalRequest.objects.create(
+            weight_unit=WeightUnitChoices.KILOGRAM,
+            currency=CurrencyChoices.CHF,
+        )
+        RemovalRequest.objects.filter(pk=removal_request.pk).update(
+            requested_datetime=requested_datetime
+        )
+        RemovalRequestItem.objects.create(
+            removal_partner_id=1,
+            removal_request=removal_request,
+            cdr_cost=1000,
+            variable_fees=150,
+            cdr_amount=10,
+        )
+        return removal_request
+
+    def read_jsonl(self, *path):
+        with gzip.open(os.path.join(self.media_root, "analytics", *path)) as lines:
+            return [json.loads(line) for line in lines]
+
+    def export(self):
+        # JSON lines by default as Parquet needs the optional `pyarrow`
+        call_command(
+            "export_analytics",
+            chunk_size=1,
+            settle_seconds=0,
+            stdout=io.StringIO(),
+        )
+
+    def test_export_is_partitioned_and_incremental(self):
+        """
+        Ensure each run only appends rows added since the previous run.
+        """
+        first = self.create_removal_request(
+            requested_datetime=datetime.datetime(
+                2023, 1, 1, 12, tzinfo=datetime.timezone.utc
+            )
+        )
+        self.create_removal_request(
+            requested_datetime=datetime.datetime(
+                2023, 1, 2, 12, tzinfo=datetime.timezone.utc
+            )
+        )
+        self.export()
+
+        rows = self.read_jsonl(
+            "removal_request", "date=2023-01-01", f"part-{first.pk:012d}.jsonl.gz"
+        )
+        self.assertEqual(rows[0]["uuid"], str(first.uuid))
+        self.assertEqual(
+            len(
+                os.listdir(
+                    os.path.join(self.media_root, "analytics", "removal_request")
+                )
+            ),
+            2,
+        )
+        partners = self.read_jsonl("removal_partner", "removal_partner.jsonl.gz")
+        self.assertEqual(partners[0]["slug"], "eden-reforestation")
+
+        third = self.create_removal_request(
+            requested_datetime=datetime.datetime(
+                2023, 1, 2, 13, tzinfo=datetime.timezone.utc
+            )
+        )
+        self.export()
+        partition = os.path.join(
+            self.media_root, "analytics", "removal_request_item", "date=2023-01-02"
+        )
+        self.assertEqual(len(os.listdir(partition)), 2)
+        with open(
+            os.path.join(self.media_root, "analytics", "_watermarks.json")
+        ) as watermarks:
+            self.assertEqual(json.load(watermarks)["removal_request"], third.pk)
+
+    def test_export_parquet_without_pyarrow(self):
+        with mock.patch(
+            "cdrplatform.core.management.commands.export_analytics"
+            + ".export_parquet_is_available",
+            return_value=False,
+        ), self.assertRaisesMessage(CommandError, "--extras parquet"):
+            call_command("export_analytics", file_type="parquet", stdout=io.StringIO())
+
+
+class QueryInstrumentationTestCase(APIKeyMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        super().setUpTestData()
+        cls.certificate = Certificate.objects.create(
+            certificate_id="ABC-DEF-GHJ",
+            issued_date=datetime.date(2023, 1, 1),
+            display_name=fake.company(),
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.url = reverse(
+            "v1:certificate_retrieve",
+            kwargs={"id": self.certificate.certificate_id},
+        )
+        return super().setUp()
+
+    def test_server_timing_header(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(
+            response.headers["Server-Timing"],
+            r'^db;dur=[\d.]+;desc="\d+ queries", total;dur=[\d.]+$',
+        )
+
+    @mock.patch.object(CertificateRetrievalView, "query_budget", 0)
+    def test_query_budget_exceeded(self):
+        """
+        Ensure going over a view's query budget only warns, as the view has
+        already run.
+        """
+        with self.assertLogs("cdrplatform.core.middleware", "WARNING") as logs:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("v1:certificate_retrieve made 1 queries", logs.output[0])
+
+
+@override_settings(HEALTH_CHECK_MAX_AGE=60)
+class HealthViewTestCase(APITestCase):
+    fixtures = ("removal_methods_partners", "currency_conversion_rates")
+
+    def setUp(self) -> None:
+        # Don't reuse reports from other tests
+        patcher = mock.patch.dict(
+            "cdrplatform.core.health._readiness", {"report": None, "expires": 0.0}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return super().setUp()
+
+    def test_liveness(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("health_live"))
+        self.assertEqual(response.data, {"alive": True})
+
+    def test_readiness_is_memoised(self):
+        """
+        Ensure frequent probes reuse the last readiness check.
+        """
+        response = self.client.get(reverse("health_ready"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["ready"])
+        self.assertTrue(response.data["databases"]["default"]["ok"])
+        self.assertTrue(response.data["caches"]["default"]["ok"])
+        self.assertIsNone(response.data["caches"]["default"]["pool"])
+        self.assertIsNone(response.data["databases"]["default"]["pool"])
+
+        with self.assertNumQueries(0):
+            again = self.client.get(reverse("health_ready"))
+        self.assertEqual(again.data["checked_at"], response.data["checked_at"])
+
+        response = self.client.get(reverse("health_check"))
+        self.assertEqual(response.data, {"db_up": {"default": True}})
+
+    def test_readiness_database_pool(self):
+        pool = ConnectionPool(max_size=4, timeout=1)
+        pool.release(pool.acquire(connect=object), reuse=True)
+        with mock.patch.dict("cdrplatform.core.db.pool._pools", {"default": pool}):
+            response = self.client.get(reverse("health_ready"))
+        self.assertEqual(
+            response.data["databases"]["default"]["pool"],
+            {"size": 1, "in_use": 0, "idle": 1, "max": 4, "waiting": 0, "timeouts": 0},
+        )
+
+    def test_cache_pool(self):
+        """
+        Ensure the usage of Redis pools is reported with what redis-py has.
+        """
+        pool = SimpleNamespace(
+            _created_connections=3, _in_use_connections={1, 2}, max_connections=10
+        )
+        old_pool = SimpleNamespace(max_connections=10)
+        for pools, usage in (
+            ({0: pool, 1: pool}, {"created": 6, "in_use": 4, "max": 20}),
+            ({0: pool, 1: old_pool}, {"max": 20}),
+        ):
+            cache = SimpleNamespace(_cache=SimpleNamespace(_pools=pools))
+            with mock.patch("cdrplatform.core.health.caches", {"default": cache}):
+                self.assertEqual(health_cache_pool(alias="default"), usage)
+
+    def test_not_ready_without_pricing_catalog(self):
+        CurrencyConversionRate.objects.all().delete()
+        response = self.client.get(reverse("health_ready"))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(response.data["pricing_catalog_loaded"])
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    def connect(self):
+        return sqlite3.connect(":memory:", check_same_thread=False)
+
+    def test_reuses_connections(self):
+        pool = ConnectionPool(max_size=2, timeout=1)
+        first = pool.acquire(connect=self.connect)
+        second = pool.acquire(connect=self.connect)
+        self.assertEqual(pool.stats()["in_use"], 2)
+        pool.release(first)
+        self.assertIs(pool.acquire(connect=self.connect), first)
+
+        # Broken connections are closed and free their slot
+        pool.release(second, reuse=False)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            second.execute("SELECT 1")
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_check(self):
+        pool = ConnectionPool(max_size=1, timeout=1)
+        connection = pool.acquire(connect=self.connect)
+        pool.release(connection)
+        replacement = pool.acquire(connect=self.connect, check=lambda c: False)
+        self.assertIsNot(replacement, connection)
+        self.assertEqual(pool.stats()["size"], 1)
+
+    def test_waits_for_a_connection(self):
+        pool = ConnectionPool(max_size=1, timeout=5)
+        connection = pool.acquire(connect=self.connect)
+        timer = threading.Timer(0.05, pool.release, args=(connection,))
+        timer.start()
+        self.assertIs(pool.acquire(connect=self.connect), connection)
+        timer.join()
+
+    def test_timeout(self):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        pool.acquire(connect=self.connect)
+        with self.assertRaises(ConnectionPoolTimeout):
+            pool.acquire(connect=self.connect)
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.acquire(connect=partial(sqlite3.connect, "/nonexistent/db"))
+        self.assertEqual(pool.stats()["size"], 0)
+        pool.acquire(connect=self.connect)
+
+    @mock.patch.dict("cdrplatform.core.db.pool._pools", clear=True)
+    def test_pool_replaced_when_params_change(self):
+        """
+        Ensure connections are never reused for another database e.g. once the
+        test runner switches to the test database.
+        """
+        pool = connection_pool_get(
+            alias="default", params={"NAME": "app"}, max_size=2, timeout=1
+        )
+        self.assertIs(
+            connection_pool_get(
+                alias="default", params={"NAME": "app"}, max_size=2, timeout=1
+            ),
+            pool,
+        )
+        idle = pool.acquire(connect=self.connect)
+        in_use = pool.acquire(connect=self.connect)
+        pool.release(idle)
+
+        test_pool = connection_pool_get(
+            alias="default", params={"NAME": "test_app"}, max_size=2, timeout=1
+        )
+        self.assertIsNot(test_pool, pool)
+        self.assertEqual(connection_pool_stats(alias="default")["size"], 0)
+        # The old pool's connections are closed rather than reused
+        pool.release(in_use)
+        for closed in (idle, in_use):
+            with self.assertRaises(sqlite3.ProgrammingError):
+                closed.execute("SELECT 1")
+        self.assertEqual(pool.stats()["size"], 0)
+
+
+@skipUnless(connection.vendor == "postgresql", "Only PostgreSQL connections are pooled")
+class PooledDatabaseWrapperTestCase(TransactionTestCase):
+    def wrapper(self):
+        from cdrplatform.core.db.base import DatabaseWrapper
+
+        wrapper = DatabaseWrapper(
+            {
+                **connection.settings_dict,
+                "CONN_MAX_AGE": 0,
+                "POOL": {"max_size": 1, "timeout": 0.1},
+            },
+            alias="pooled",
+        )
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    @mock.patch.dict("cdrplatform.core.db.pool._pools", clear=True)
+    def test_acquire_release_rollback(self):
+        wrapper = self.wrapper()
+        wrapper.ensure_connection()
+        raw_connection = wrapper.connection
+        self.addCleanup(wrapper.pool.close)
+        wrapper.set_autocommit(False)
+        with wrapper.cursor() as cursor:
+            cursor.execute("CREATE TEMPORARY TABLE pooled (id int)")
+        # Released to the pool with the transaction rolled back
+        wrapper.close()
+        self.assertEqual(
+            connection_pool_stats(alias="pooled"),
+            {"size": 1, "in_use": 0, "idle": 1, "max": 1, "waiting": 0, "timeouts": 0},
+        )
+
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, raw_connection)
+        with wrapper.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('pooled')")
+            self.assertIsNone(cursor.fetchone()[0])
+
+        # The only connection is in use
+        other = self.wrapper()
+        with self.assertRaises(OperationalError):
+            other.ensure_connection()
+        wrapper.close()
+        other.ensure_connection()
+        self.assertIs(other.connection, raw_connection)
+
+    def test_conn_max_age_rejected(self):
+        from cdrplatform.core.db.base import DatabaseWrapper
+
+        with self.assertRaises(ImproperlyConfigured):
+            DatabaseWrapper({**connection.settings_dict, "CONN_MAX_AGE": 60})
+
+
+@mock.patch("cdrplatform.core.routers.db_replica_is_configured", return_value=True)
+class ReplicaRoutingTestCase(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.factory = RequestFactory(HTTP_AUTHORIZATION="Api-Key abcd1234.secret")
+        return super().setUp()
+
+    def test_router(self, configured):
+        self.assertEqual(router.db_for_read(RemovalPartner), "default")
+        with db_replica_reads() as routing:
+            self.assertEqual(router.db_for_read(RemovalPartner), "replica")
+            self.assertEqual(router.db_for_write(RemovalPartner), "default")
+            # Read your writes
+            self.assertTrue(routing.wrote)
+            self.assertEqual(router.db_for_read(RemovalPartner), "default")
+        self.assertFalse(router.allow_migrate("replica", "core"))
+
+    def test_middleware(self, configured):
+        databases = []
+
+        def get_response(request):
+            databases.append(router.db_for_read(RemovalPartner))
+            if request.method == "POST":
+                router.db_for_write(RemovalPartner)
+            return HttpResponse()
+
+        with mock.patch(
+            "cdrplatform.core.middleware.db_replica_is_configured", return_value=True
+        ):
+            middleware = ReplicaRoutingMiddleware(get_response)
+        middleware(self.factory.get("/"))
+        middleware(self.factory.post("/"))
+        # The same API key reads from the primary for a while, others don't
+        middleware(self.factory.get("/"))
+        middleware(self.factory.get("/", HTTP_AUTHORIZATION="Api-Key efgh5678.secret"))
+        self.assertEqual(databases, ["replica", "default", "default", "replica"])
+
+        cache.clear()
+        middleware(self.factory.get("/"))
+        self.assertEqual(databases[-1], "replica")
+
+    def test_sticky_keys(self, configured):
+        request = self.factory.get("/", HTTP_AUTHORIZATION="Api-Key invalid")
+        self.assertEqual(db_sticky_keys(request=request), [])
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = "abc"
+        self.assertEqual(db_sticky_keys(request=request), ["session:abc"])
+        request = self.factory.get("/")
+        self.assertEqual(db_sticky_keys(request=request), ["api_key:abcd1234"])
+
+    def test_sticky_organisation(self, configured):
+        """
+        Ensure a write by one client of an organisation sends the reads of its
+        other clients to the primary.
+        """
+        org = CustomerOrganisation.objects.create(organisation_name=fake.company())
+        _, key = OrganisationAPIKey.objects.create_key(organisation=org, name="a")
+        _, other_key = OrganisationAPIKey.objects.create_key(organisation=org, name="b")
+        databases = []
+
+        def get_response(request):
+            databases.append(router.db_for_read(RemovalPartner))
+            if request.method == "POST":
+                router.db_for_write(RemovalPartner)
+            return HttpResponse()
+
+        with mock.patch(
+            "cdrplatform.core.middleware.db_replica_is_configured", return_value=True
+        ):
+            middleware = ReplicaRoutingMiddleware(get_response)
+        middleware(self.factory.get("/", HTTP_AUTHORIZATION=f"Api-Key {other_key}"))
+        middleware(self.factory.post("/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+        # The organisation of a key is only looked up once
+        with self.assertNumQueries(0):
+            middleware(self.factory.get("/", HTTP_AUTHORIZATION=f"Api-Key {other_key}"))
+        self.assertEqual(databases, ["replica", "default", "default"])
+
+        # The organisation of a session is remembered when it writes
+        request = self.factory.post("/")
+        request.session = SessionStore()
+        request.session[SESSION_KEY_ORG_ID] = org.short_id
+        request.session.save()
+        cache.clear()
+        middleware(request)
+        request = self.factory.get("/", HTTP_AUTHORIZATION=f"Api-Key {other_key}")
+        middleware(request)
+        self.assertEqual(databases[-1], "default")
+
+    async def test_sticky_organisation_async(self, configured):
+        org = await CustomerOrganisation.objects.acreate(
+            organisation_name=fake.company()
+        )
+        _, key = await sync_to_async(OrganisationAPIKey.objects.create_key)(
+            organisation=org, name="a"
+        )
+        _, other_key = await sync_to_async(OrganisationAPIKey.objects.create_key)(
+            organisation=org, name="b"
+        )
+        databases = []
+
+        async def get_response(request):
+            databases.append(router.db_for_read(RemovalPartner))
+            if request.method == "POST":
+                router.db_for_write(RemovalPartner)
+            return HttpResponse()
+
+        with mock.patch(
+            "cdrplatform.core.middleware.db_replica_is_configured", return_value=True
+        ):
+            middleware = ReplicaRoutingMiddleware(get_response)
+        await middleware(self.factory.post("/", HTTP_AUTHORIZATION=f"Api-Key {key}"))
+        await middleware(
+            self.factory.get("/", HTTP_AUTHORIZATION=f"Api-Key {other_key}")
+        )
+        self.assertEqual(databases, ["default", "default"])
+
+
+class SchemaViewTestCase(APITestCase):
+    def setUp(self) -> None:
+        schema_cache_clear()
+        self.addCleanup(schema_cache_clear)
+        return super().setUp()
+
+    def test_schema_generated_once(self):
+        with mock.patch(
+            "cdrplatform.core.schema.schema_content_generate",
+            wraps=schema_content_generate,
+        ) as generate:
+            response = self.client.get(reverse("schema"))
+            again = self.client.get(reverse("schema"))
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.content.startswith(b"openapi: "))
+        self.assertEqual(again.content, response.content)
+        self.assertEqual(again["ETag"], response["ETag"])
+
+        response = self.client.get(
+            reverse("schema"), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_schema_compressed(self):
+        response = self.client.get(
+            reverse("schema"), {"format": "json"}, HTTP_ACCEPT_ENCODING="gzip, br;q=0"
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        schema = json.loads(gzip.decompress(response.content))
+        self.assertIn("/v1/cdr/price/", schema["paths"])
+
+        # Already has the schema, if uncompressed
+        uncompressed = self.client.get(reverse("schema"), {"format": "json"})
+        self.assertNotEqual(uncompressed["ETag"], response["ETag"])
+        response = self.client.get(
+            reverse("schema"),
+            {"format": "json"},
+            HTTP_IF_NONE_MATCH=uncompressed["ETag"],
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_schema_from_file(self):
+        with tempfile.TemporaryDirectory() as schema_dir:
+            with open(os.path.join(schema_dir, "v1.yaml"), "w") as schema_file:
+                schema_file.write("openapi: 3.0.3\n")
+            with override_settings(SCHEMA_DIR=schema_dir):
+                response = self.client.get(reverse("schema"))
+        self.assertEqual(response.content, b"openapi: 3.0.3\n")
+
+
+# Don't reuse the readiness report from before the warm-up
+@override_settings(WARM_UP=True, HEALTH_CHECK_MAX_AGE=0)
+class WarmUpTestCase(APITestCase):
+    fixtures = ("removal_methods_partners", "currency_conversion_rates")
+
+    def setUp(self) -> None:
+        schema_cache_clear()
+        self.addCleanup(schema_cache_clear)
+        for target, values in (
+            ("cdrplatform.core.warmup._warm_up", {"complete": False}),
+            ("cdrplatform.core.health._readiness", {"report": None, "expires": 0.0}),
+        ):
+            patcher = mock.patch.dict(target, values)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return super().setUp()
+
+    def test_ready_after_warm_up(self):
+        response = self.client.get(reverse("health_ready"))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(response.data["warmed_up"])
+
+        # The test's connection must stay open
+        with mock.patch("cdrplatform.core.warmup.connections"):
+            timings = app_warm_up()
+        self.assertEqual(list(timings), ["urls", "serializers", "pricing", "schema"])
+
+        response = self.client.get(reverse("health_ready"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["warmed_up"])
+
+        # The schema is ready to be served
+        with mock.patch("cdrplatform.core.schema.schema_content_generate") as generate:
+            response = self.client.get(reverse("schema"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        generate.assert_not_called()
+
+
+@override_settings(METRICS_PUBLIC=True)
+class MetricsViewTestCase(APITestCase):
+    def get_metrics(self, **kwargs):
+        response = self.client.get(reverse("metrics"), **kwargs)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            response.headers["Content-Type"].startswith("application/openmetrics-text")
+        )
+        return response.content.decode()
+
+    def test_request_metrics(self):
+        self.client.get(reverse("health_live"))
+
+        content = self.get_metrics()
+        self.assertIn(
+            "# TYPE cdrplatform_http_request_duration_seconds histogram\n", content
+        )
+        self.assertRegex(
+            content,
+            r'cdrplatform_http_requests_total\{status="200",view="health_live"\} \d+',
+        )
+        buckets = re.findall(
+            r"cdrplatform_http_request_duration_seconds_bucket"
+            r'\{le="([^"]+)",view="health_live"\}',
+            content,
+        )
+        self.assertEqual(buckets[0], "0.005")
+        self.assertEqual(buckets[-1], "+Inf")
+        self.assertTrue(content.endswith("# EOF\n"))
+
+    def test_metrics_added_up_across_processes(self):
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        other_process_file = f"{os.getpid()}.1.json"
+        with open(
+            os.path.join(metrics_dir.name, other_process_file), "w"
+        ) as other_process:
+            json.dump(
+                [["cdrplatform_api_key_lookups_total", {"result": "expired"}, 5]],
+                other_process,
+            )
+        metrics.inc("cdrplatform_api_key_lookups", result="expired")
+        expected = metrics.samples[
+            ("cdrplatform_api_key_lookups_total", (("result", "expired"),))
+        ]
+
+        with override_settings(METRICS_DIR=metrics_dir.name):
+            content = self.get_metrics()
+        self.assertIn(
+            'cdrplatform_api_key_lookups_total{result="expired"} '
+            + f"{int(expected) + 5}\n",
+            content,
+        )
+
+    def test_concurrent_flushes(self):
+        """
+        Ensure threads flushing at the same time each write their own temporary
+        file.
+        """
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        with override_settings(METRICS_DIR=metrics_dir.name):
+            threads = [
+                threading.Thread(target=metrics.flush, kwargs={"force": True})
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(os.listdir(metrics_dir.name), [metrics.file_name])
+
+    def test_exited_processes_merged(self):
+        """
+        Ensure the samples of processes that exited are kept in a single file,
+        even when a new process reuses their ID.
+        """
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        for file_name in ("2.1.json", "2.2.json"):
+            with open(os.path.join(metrics_dir.name, file_name), "w") as exited:
+                json.dump(
+                    [["cdrplatform_api_key_lookups_total", {"result": "missing"}, 2]],
+                    exited,
+                )
+        open(os.path.join(metrics_dir.name, "2.abc.tmp"), "w").close()
+        pattern = r'cdrplatform_api_key_lookups_total\{result="missing"\} (\d+)\n'
+
+        with override_settings(METRICS_DIR=metrics_dir.name), mock.patch(
+            "cdrplatform.core.metrics._process_is_running",
+            lambda pid: pid == os.getpid(),
+        ):
+            before = int(re.search(pattern, self.get_metrics()).group(1))
+            self.assertCountEqual(
+                os.listdir(metrics_dir.name),
+                [metrics.file_name, "exited.json", ".lock"],
+            )
+            metrics.inc("cdrplatform_api_key_lookups", result="missing")
+            after = int(re.search(pattern, self.get_metrics()).group(1))
+        self.assertEqual(after, before + 1)
+        self.assertGreaterEqual(before, 4)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_token(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.get_metrics(HTTP_AUTHORIZATION="Bearer secret")
+
+    @override_settings(METRICS_TOKEN="", METRICS_PUBLIC=False)
+    def test_metrics_forbidden_without_token(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ProfilingMiddlewareTestCase(APITestCase):
+    def setUp(self) -> None:
+        profiling_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profiling_dir.cleanup)
+        self.profiling_dir = profiling_dir.name
+        settings_override = override_settings(
+            PROFILING_ENABLED=True, PROFILING_DIR=self.profiling_dir
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        return super().setUp()
+
+    def test_profile_request_with_token(self):
+        """
+        Ensure requests with a profiling token are profiled.
+        """
+        # Make sure the readiness checks run rather than reuse an earlier report
+        with mock.patch.dict(
+            "cdrplatform.core.health._readiness", {"report": None, "expires": 0.0}
+        ):
+            response = self.client.get(
+                reverse("health_ready"), HTTP_X_PROFILE=profiling_token_create()
+            )
+        profile_dir = os.path.join(self.profiling_dir, response["X-Profile-Id"])
+        self.assertCountEqual(
+            os.listdir(profile_dir), ("stacks.folded", "sql.json", "meta.json")
+        )
+        with open(os.path.join(profile_dir, "meta.json")) as meta:
+            self.assertEqual(json.load(meta)["view"], "health_ready")
+        with open(os.path.join(profile_dir, "sql.json")) as sql:
+            self.assertIn("SELECT 1", [query["sql"] for query in json.load(sql)])
+
+    def test_invalid_token_is_not_profiled(self):
+        response = self.client.get(reverse("health_live"), HTTP_X_PROFILE="nope")
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(os.listdir(self.profiling_dir), [])
+
+    def test_sampled_requests_are_profiled(self):
+        with override_settings(PROFILING_SAMPLE_RATE=1.0):
+            response = self.client.get(reverse("health_live"))
+        self.assertIn("X-Profile-Id", response)
+
+    def test_disabled(self):
+        with override_settings(PROFILING_ENABLED=False, PROFILING_SAMPLE_RATE=1.0):
+            self.client = self.client_class()
+            response = self.client.get(reverse("health_live"))
+        self.assertNotIn("X-Profile-Id", response)
+
+
+class LoadTestTestCase(LiveServerTestCase):
+    def test_parse_http_file(self):
+        requests = loadtest_parse_http_file(
+            path=settings.BASE_DIR / "rest-examples" / "pricing-request.http",
+            variables={"host": "http://testserver", "api-key": "my-key"},
+        )
+        self.assertEqual(len(requests), 3)
+        self.assertEqual(requests[0].method, "POST")
+        self.assertEqual(requests[0].url, "http://testserver/v1/cdr/price/")
+        self.assertEqual(requests[0].headers["Authorization"], "Api-Key my-key")
+        self.assertEqual(json.loads(requests[0].body)["currency"], "usd")
+        self.assertEqual(
+            requests[2].name,
+            "pricing-request: Using a fake api key to mock unauthenticated reqests",
+        )
+
+    def test_unsafe_requests_skipped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = os.path.join(directory, "recorded.jsonl")
+            with open(log, "w") as file:
+                file.write(json.dumps({"method": "GET", "path": "/health/live/"}))
+                file.write("\n")
+                file.write(json.dumps({"method": "POST", "path": "/v1/cdr/price/"}))
+                file.write("\n")
+                file.write(json.dumps({"method": "POST", "path": "/v1/cdr/"}))
+            output = os.path.join(directory, "report.json")
+            options = {
+                "host": self.live_server_url,
+                "scenarios": [log],
+                "concurrency_levels": [1],
+                "requests": 6,
+                "output": output,
+                "stderr": io.StringIO(),
+            }
+            call_command("loadtest", **options)
+            with open(output) as file:
+                scenarios = json.load(file)["runs"][0]["scenarios"]
+            self.assertEqual(
+                sorted(scenarios),
+                ["recorded: GET /health/live/", "recorded: POST /v1/cdr/price/"],
+            )
+
+            call_command("loadtest", include_unsafe=True, **options)
+            with open(output) as file:
+                scenarios = json.load(file)["runs"][0]["scenarios"]
+            self.assertIn("recorded: POST /v1/cdr/", scenarios)
+
+    def test_parse_http_file_missing_variable(self):
+        with self.assertRaises(ValueError):
+            loadtest_parse_http_file(
+                path=settings.BASE_DIR / "rest-examples" / "pricing-request.http",
+                variables={"host": "http://testserver"},
+            )
+
+    def test_replay_recorded_requests(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = os.path.join(directory, "recorded.jsonl")
+            with open(log, "w") as file:
+                file.write(json.dumps({"method": "GET", "path": "/health/live/"}))
+                file.write("\n")
+                file.write(json.dumps({"method": "GET", "path": "/not-found/"}))
+            output = os.path.join(directory, "report.json")
+            call_command(
+                "loadtest",
+                host=self.live_server_url,
+                scenarios=[log],
+                concurrency_levels=[1, 2],
+                requests=10,
+                output=output,
+                stderr=io.StringIO(),
+            )
+            with open(output) as file:
+                report = json.load(file)
+
+        self.assertEqual([run["concurrency"] for run in report["runs"]], [1, 2])
+        run = report["runs"][1]
+        self.assertEqual(run["requests"], 10)
+        self.assertEqual(run["errors"], 0)
+        self.assertEqual(run["status_codes"], {"200": 5, "404": 5})
+        self.assertEqual(run["scenarios"]["recorded: GET /health/live/"]["requests"], 5)
+        self.assertIsNotNone(run["latency_ms"]["p95"])
+
+        lines = list(loadtest_compare(report=report, baseline=report))
+        self.assertEqual(len(lines), 2)
+        self.assertIn("(+0.0%)", lines[0])
+
+
+class BenchmarkTestCase(TestCase):
+    def test_benchmark(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "benchmark.json")
+            options = {
+                "iterations": 2,
+                "rounds": 1,
+                "partners": 3,
+                "rate_days": 3,
+                "organisations": 1,
+                "removal_requests": 5,
+                "stdout": io.StringIO(),
+                "stderr": io.StringIO(),
+            }
+            seeded = []
+
+            def seed(**kwargs):
+                seeded.append(benchmark_seed(**kwargs))
+                return seeded[-1]
+
+            with mock.patch(
+                "cdrplatform.core.management.commands.benchmark.benchmark_seed", seed
+            ):
+                call_command("benchmark", output=output, **options)
+            with open(output) as file:
+                report = json.load(file)
+
+            self.assertEqual(
+                list(report["results"]),
+                [
+                    "removal_method_calculate_removal_cost",
+                    "variable_fees_calculate",
+                    "removal_request_create",
+                    "api_key_must_be_present_and_valid",
+                    "cdr_pricing_view",
+                    "certificate_retrieval_view",
+                    "certificate_retrieval_view_cold",
+                ],
+            )
+            results = report["results"]
+            self.assertEqual(
+                results["certificate_retrieval_view"]["queries_per_call"], 0
+            )
+            self.assertGreater(
+                results["certificate_retrieval_view_cold"]["queries_per_call"], 0
+            )
+            self.assertEqual(results["variable_fees_calculate"]["queries_per_call"], 0)
+            # The latest conversion rate (the partner is passed in)
+            self.assertEqual(
+                results["removal_method_calculate_removal_cost"]["queries_per_call"], 1
+            )
+            self.assertGreater(results["cdr_pricing_view"]["ops_per_sec"], 0)
+            self.assertGreater(results["removal_request_create"]["peak_memory_kb"], 0)
+            # The seeded data is rolled back and wasn't cached
+            self.assertFalse(RemovalPartner.objects.exists())
+            self.assertIsNone(
+                certificate_cache_get(certificate_id=seeded[0]["certificate_id"])
+            )
+
+            # Compare a benchmark with itself
+            call_command(
+                "benchmark",
+                benchmark=["variable_fees_calculate"],
+                baseline=output,
+                threshold=1000,
+                **options,
+            )
+
+    def test_benchmark_compare(self):
+        baseline = {
+            "cdr_pricing_view": {
+                "ops_per_sec": 100.0,
+                "queries_per_call": 4.0,
+                "peak_memory_kb": 100.0,
+            }
+        }
+        results = {
+            "cdr_pricing_view": {
+                "ops_per_sec": 80.0,
+                "queries_per_call": 5.0,
+                "peak_memory_kb": 105.0,
+            }
+        }
+        regressions = list(
+            benchmark_compare(results=results, baseline=baseline, threshold=10)
+        )
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("20.0% slower", regressions[0])
+        self.assertIn("5.0 queries per call, up from 4.0", regressions[1])
+
+
+class SyntheticDataTestCase(TestCase):
+    def test_seed_synthetic_data(self):
+        call_command(
+            "seed_synthetic_data",
+            organisations=3,
+            partners=2,
+            days=30,
+            removal_requests=50,
+            chunk_size=20,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(CustomerOrganisation.objects.count(), 3)
+        self.assertEqual(RemovalPartner.objects.count(), 2)
+        self.assertEqual(CurrencyConversionRate.objects.count(), 30 * 4 * 4)
+        self.assertEqual(RemovalRequest.objects.count(), 50)
+        self.assertGreaterEqual(RemovalRequestItem.objects.count(), 50)
+        self.assertTrue(UsageRollup.objects.exists())
+        # The requested time is spread over the days rather than set to now
+        self.assertLess(
+            RemovalRequest.objects.earliest("requested_datetime").requested_datetime,
+            timezone.now() - timedelta(days=1),
+        )
+        # Items are priced like real ones
+        item = RemovalRequestItem.objects.first()
+        self.assertEqual(
+            item.variable_fees, variable_fees_calculate(removal_cost=item.cdr_cost)
+        )
+
+        # More can be created afterwards
+        RemovalRequest.objects.create(
+            weight_unit=WeightUnitChoices.TONNE, currency=CurrencyChoices.CHF
+        )
+
+
+class AsyncAPIViewTestCase(APITestCase):
+    fixtures = ("removal_methods_partners", "currency_conversion_rates")
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        CurrencyConversionRate.objects.create(
+            from_currency=CurrencyChoices.USD,
+            to_currency=CurrencyChoices.CHF,
+            rate=2.0,
+            date_time=timezone.now(),
+        )
+        removal_request = RemovalRequest.objects.create(
+            weight_unit=WeightUnitChoices.KILOGRAM,
+            currency=CurrencyChoices.CHF,
+        )
+        RemovalRequestItem.objects.create(
+            removal_request=removal_request,
+            cdr_cost=1000,
+            variable_fees=150,
+            cdr_amount=500,
+        )
+        cls.certificate = Certificate.objects.create(
+            certificate_id="XXX-YYY-ZZZ",
+            issued_date=datetime.date(2020, 1, 1),
+            display_name="Test Certificate",
+            removal_request=removal_request,
+        )
+        return super().setUpTestData()
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+        return super().setUp()
+
+    async def price(self, data):
+        request = self.factory.post(
+            "/v1/cdr/price/", data=data, content_type="application/json"
+        )
+        return await AsyncCDRPricingView.as_view()(request)
+
+    async def test_pricing(self):
+        """
+        Ensure the async pricing view responds like the DRF view.
+        """
+        data = {
+            "weight_unit": "t",
+            "currency": "chf",
+            "items": [{"method_type": "forestation", "cdr_amount": 10}],
+        }
+        response = await self.price(data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        expected = await sync_to_async(self.client.post)(reverse("v1:cdr_price"), data)
+        self.assertEqual(json.loads(response.content), expected.json())
+
+        data["items"][0]["method_type"] = "dacs"
+        response = await self.price(data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        expected = await sync_to_async(self.client.post)(reverse("v1:cdr_price"), data)
+        self.assertEqual(json.loads(response.content), expected.json())
+
+    async def test_pricing_invalid_json(self):
+        request = self.factory.post(
+            "/v1/cdr/price/", data="{", content_type="application/json"
+        )
+        response = await AsyncCDRPricingView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(json.loads(response.content)["type"], "client_error")
+
+    async def test_certificate_retrieval(self):
+        view = AsyncCertificateRetrievalView.as_view()
+        response = await view(self.factory.get("/"), id="xxx-yyy-zzz")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(response.content),
+            {
+                "certificate_id": "XXX-YYY-ZZZ",
+                "display_name": "Test Certificate",
+                "issued_date": "2020-01-01",
+                "removal_amount_kg": 500,
+            },
+        )
+
+        # Now cached, the ETag matches the DRF view's
+        expected = await sync_to_async(self.client.get)(
+            reverse("v1:certificate_retrieve", kwargs={"id": "XXX-YYY-ZZZ"})
+        )
+        self.assertEqual(response["ETag"], expected["ETag"])
+        response = await view(
+            self.factory.get("/", headers={"If-None-Match": response["ETag"]}),
+            id="XXX-YYY-ZZZ",
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = await view(self.factory.get("/"), id="AAA-BBB-CCC")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_health(self):
+        with mock.patch.dict(
+            "cdrplatform.core.health._readiness", {"report": None, "expires": 0.0}
+        ):
+            response = await AsyncReadinessView.as_view()(self.factory.get("/"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(json.loads(response.content)["ready"])
+
+        response = await AsyncLivenessView.as_view()(self.factory.get("/"))
+        self.assertEqual(json.loads(response.content), {"alive": True})
+
+    def test_api_view_for_deployment(self):
+        view = api_view_for_deployment(CDRPricingView, AsyncCDRPricingView)
+        self.assertEqual(view.view_class, CDRPricingView)
+
+        with override_settings(ASYNC_API_VIEWS=True):
+            view = api_view_for_deployment(CDRPricingView, AsyncCDRPricingView)
+        self.assertTrue(iscoroutinefunction(view))
+        self.assertEqual(view.view_class, AsyncCDRPricingView)
+        # The schema is still generated from the DRF view
+        self.assertEqual(view.cls, CDRPricingView)
+
+    async def test_async_middleware(self):
+        """
+        Ensure the middleware runs without a thread under ASGI and still counts
+        queries made from async views.
+        """
+        response = await self.async_client.get(reverse("health_live"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Server-Timing", response)
+
+        async def get_response(request):
+            await Certificate.objects.acount()
+            return HttpResponse()
+
+        middleware = QueryInstrumentationMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(self.factory.get("/"))
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
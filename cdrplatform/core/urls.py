@@ -1,7 +1,18 @@
 from django.urls import include, path
 
-from .api.healthcheck import HealthView
+from .api.base import api_view_for_deployment
+from .api.healthcheck import (
+    AsyncHealthView,
+    AsyncLivenessView,
+    AsyncReadinessView,
+    HealthView,
+    LivenessView,
+    ReadinessView,
+)
+from .views.metrics import MetricsView
+from .views.org.export import RemovalHistoryExportView
 from .views.org.settings import APIKeysView
+from .views.org.usage import UsageView
 
 # Namespaced with `settings` so when using URL names use something like
 # `core:org:settings:api_keys`
@@ -17,11 +28,28 @@ org_settings_routes = (
 org_routes = (
     [
         path("settings/", include(org_settings_routes)),
+        path("export/", RemovalHistoryExportView.as_view(), name="export"),
+        path("usage/", UsageView.as_view(), name="usage"),
     ],
     "org",
 )
 
 urlpatterns = [
     path("org/", include(org_routes)),
-    path("health/", HealthView.as_view(), name="health_check"),
+    path(
+        "health/",
+        api_view_for_deployment(HealthView, AsyncHealthView),
+        name="health_check",
+    ),
+    path(
+        "health/live/",
+        api_view_for_deployment(LivenessView, AsyncLivenessView),
+        name="health_live",
+    ),
+    path(
+        "health/ready/",
+        api_view_for_deployment(ReadinessView, AsyncReadinessView),
+        name="health_ready",
+    ),
+    path("metrics", MetricsView.as_view(), name="metrics"),
 ]
@@ -1,9 +1,16 @@
 from django.urls import include, path, register_converter
 
-from cdrplatform.core.api.certificate.retrieve import CertificateRetrievalView
+from cdrplatform.core.api.base import api_view_for_deployment
+from cdrplatform.core.api.certificate.download import CertificateDownloadView
+from cdrplatform.core.api.certificate.retrieve import (
+    AsyncCertificateRetrievalView,
+    CertificateRetrievalView,
+)
 
-from .api.cdr.pricing import CDRPricingView
+from .api.cdr.export import CDRExportView
+from .api.cdr.pricing import AsyncCDRPricingView, CDRPricingView
 from .api.cdr.purchase import CDRRemovalView
+from .api.cdr.usage import CDRUsageView
 from .converters import CertificateIDConverter
 
 app_name = "core"
@@ -11,16 +18,29 @@ app_name = "core"
 register_converter(CertificateIDConverter, "certificate_id")
 
 cdr_routes = [
-    path("price/", CDRPricingView.as_view(), name="cdr_price"),
+    path(
+        "price/",
+        api_view_for_deployment(CDRPricingView, AsyncCDRPricingView),
+        name="cdr_price",
+    ),
+    path("export/", CDRExportView.as_view(), name="cdr_export"),
+    path("usage/", CDRUsageView.as_view(), name="cdr_usage"),
     path("", CDRRemovalView.as_view(), name="cdr_request"),
 ]
 
 certificate_routes = [
     path(
         "<certificate_id:id>/",
-        CertificateRetrievalView.as_view(),
+        api_view_for_deployment(
+            CertificateRetrievalView, AsyncCertificateRetrievalView
+        ),
         name="certificate_retrieve",
     ),
+    path(
+        "<certificate_id:id>/<str:file_type>/",
+        CertificateDownloadView.as_view(),
+        name="certificate_download",
+    ),
 ]
 
 urlpatterns = [
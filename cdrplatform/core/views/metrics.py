@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views import View
+
+from cdrplatform.core.metrics import metrics_render
+
+
+class MetricsView(View):
+    """Exposes the metrics of every worker process in the OpenMetrics format so
+    they can be scraped by Prometheus. Requires `METRICS_TOKEN` unless
+    `METRICS_PUBLIC` is set."""
+
+    content_type = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+    def get(self, request):
+        if not settings.METRICS_TOKEN and not settings.METRICS_PUBLIC:
+            return HttpResponse(status=403)
+        if settings.METRICS_TOKEN and not constant_time_compare(
+            request.headers.get("Authorization", ""),
+            f"Bearer {settings.METRICS_TOKEN}",
+        ):
+            return HttpResponse(status=401)
+
+        return HttpResponse("".join(metrics_render()), content_type=self.content_type)
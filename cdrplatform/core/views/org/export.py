@@ -0,0 +1,34 @@
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import Http404
+from django.views import View
+
+from cdrplatform.core.exports import (
+    EXPORT_COMPRESSIONS,
+    EXPORT_FILE_TYPES,
+    export_streaming_response,
+)
+from cdrplatform.core.selectors import (
+    REMOVAL_HISTORY_EXPORT_COLUMNS,
+    removal_history_list_for_export,
+)
+
+
+class RemovalHistoryExportView(LoginRequiredMixin, View):
+    """Streams the removal history of the current organisation as a file."""
+
+    def get(self, request):
+        file_type = request.GET.get("file_type", "csv")
+        compression = request.GET.get("compression", "")
+        if file_type not in EXPORT_FILE_TYPES or compression not in (
+            "",
+            *EXPORT_COMPRESSIONS,
+        ):
+            raise Http404
+
+        return export_streaming_response(
+            columns=tuple(REMOVAL_HISTORY_EXPORT_COLUMNS),
+            rows=removal_history_list_for_export(org=request.organisation),
+            file_type=file_type,
+            filename="cdr-removal-history",
+            compression=compression,
+        )
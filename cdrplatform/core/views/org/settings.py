@@ -1,28 +1,33 @@
 from typing import Any, Dict
 
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.paginator import Paginator
 from django.views.generic import FormView
 
 from cdrplatform.core.forms.org.settings.apikey import NewAPIKeyForm
-from cdrplatform.core.selectors import (
-    api_key_list_prod_only,
-    api_key_list_test_only,
-    customer_organisation_get_from_session,
-)
+from cdrplatform.core.selectors import api_key_list_search
 from cdrplatform.core.services import api_key_create_from_session
 
 
 class APIKeysView(LoginRequiredMixin, FormView):
     template_name = "core/org/settings/api-keys.html"
     form_class = NewAPIKeyForm
+    paginate_by = 50
 
     def get_context_api_keys(self) -> Dict[str, Any]:
         context = {}
 
-        org = customer_organisation_get_from_session(request=self.request)
+        search = self.request.GET.get("q", "").strip()
+        api_keys = api_key_list_search(org=self.request.organisation, name=search)
+        page = Paginator(api_keys, self.paginate_by).get_page(
+            self.request.GET.get("page")
+        )
 
-        context["api_keys_test"] = api_key_list_test_only(org=org)
-        context["api_keys_prod"] = api_key_list_prod_only(org=org)
+        # Fetch the page with one query and split it by kind here
+        context["api_keys_test"] = [key for key in page if key.is_test]
+        context["api_keys_prod"] = [key for key in page if not key.is_test]
+        context["page_obj"] = page
+        context["search"] = search
 
         return context
 
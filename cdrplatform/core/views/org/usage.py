@@ -0,0 +1,48 @@
+import datetime
+from typing import Any, Dict
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.utils import timezone
+from django.views.generic import TemplateView
+
+from cdrplatform.core.selectors import (
+    usage_rollup_list_daily,
+    usage_rollup_sum_by_currency,
+)
+
+
+class UsageView(LoginRequiredMixin, TemplateView):
+    template_name = "core/org/usage.html"
+    periods = (7, 30, 90, 365)
+    default_period = 30
+
+    def get_period(self) -> int:
+        try:
+            days = int(self.request.GET.get("days", self.default_period))
+        except ValueError:
+            return self.default_period
+        return days if days in self.periods else self.default_period
+
+    def get_context_data(self, **kwargs: Any) -> Dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+
+        days = self.get_period()
+        is_test = self.request.GET.get("test") == "1"
+        end = timezone.localdate()
+        start = end - datetime.timedelta(days=days - 1)
+        usage = {
+            "org": self.request.organisation,
+            "start": start,
+            "end": end,
+            "is_test": is_test,
+        }
+
+        context["periods"] = self.periods
+        context["days"] = days
+        context["is_test"] = is_test
+        context["start"] = start
+        context["end"] = end
+        context["totals"] = usage_rollup_sum_by_currency(**usage)
+        context["usage"] = usage_rollup_list_daily(**usage)
+
+        return context
@@ -0,0 +1,121 @@
+import contextlib
+import itertools
+import logging
+import time
+from typing import Any, Dict, Iterable, Iterator, List
+
+from django.db import DatabaseError, connections
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework import serializers
+
+from cdrplatform.core.api.schema import SchemaView
+from cdrplatform.core.db.pool import connection_pool_close_idle
+from cdrplatform.core.models import CurrencyChoices
+from cdrplatform.core.schema import schema_get
+from cdrplatform.core.selectors import (
+    currency_conversion_rate_get_latest,
+    pricing_catalog_is_loaded,
+    removal_method_choices,
+)
+
+logger = logging.getLogger(__name__)
+
+# Whether this process has been warmed up, inherited by forked workers
+_warm_up: Dict[str, Any] = {"complete": False}
+
+
+def warm_up_is_complete() -> bool:
+    return _warm_up["complete"]
+
+
+def _url_views(patterns: Iterable[Any]) -> Iterator[Any]:
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _url_views(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern.callback
+
+
+def _serializer_fields_build(serializer: serializers.BaseSerializer):
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    if isinstance(serializer, serializers.Serializer):
+        for field in serializer.fields.values():
+            _serializer_fields_build(field)
+
+
+def warm_up_views(views: List[Any]):
+    """Builds the fields of the nested `InputSerializer` and `OutputSerializer` of
+    every API view."""
+    for view in views:
+        view_class = getattr(view, "cls", getattr(view, "view_class", None))
+        for name in ("InputSerializer", "OutputSerializer"):
+            serializer_class = getattr(view_class, name, None)
+            if isinstance(serializer_class, type) and issubclass(
+                serializer_class, serializers.BaseSerializer
+            ):
+                _serializer_fields_build(serializer_class())
+
+
+def warm_up_pricing():
+    """Runs the queries of pricing: the removal method choices, the catalog and
+    the latest conversion rates, so the connection is open and the database has
+    them in memory."""
+    pricing_catalog_is_loaded()
+    removal_method_choices()
+    for from_currency, to_currency in itertools.product(
+        CurrencyChoices.values, repeat=2
+    ):
+        currency_conversion_rate_get_latest(
+            from_currency=from_currency, to_currency=to_currency
+        )
+
+
+def warm_up_schema(views: List[Any]):
+    """Generates the schema of every API version in every format served."""
+    for view in views:
+        if not issubclass(getattr(view, "cls", type), SchemaView):
+            continue
+        for renderer_class in view.cls.renderer_classes:
+            schema_get(
+                api_version=view.initkwargs.get("api_version"),
+                renderer=renderer_class(),
+            )
+
+
+@contextlib.contextmanager
+def _step(name: str, timings: Dict[str, float]):
+    start = time.perf_counter()
+    try:
+        yield
+    except DatabaseError:
+        # The database may not be reachable yet, the readiness checks report it
+        logger.exception("Warm-up step %s failed", name)
+    timings[name] = round(time.perf_counter() - start, 3)
+
+
+def app_warm_up() -> Dict[str, float]:
+    """Does what the first requests to a process would otherwise pay for: loading
+    the URLs and views, building serializers, running the pricing queries and
+    generating the schema. Returns how long each step took in seconds.
+
+    Run before forking workers (e.g. by `gunicorn --preload`) they all start warm.
+    The connections it opened are closed so none is shared with them."""
+    timings: Dict[str, float] = {}
+    with _step("urls", timings):
+        resolver = get_resolver()
+        views = list(_url_views(resolver.url_patterns))
+        # Builds the lookups for `reverse()`
+        resolver.reverse_dict
+    with _step("serializers", timings):
+        warm_up_views(views)
+    with _step("pricing", timings):
+        warm_up_pricing()
+    with _step("schema", timings):
+        warm_up_schema(views)
+
+    connections.close_all()
+    connection_pool_close_idle()
+    _warm_up["complete"] = True
+    logger.info("Warmed up in %.3fs: %s", sum(timings.values()), timings)
+    return timings
@@ -76,7 +76,12 @@ INSTALLED_APPS = BASE_APPS + THIRD_PARTY_APPS + CUSTOM_APPS
 
 MIDDLEWARE_INITIAL = (
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "cdrplatform.core.middleware.WhiteNoiseMiddleware",
+    # As early as possible (but after serving static files) to count all queries
+    "cdrplatform.core.middleware.QueryInstrumentationMiddleware",
+    # Before anything queries the database
+    "cdrplatform.core.middleware.ReplicaRoutingMiddleware",
+    "cdrplatform.core.middleware.ProfilingMiddleware",
 )
 
 if DEBUG:
@@ -93,6 +98,8 @@ MIDDLEWARE_MIDDLE = (
 
 MIDDLEWARE_END = (
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # Must come after authentication as it relies on `request.user`
+    "cdrplatform.core.middleware.CustomerOrganisationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 )
@@ -127,6 +134,33 @@ WSGI_APPLICATION = "cdrplatform.wsgi.application"
 DATABASES = {
     "default": env.db_url("DEFAULT_DB_URL"),
 }
+# Optional read replica of the default database. Reads in `GET` requests go to it,
+# everything else to the primary (see `cdrplatform.core.routers`).
+if env.str("REPLICA_DB_URL", ""):
+    DATABASES["replica"] = env.db_url("REPLICA_DB_URL")
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+DATABASE_ROUTERS = ["cdrplatform.core.routers.ReplicaRouter"]
+# How long (in seconds) the reads of an organisation's clients (sessions and API
+# keys) go to the primary after one writes, so they don't miss the write while the
+# replica catches up
+DB_REPLICA_STICKY_SECONDS = env.float("DB_REPLICA_STICKY_SECONDS", 5.0)
+
+# Keep up to `DB_POOL_MAX_SIZE` PostgreSQL connections to each database open in a
+# pool shared by the threads of each process, waiting up to `DB_POOL_TIMEOUT`
+# seconds for one when they are all in use. 0 disables the pool. Pooling requires
+# `DB_CONN_MAX_AGE` to be 0 as the pool keeps the connections open instead.
+DB_POOL_MAX_SIZE = env.int("DB_POOL_MAX_SIZE", 0)
+DB_POOL_TIMEOUT = env.float("DB_POOL_TIMEOUT", 10.0)
+for database in DATABASES.values():
+    # How long (in seconds) connections are kept open between requests, 0 closes
+    # them at the end of each one. Kept connections are checked before being reused.
+    database["CONN_MAX_AGE"] = env.int(
+        "DB_CONN_MAX_AGE", database.get("CONN_MAX_AGE", 0)
+    )
+    database["CONN_HEALTH_CHECKS"] = env.bool("DB_CONN_HEALTH_CHECKS", True)
+    if DB_POOL_MAX_SIZE and database["ENGINE"] == "django.db.backends.postgresql":
+        database["ENGINE"] = "cdrplatform.core.db"
+        database["POOL"] = {"max_size": DB_POOL_MAX_SIZE, "timeout": DB_POOL_TIMEOUT}
 
 # https://django-environ.readthedocs.io/en/latest/types.html#environ-env-cache-url
 CACHES = {"default": env.cache_url("DEFAULT_CACHE_URL", default="locmemcache://")}
@@ -317,3 +351,73 @@ if DEBUG:
 
 # CDR Platform application settings
 # ---------------------------------------------------------------------------
+
+# How long (in seconds) clients and shared caches may reuse a certificate response.
+# Certificates do not change once issued so this can be long; ETags allow cheap
+# revalidation after it expires.
+CERTIFICATE_CACHE_MAX_AGE = env.int("CERTIFICATE_CACHE_MAX_AGE", 60 * 60 * 24 * 7)
+
+# Key of the permutation mapping removal requests to their certificate IDs. Unlike
+# `SECRET_KEY` it must never be changed (or rotated) once certificates are issued.
+CERTIFICATE_ID_KEY = env.str("CERTIFICATE_ID_KEY", "")
+
+# Storage prefix for rendered certificate files (PDF/PNG) saved via the default
+# storage backend
+CERTIFICATE_ARTIFACT_PREFIX = env.str("CERTIFICATE_ARTIFACT_PREFIX", "certificates/")
+
+# Publish static snapshots of certificates to the default storage backend whenever
+# they are created or changed, so verification links can be served by a CDN
+# (or the web server) without hitting the app.
+CERTIFICATE_SNAPSHOT_ENABLED = env.bool("CERTIFICATE_SNAPSHOT_ENABLED", False)
+CERTIFICATE_SNAPSHOT_PREFIX = env.str("CERTIFICATE_SNAPSHOT_PREFIX", "verify/")
+# Also publish an HTML page alongside the JSON snapshot
+CERTIFICATE_SNAPSHOT_HTML = env.bool("CERTIFICATE_SNAPSHOT_HTML", True)
+
+# Storage prefix for the files written by the `export_analytics` command
+ANALYTICS_EXPORT_PREFIX = env.str("ANALYTICS_EXPORT_PREFIX", "analytics/")
+
+# How long (in seconds) each process reuses the result of the readiness checks so
+# frequent load balancer probes don't each hit the database and cache
+HEALTH_CHECK_MAX_AGE = env.float("HEALTH_CHECK_MAX_AGE", 2.0)
+
+# Directory shared by the worker processes to add up their metrics for `/metrics`.
+# The metrics of workers that exit (e.g. restarted with `--max-requests`) are
+# kept in one file so counters never go down. Clear it whenever the whole app is
+# (re)started e.g. by using a fresh `tmpfs`. When empty, each process only
+# reports its own metrics.
+METRICS_DIR = env.str("METRICS_DIR", "")
+# How often (in seconds) each process writes its metrics to `METRICS_DIR`
+METRICS_FLUSH_INTERVAL = env.float("METRICS_FLUSH_INTERVAL", 1.0)
+# `/metrics` requires an `Authorization: Bearer <token>` header with this token.
+# Without one it is forbidden unless `METRICS_PUBLIC` is set e.g. when only the
+# internal network can reach it.
+METRICS_TOKEN = env.str("METRICS_TOKEN", "")
+METRICS_PUBLIC = env.bool("METRICS_PUBLIC", False)
+
+# Profile requests sent with a token from `create_profiling_token` and a share of
+# all other requests. Profiles (flame graph stacks and SQL timeline) are saved to
+# `PROFILING_DIR/<id>/` where the ID is returned in the `X-Profile-Id` header.
+PROFILING_ENABLED = env.bool("PROFILING_ENABLED", False)
+PROFILING_SAMPLE_RATE = env.float("PROFILING_SAMPLE_RATE", 0.0)
+# How often (in seconds) the call stack is sampled
+PROFILING_INTERVAL = env.float("PROFILING_INTERVAL", 0.001)
+# How long (in seconds) a profiling token is valid for
+PROFILING_TOKEN_MAX_AGE = env.int("PROFILING_TOKEN_MAX_AGE", 60 * 60)
+PROFILING_DIR = env.str("PROFILING_DIR", str(BASE_DIR / "profiles"))
+
+# Serve the pricing, certificate and health endpoints with `async` views. Only
+# worthwhile when running under ASGI (`cdrplatform.asgi`), under WSGI each request
+# would need its own event loop.
+ASYNC_API_VIEWS = env.bool("ASYNC_API_VIEWS", False)
+
+# Directory of OpenAPI schemas generated at build time, named `<version>.json` and
+# `<version>.yaml` e.g. with
+# `manage.py spectacular --api-version v1 --format openapi-json --file v1.json`.
+# Otherwise the schema is generated once per process, when first requested.
+SCHEMA_DIR = env.str("SCHEMA_DIR", "")
+
+# Warm up each process before it serves requests (see `cdrplatform.core.warmup`):
+# load the views, build serializers, run the pricing queries and generate the
+# schema. Run gunicorn with `--preload` to do it once before forking the workers.
+# The readiness check fails until it's done.
+WARM_UP = env.bool("WARM_UP", False)
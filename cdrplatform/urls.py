@@ -18,12 +18,9 @@ from django.contrib import admin
 from django.contrib.auth import views as auth_views
 from django.urls import include, path, reverse_lazy
 from django.views.generic.base import RedirectView
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularRedocView,
-    SpectacularSwaggerView,
-)
+from drf_spectacular.views import SpectacularRedocView, SpectacularSwaggerView
 
+from cdrplatform.core.api.schema import SchemaView
 from cdrplatform.core.forms.auth.login import LoginForm
 from cdrplatform.core.views.auth.registration import UserRegisterView
 
@@ -53,7 +50,7 @@ app_patterns = (
     # Separate URLs file for API urls
     path("v1/", include("cdrplatform.core.urls_api", namespace="v1")),
     # path("v2/", include("cdrplatform.core.urls_api", namespace="v2")),
-    path("schema/", SpectacularAPIView.as_view(api_version="v1"), name="schema"),
+    path("schema/", SchemaView.as_view(api_version="v1"), name="schema"),
     path(
         "schema/swagger-ui/",
         SpectacularSwaggerView.as_view(url_name="schema"),
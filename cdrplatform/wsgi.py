@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cdrplatform.settings")
 
 application = get_wsgi_application()
+
+if settings.WARM_UP:
+    from cdrplatform.core.warmup import app_warm_up
+
+    # Before accepting requests, and before forking the workers with `--preload`
+    app_warm_up()